@@ -3,9 +3,9 @@ import os
 import traceback
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from flask_cors import CORS
+from database import collection
 
 load_dotenv()  # Load .env before getenv
 
@@ -16,9 +16,7 @@ mongo_uri = os.getenv("MONGO_URI")
 if not mongo_uri:
     raise Exception("MONGO_URI not found in environment variables!")
 
-mongo_client = MongoClient(mongo_uri)
-db = mongo_client["procuredb"]
-users_collection = db["users"]
+users_collection = collection("users")
 
 @google_auth.route("/api/auth/google", methods=["POST"])
 def handle_google_auth():
@@ -1,13 +1,15 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import requests
 import os
 import json
+import time
+from collections.abc import Mapping
 from datetime import datetime
-from pymongo import MongoClient
+from typing import Any
 from bson.objectid import ObjectId, InvalidId
 from register import register
 from login import login
@@ -19,12 +21,63 @@ from services.amazon_api import (
     get_product_details,
     get_seller_details
 )
+from services.cache import response_cache, CACHE_MODES
+from services import chat_store
+from services.indexes import ensure_indexes
+from services.chat_write_behind import ChatWriteBehind, CHAT_WRITE_BEHIND
+from services.enrichment import enrich_search
+from services.analysis_jobs import submit_analysis, get_job, wait_for_update
+from services.gemini import generate_content, stream_generate_content
+from services.llm_cache import llm_cache
+from services.vendor_leaderboard import get_vendor_leaderboards
+from services.vendor_engine import get_vendor_engine
+from services.records import to_jsonable
+from services import metrics
+from services.rate_limiter import quota_report
+from services.circuit_breaker import breaker_report
+from services.log import get_logger, stats as log_stats
+from services.scoring_profiles import PROFILES as SCORING_PROFILES, resolve_weights, get_feature_store
+from prompts import build_prompt, prompt_facts
+from database import db, pool_stats
+
+log = get_logger("app")
+
+# MongoDB: one pooled client per process, shared with the blueprints (see database.py)
+# Indexes are created by the deploy step `python -m services.indexes`, once rather than by
+# every worker at import. ENSURE_INDEXES_ON_STARTUP=true brings back the bootstrap for local runs.
+if os.getenv("ENSURE_INDEXES_ON_STARTUP", "false").lower() == "true":
+    try:
+        for index_name in ensure_indexes(db):
+            log.info("indexes.created", index=index_name)
+    except Exception as e:
+        log.error("indexes.bootstrap_failed", error=str(e))
+
+# Optional batched chat writes (CHAT_WRITE_BEHIND=true)
+chat_writer = ChatWriteBehind(db) if CHAT_WRITE_BEHIND else None
+
+def _flush_chat_writes():
+    """Give reads their own writes when async write-behind has messages buffered"""
+    if chat_writer is not None and chat_writer.has_pending():
+        chat_writer.flush()
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes records; app.json = RecordJSONProvider(app)"""
 
-# MongoDB setup (adjust URI as needed)
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
-db = client["procuredb"]
+    @staticmethod
+    def default(o: Any) -> Any:
+        if isinstance(o, Mapping):
+            return to_jsonable(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with metrics.span("serialize"):
+            return super().dumps(obj, **kwargs)
 
 app = Flask(__name__)
+# Search results and vendor rankings are slotted records; they become dicts here
+app.json = RecordJSONProvider(app)
+# Per-route latency/in-flight metrics, and Server-Timing spans when TRACING_ENABLED=true
+metrics.instrument_flask(app)
 
 # CORS configuration
 CORS(app,
@@ -68,7 +121,7 @@ def start_chat_session():
             "title": f"Chat about {product_type}",
             "createdAt": datetime.utcnow(),
             "updatedAt": datetime.utcnow(),
-            "messages": [],
+            **chat_store.new_session_fields(),
             "state": {
                 "stage": "initial",
                 "productType": "",
@@ -93,7 +146,7 @@ def start_chat_session():
             return jsonify({"error": "Failed to create chat session"}), 500
 
     except Exception as e:
-        print(f"Error starting chat session: {str(e)}")
+        log.exception("chat.start_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/api/chat/save", methods=["POST"])
@@ -123,58 +176,86 @@ def save_chat():
             "timestamp": datetime.fromisoformat(timestamp.replace('Z', '+00:00')) if timestamp else datetime.utcnow()
         }
 
-        update_result = db.chatSessions.update_one(
-            {"sessionId": session_id, "userId": user_obj_id},
-            {"$push": {"messages": message}, "$set": {"state": state, "updatedAt": datetime.utcnow()}},
-        )
+        if chat_writer is not None:
+            try:
+                saved = chat_writer.submit(session_id, user_obj_id, message, state)
+            except TypeError as e:
+                # Write-behind diffs state by field, so it needs an object
+                return jsonify({"error": str(e)}), 400
+        else:
+            saved = chat_store.append_message(db, session_id, user_obj_id, message, state)
 
-        if update_result.modified_count > 0:
+        if saved:
             return jsonify({"success": True, "message": "Chat saved successfully"}), 200
         else:
             return jsonify({"error": "Failed to save message or session not found"}), 404
 
     except Exception as e:
-        print(f"Error saving chat: {str(e)}")
+        log.exception("chat.save_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
+def _serialize_message(msg):
+    return {
+        "from": msg["role"],
+        "text": msg["content"],
+        "url": msg.get("url"),
+        "timestamp": msg["timestamp"].isoformat()
+    }
+
 @app.route("/api/chat/sessions/<user_id>", methods=["GET"])
 def get_chat_sessions(user_id):
+    _flush_chat_writes()
     try:
         user_obj_id = ObjectId(user_id)
-        sessions = db.chatSessions.find({"userId": user_obj_id}).sort("updatedAt", -1)
+        # ?limit=N[&cursor=...] pages the list; without them every session is returned as before
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
+        paginated = limit is not None or cursor is not None
+        sessions, next_cursor = chat_store.list_sessions(
+            db, user_obj_id, limit=limit or (20 if paginated else None), cursor=cursor
+        )
         result = [{
             "sessionId": session["sessionId"],
             "title": session.get("title", "General Chat"),
             "productType": session.get("productType", "General Chat"),
             "createdAt": session["createdAt"].isoformat(),
             "updatedAt": session["updatedAt"].isoformat(),
-            "messageCount": len(session.get("messages", []))
+            "messageCount": session["messageCount"]
         } for session in sessions]
+        if paginated:
+            return jsonify({"sessions": result, "nextCursor": next_cursor}), 200
         return jsonify(result), 200
     except InvalidId:
         return jsonify({"error": "Invalid userId format"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error fetching chat sessions: {str(e)}")
+        log.exception("chat.list_sessions_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/api/chat/select/<session_id>", methods=["GET"])
 def get_chat_session(session_id):
+    _flush_chat_writes()
     try:
         user_id = request.args.get("userId")
         if not user_id:
             return jsonify({"error": "userId parameter is required"}), 400
 
         user_obj_id = ObjectId(user_id)
-        session = db.chatSessions.find_one({"sessionId": session_id, "userId": user_obj_id})
+        # ?messageLimit=N returns only the newest N messages; older ones come from /api/chat/messages
+        message_limit = request.args.get("messageLimit", type=int)
+        projection = {"messages": 0} if message_limit else None
+        session = db.chatSessions.find_one({"sessionId": session_id, "userId": user_obj_id}, projection)
         if not session:
             return jsonify({"error": "Session not found"}), 404
 
-        messages = [{
-            "from": msg["role"],
-            "text": msg["content"],
-            "url": msg.get("url"),
-            "timestamp": msg["timestamp"].isoformat()
-        } for msg in session.get("messages", [])]
+        extra = {}
+        if message_limit:
+            page = chat_store.load_message_page(db, session_id, user_obj_id, limit=message_limit)
+            messages = [_serialize_message(msg) for msg in page["messages"]]
+            extra = {"totalMessages": page["total"], "nextCursor": page["start"] or None}
+        else:
+            messages = [_serialize_message(msg) for msg in chat_store.load_messages(db, session)]
 
         return jsonify({
             "sessionId": session["sessionId"],
@@ -183,16 +264,54 @@ def get_chat_session(session_id):
             "messages": messages,
             "state": session.get("state"),
             "createdAt": session["createdAt"].isoformat(),
-            "updatedAt": session["updatedAt"].isoformat()
+            "updatedAt": session["updatedAt"].isoformat(),
+            **extra
+        }), 200
+    except InvalidId:
+        return jsonify({"error": "Invalid userId format"}), 400
+    except Exception as e:
+        log.exception("chat.get_session_failed", error=str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/api/chat/messages/<session_id>", methods=["GET"])
+def get_chat_messages(session_id):
+    """Message history, newest page first: ?userId=...&limit=50[&before=<nextCursor>]"""
+    _flush_chat_writes()
+    try:
+        user_id = request.args.get("userId")
+        if not user_id:
+            return jsonify({"error": "userId parameter is required"}), 400
+
+        user_obj_id = ObjectId(user_id)
+        page = chat_store.load_message_page(
+            db, session_id, user_obj_id,
+            before=request.args.get("before", type=int),
+            limit=request.args.get("limit", 50, type=int)
+        )
+        if page is None:
+            return jsonify({"error": "Session not found"}), 404
+
+        return jsonify({
+            "sessionId": session_id,
+            "messages": [_serialize_message(msg) for msg in page["messages"]],
+            "totalMessages": page["total"],
+            "nextCursor": page["start"] or None
         }), 200
     except InvalidId:
         return jsonify({"error": "Invalid userId format"}), 400
     except Exception as e:
-        print(f"Error fetching chat session: {str(e)}")
+        log.exception("chat.get_messages_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route("/api/chat/write-behind/stats", methods=["GET"])
+def chat_write_behind_stats():
+    if chat_writer is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **chat_writer.stats()}), 200
+
 @app.route("/api/chat/delete/<session_id>", methods=["DELETE"])
 def delete_chat_session(session_id):
+    _flush_chat_writes()
     try:
         user_id = request.args.get("userId")
         if not user_id:
@@ -202,13 +321,16 @@ def delete_chat_session(session_id):
         delete_result = db.chatSessions.delete_one({"sessionId": session_id, "userId": user_obj_id})
 
         if delete_result.deleted_count > 0:
+            chat_store.delete_messages(db, session_id, user_obj_id)
+            if chat_writer is not None:
+                chat_writer.forget(session_id, user_obj_id)
             return jsonify({"message": "Session deleted successfully"}), 200
         else:
             return jsonify({"error": "Session not found"}), 404
     except InvalidId:
         return jsonify({"error": "Invalid userId format"}), 400
     except Exception as e:
-        print(f"Error deleting chat session: {str(e)}")
+        log.exception("chat.delete_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/api/chat/rename", methods=["PUT"])
@@ -235,11 +357,22 @@ def rename_chat_session():
     except InvalidId:
         return jsonify({"error": "Invalid userId format"}), 400
     except Exception as e:
-        print(f"Error renaming chat session: {str(e)}")
+        log.exception("chat.rename_failed", error=str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 # --- AMAZON RAPIDAPI ROUTES ---
 
+def _sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=to_jsonable)}\n\n"
+
+def _cache_mode():
+    """Per-request cache control: ?cache=bypass|refresh (or ?refresh=true)"""
+    mode = request.args.get("cache", "default").lower()
+    if request.args.get("refresh", "false").lower() == "true":
+        mode = "refresh"
+    return mode if mode in CACHE_MODES else "default"
+
 @app.route("/api/amazon/search", methods=["GET"])
 def amazon_search():
     try:
@@ -251,54 +384,28 @@ def amazon_search():
         country = request.args.get("country", "US").upper()
         sort_by = request.args.get("sort_by", "RELEVANCE")  # Changed from RELEVANT to RELEVANCE
 
-        product_data = search_products(keyword, page, country, sort_by)
+        product_data = search_products(keyword, page, country, sort_by, cache_mode=_cache_mode())
 
         # Return product_data with 200 status, even if no products are found
         if "error" in product_data:
-            print(f"Amazon API error: {product_data['error']}")
+            log.warning("amazon.search_failed", keyword=keyword, error=product_data["error"])
             return jsonify(product_data), 200
 
+        # The procurement analysis runs in the background; clients poll
+        # /api/amazon/analysis/<jobId> or subscribe to its /events stream
         if product_data.get("success") and product_data.get("data", {}).get("products"):
             try:
-                top_product = product_data["data"]["products"][0]
-
-                prompt = f"""Analyze this product for procurement:
-                Product: {top_product['ProductTitle']}
-                Price: {top_product.get('price', 'N/A')}
-                
-                Provide a brief procurement recommendation including:
-                1. Suggested quantity range
-                2. Key specifications to verify
-                3. Potential alternatives to consider
-                
-                Format response in a conversational tone."""
-
-                gemini_response = requests.post(
-                    "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent",
-                    headers={"Content-Type": "application/json"},
-                    params={"key": os.getenv("GEMINI_API_KEY")},
-                    json={
-                        "contents": [{"parts": [{"text": prompt}]}],
-                        "generationConfig": {
-                            "temperature": 0.7,
-                            "maxOutputTokens": 1024
-                        }
-                    },
-                    timeout=15
-                )
-
-                if gemini_response.status_code == 200:
-                    ai_analysis = gemini_response.json()["candidates"][0]["content"]["parts"][0]["text"]
-                    product_data["ai_analysis"] = ai_analysis
-
-            except Exception as gemini_error:
-                print(f"Gemini API error: {str(gemini_error)}")
-                pass
+                job = submit_analysis(product_data["data"]["products"][0])
+                product_data["ai_analysis_job"] = job
+                if job.get("ai_analysis"):
+                    product_data["ai_analysis"] = job["ai_analysis"]
+            except Exception as analysis_error:
+                log.exception("analysis.queue_failed", error=str(analysis_error))
 
         return jsonify(product_data), 200
 
     except Exception as e:
-        print(f"Server error in amazon_search: {str(e)}")
+        log.exception("amazon.search_error", error=str(e))
         return jsonify({
             "error": "Internal server error",
             "details": str(e),
@@ -312,7 +419,7 @@ def amazon_product_details():
     if not asin:
         return jsonify({"error": "ASIN is required"}), 400
     try:
-        data = get_product_details(asin, country)
+        data = get_product_details(asin, country, cache_mode=_cache_mode())
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -324,12 +431,195 @@ def amazon_seller_details():
     if not seller_id:
         return jsonify({"error": "sellerId is required"}), 400
     try:
-        data = get_seller_details(seller_id, country)
+        data = get_seller_details(seller_id, country, cache_mode=_cache_mode())
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/amazon/search-enriched", methods=["GET"])
+def amazon_search_enriched():
+    keyword = request.args.get("keyword") or request.args.get("query")
+    if not keyword:
+        return jsonify({"error": "Keyword parameter is required"}), 400
+    try:
+        data = enrich_search(
+            keyword,
+            page=request.args.get("page", 1, type=int),
+            country=request.args.get("country", "US").upper(),
+            sort_by=request.args.get("sort_by", "RELEVANCE"),
+            max_products=request.args.get("limit", type=int),
+            concurrency=request.args.get("concurrency", type=int),
+            deadline_seconds=request.args.get("deadline", type=float),
+            cache_mode=_cache_mode()
+        )
+        return jsonify(data), 200
+    except Exception as e:
+        log.exception("amazon.search_enriched_error", error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/amazon/analysis/<job_id>", methods=["GET"])
+def amazon_analysis(job_id):
+    # Optional long poll: ?wait=<seconds> returns as soon as the status changes
+    wait = min(request.args.get("wait", 0, type=float), 25)
+    job = get_job(job_id)
+    if job and wait > 0 and job["status"] in ("pending", "running"):
+        job, _ = wait_for_update(job_id, job["status"], None, wait)
+    if not job:
+        return jsonify({"error": "Analysis job not found"}), 404
+    return jsonify(job), 200
+
+@app.route("/api/amazon/analysis/<job_id>/events", methods=["GET"])
+def amazon_analysis_events(job_id):
+    if not get_job(job_id):
+        return jsonify({"error": "Analysis job not found"}), 404
+
+    def stream():
+        status, seen = None, 0
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            job, chunks = wait_for_update(job_id, status, seen, 15)
+            if job is None:
+                break
+            for chunk in chunks:
+                yield _sse("token", {"text": chunk})
+            seen += len(chunks)
+            if job["status"] != status:
+                status = job["status"]
+                yield _sse(status, job)
+                if status in ("done", "failed"):
+                    break
+            elif not chunks:
+                yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/amazon/cache/stats", methods=["GET"])
+def amazon_cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@app.route("/api/amazon/quota", methods=["GET"])
+def amazon_quota():
+    try:
+        return jsonify(quota_report()), 200
+    except Exception as e:
+        log.exception("amazon.quota_report_failed", error=str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
 # --- END AMAZON RAPIDAPI ROUTES ---
 
+# --- VENDOR ROUTES ---
+
+@app.route("/api/vendors/recommend", methods=["POST"])
+def vendor_recommendation():
+    data = request.get_json() or {}
+    missing = [field for field in ("item", "quantity", "location", "days_needed") if field not in data]
+    if missing:
+        return jsonify({"error": f"Missing required fields: {', '.join(missing)}"}), 400
+
+    # Optional "profile" (see /api/vendors/profiles) or custom "weights" rank on normalized features
+    weights = None
+    if "profile" in data or "weights" in data:
+        try:
+            weights = resolve_weights(data.get("profile"), data.get("weights"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    try:
+        if weights is not None:
+            top_vendors = get_feature_store().top(weights, location=data["location"], n=3)
+        else:
+            # Same ranking as score_vendors(load_vendors(), data)[:3], without rescoring the catalog
+            top_vendors = get_vendor_leaderboards().top(profile="score", location=data["location"], n=3)
+        prompt = build_prompt(data, top_vendors)
+        facts = prompt_facts(data)
+    except Exception as e:
+        log.exception("vendors.scoring_failed", error=str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
+    # ?stream=true relays the recommendation as server-sent events while it is generated
+    if request.args.get("stream", "false").lower() == "true":
+        def stream():
+            yield _sse("vendors", top_vendors)
+            try:
+                for chunk in stream_generate_content(prompt, cache_facts=facts):
+                    yield _sse("token", {"text": chunk})
+                yield _sse("done", {})
+            except Exception as e:
+                log.exception("gemini.error", error=str(e))
+                yield _sse("failed", {"error": str(e)})
+
+        return Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    try:
+        recommendation = generate_content(prompt, cache_facts=facts)
+    except Exception as e:
+        log.exception("gemini.error", error=str(e))
+        return jsonify({"vendors": top_vendors, "error": "Failed to generate recommendation"}), 502
+
+    return jsonify({"vendors": top_vendors, "recommendation": recommendation}), 200
+
+@app.route("/api/vendors/profiles", methods=["GET"])
+def vendor_scoring_profiles():
+    return jsonify({"profiles": SCORING_PROFILES}), 200
+
+VENDOR_BATCH_MAX_REQUESTS = int(os.getenv("VENDOR_BATCH_MAX_REQUESTS", "1000"))
+
+def _positive_int(value):
+    # JSON true/false arrive as bools, which are ints in Python
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+@app.route("/api/vendors/score-batch", methods=["POST"])
+def vendor_score_batch():
+    """
+    Score the catalog for many requests (e.g. every line of a BOM) in one call.
+    Body: {"requests": [{"location": ..., ...}, ...], "top_k": 3, "chunk_size": optional}
+    """
+    data = request.get_json() or {}
+    requests_list = data.get("requests")
+    if not isinstance(requests_list, list) or not requests_list:
+        return jsonify({"error": "requests must be a non-empty list"}), 400
+    if len(requests_list) > VENDOR_BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"At most {VENDOR_BATCH_MAX_REQUESTS} requests per batch"}), 400
+    invalid = [i for i, r in enumerate(requests_list) if not isinstance(r, dict) or not isinstance(r.get("location"), str)]
+    if invalid:
+        return jsonify({"error": "Each request needs a location", "invalidRequests": invalid}), 400
+
+    top_k = data.get("top_k", 3)
+    chunk_size = data.get("chunk_size")
+    if not _positive_int(top_k) or (chunk_size is not None and not _positive_int(chunk_size)):
+        return jsonify({"error": "top_k and chunk_size must be positive integers"}), 400
+
+    try:
+        results = get_vendor_engine().score_batch(requests_list, top_k=top_k, chunk_size=chunk_size)
+    except Exception as e:
+        log.exception("vendors.batch_scoring_failed", error=str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
+    return jsonify({"results": [{"vendors": vendors} for vendors in results]}), 200
+
+# --- END VENDOR ROUTES ---
+
+@app.route("/api/llm/cache/stats", methods=["GET"])
+def llm_cache_stats():
+    return jsonify(llm_cache.stats()), 200
+
+@app.route("/api/db/pool-stats", methods=["GET"])
+def db_pool_stats():
+    return jsonify(pool_stats()), 200
+
+@app.route("/api/logging/stats", methods=["GET"])
+def logging_stats():
+    return jsonify(log_stats()), 200
+
+@app.route("/api/circuit-breakers", methods=["GET"])
+def circuit_breakers():
+    return jsonify(breaker_report()), 200
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE), 200
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,504 @@
+# asgi_app.py
+"""
+Async serving mode for the chat and /api/amazon/* APIs.
+
+    uvicorn asgi_app:app --workers 4
+
+The chat and Amazon routes are reimplemented on FastAPI with motor and httpx, so
+a request waiting on MongoDB, RapidAPI or an analysis job holds no thread; one
+worker can keep thousands of slow upstream calls in flight. Request and response
+contracts match app.py. Every other route (auth, vendors, stats) is served by the
+Flask app, mounted underneath (ASGI_MOUNT_FLASK=false to leave it out).
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from bson.objectid import ObjectId, InvalidId
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from database import db, get_async_db, close_async_client
+from services import async_chat_store, async_http_client
+from services.async_amazon_api import search_products, get_product_details, get_seller_details
+from services.cache import response_cache, CACHE_MODES
+from services import chat_store
+from services.chat_write_behind import ChatWriteBehind, CHAT_WRITE_BEHIND
+from services.enrichment import enrich_search_async
+from services.analysis_jobs import submit_analysis, get_job_async, wait_for_update_async
+from services.records import to_jsonable
+from services.log import get_logger
+from services.metrics import MetricsMiddleware, registry as metrics_registry, span, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+ASGI_MOUNT_FLASK = os.getenv("ASGI_MOUNT_FLASK", "true").lower() == "true"
+
+log = get_logger("asgi_app")
+
+# Optional batched chat writes (CHAT_WRITE_BEHIND=true), as in app.py
+chat_writer = ChatWriteBehind(db) if CHAT_WRITE_BEHIND else None
+
+async def _flush_chat_writes():
+    """Give reads their own writes when async write-behind has messages buffered"""
+    if chat_writer is not None and chat_writer.has_pending():
+        await asyncio.to_thread(chat_writer.flush)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_http_client.close_client()
+    close_async_client()
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-route metrics for the routes below; the mounted Flask app instruments its own
+app.add_middleware(MetricsMiddleware)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:5173", "http://localhost:3000", "http://127.0.0.1:5173", "http://127.0.0.1:3000"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "X-User-Id"],
+    allow_credentials=True,
+)
+
+
+class RecordJSONResponse(JSONResponse):
+    """JSONResponse that serializes search results (services.records) as objects"""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                              default=to_jsonable).encode("utf-8")
+
+
+def _json(data, status=200):
+    return RecordJSONResponse(data, status_code=status)
+
+def _arg(request: Request, name, default=None, type=None):
+    """Same semantics as Flask's request.args.get: a value that fails `type` gives `default`"""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    if type is None:
+        return value
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        return default
+
+# --- CHAT ROUTES ---
+
+def _new_session_state():
+    return {
+        "stage": "initial",
+        "productType": "",
+        "questions": [],
+        "attributes": {},
+        "currentQuestionIndex": 0,
+        "quantity": 1,
+        "location": "Unknown",
+        "timeline": "",
+        "procurementValue": "",
+        "approach": "",
+        "wocCriteria": "",
+        "suppliers": "",
+        "finalWocJustification": ""
+    }
+
+def _serialize_message(msg):
+    return {
+        "from": msg["role"],
+        "text": msg["content"],
+        "url": msg.get("url"),
+        "timestamp": msg["timestamp"].isoformat()
+    }
+
+@app.post("/api/chat/start")
+async def start_chat_session(request: Request):
+    try:
+        data = await request.json()
+        user_id = data.get("userId")
+        product_type = data.get("productType", "General Chat")
+
+        if not user_id:
+            return _json({"error": "userId is required"}, 400)
+
+        try:
+            user_obj_id = ObjectId(user_id)
+        except InvalidId:
+            return _json({"error": "Invalid userId format"}, 400)
+
+        session_id = str(ObjectId())
+        session_doc = {
+            "sessionId": session_id,
+            "userId": user_obj_id,
+            "productType": product_type,
+            "title": f"Chat about {product_type}",
+            "createdAt": datetime.utcnow(),
+            "updatedAt": datetime.utcnow(),
+            **chat_store.new_session_fields(),
+            "state": _new_session_state()
+        }
+
+        result = await get_async_db().chatSessions.insert_one(session_doc)
+        if result.inserted_id:
+            return _json({"sessionId": session_id, "message": "Chat session started successfully"}, 201)
+        else:
+            return _json({"error": "Failed to create chat session"}, 500)
+
+    except Exception as e:
+        log.exception("chat.start_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.post("/api/chat/save")
+async def save_chat(request: Request):
+    try:
+        data = await request.json()
+        session_id = data.get("sessionId")
+        user_id = data.get("userId")
+        from_field = data.get("from")
+        text = data.get("text")
+        url = data.get("url")
+        timestamp = data.get("timestamp")
+        state = data.get("state", {})
+
+        if not all([session_id, user_id, from_field, text]):
+            return _json({"error": "Missing required fields"}, 400)
+
+        try:
+            user_obj_id = ObjectId(user_id)
+        except InvalidId:
+            return _json({"error": "Invalid userId format"}, 400)
+
+        message = {
+            "role": from_field,
+            "content": text,
+            "url": url,
+            "timestamp": datetime.fromisoformat(timestamp.replace('Z', '+00:00')) if timestamp else datetime.utcnow()
+        }
+
+        if chat_writer is not None:
+            try:
+                # In "ack" mode this waits for the batch to be written
+                saved = await asyncio.to_thread(chat_writer.submit, session_id, user_obj_id, message, state)
+            except TypeError as e:
+                # Write-behind diffs state by field, so it needs an object
+                return _json({"error": str(e)}, 400)
+        else:
+            saved = await async_chat_store.append_message(get_async_db(), session_id, user_obj_id, message, state)
+
+        if saved:
+            return _json({"success": True, "message": "Chat saved successfully"})
+        else:
+            return _json({"error": "Failed to save message or session not found"}, 404)
+
+    except Exception as e:
+        log.exception("chat.save_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.get("/api/chat/sessions/{user_id}")
+async def get_chat_sessions(user_id: str, request: Request):
+    await _flush_chat_writes()
+    try:
+        user_obj_id = ObjectId(user_id)
+        limit = _arg(request, "limit", type=int)
+        cursor = _arg(request, "cursor")
+        paginated = limit is not None or cursor is not None
+        sessions, next_cursor = await async_chat_store.list_sessions(
+            get_async_db(), user_obj_id, limit=limit or (20 if paginated else None), cursor=cursor
+        )
+        result = [{
+            "sessionId": session["sessionId"],
+            "title": session.get("title", "General Chat"),
+            "productType": session.get("productType", "General Chat"),
+            "createdAt": session["createdAt"].isoformat(),
+            "updatedAt": session["updatedAt"].isoformat(),
+            "messageCount": session["messageCount"]
+        } for session in sessions]
+        if paginated:
+            return _json({"sessions": result, "nextCursor": next_cursor})
+        return _json(result)
+    except InvalidId:
+        return _json({"error": "Invalid userId format"}, 400)
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+    except Exception as e:
+        log.exception("chat.list_sessions_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.get("/api/chat/select/{session_id}")
+async def get_chat_session(session_id: str, request: Request):
+    await _flush_chat_writes()
+    try:
+        user_id = _arg(request, "userId")
+        if not user_id:
+            return _json({"error": "userId parameter is required"}, 400)
+
+        db = get_async_db()
+        user_obj_id = ObjectId(user_id)
+        message_limit = _arg(request, "messageLimit", type=int)
+        projection = {"messages": 0} if message_limit else None
+        session = await db.chatSessions.find_one({"sessionId": session_id, "userId": user_obj_id}, projection)
+        if not session:
+            return _json({"error": "Session not found"}, 404)
+
+        extra = {}
+        if message_limit:
+            page = await async_chat_store.load_message_page(db, session_id, user_obj_id, limit=message_limit)
+            messages = [_serialize_message(msg) for msg in page["messages"]]
+            extra = {"totalMessages": page["total"], "nextCursor": page["start"] or None}
+        else:
+            messages = [_serialize_message(msg) for msg in await async_chat_store.load_messages(db, session)]
+
+        return _json({
+            "sessionId": session["sessionId"],
+            "title": session.get("title", "General Chat"),
+            "productType": session.get("productType", "General Chat"),
+            "messages": messages,
+            "state": session.get("state"),
+            "createdAt": session["createdAt"].isoformat(),
+            "updatedAt": session["updatedAt"].isoformat(),
+            **extra
+        })
+    except InvalidId:
+        return _json({"error": "Invalid userId format"}, 400)
+    except Exception as e:
+        log.exception("chat.get_session_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.get("/api/chat/messages/{session_id}")
+async def get_chat_messages(session_id: str, request: Request):
+    await _flush_chat_writes()
+    try:
+        user_id = _arg(request, "userId")
+        if not user_id:
+            return _json({"error": "userId parameter is required"}, 400)
+
+        user_obj_id = ObjectId(user_id)
+        page = await async_chat_store.load_message_page(
+            get_async_db(), session_id, user_obj_id,
+            before=_arg(request, "before", type=int),
+            limit=_arg(request, "limit", 50, type=int)
+        )
+        if page is None:
+            return _json({"error": "Session not found"}, 404)
+
+        return _json({
+            "sessionId": session_id,
+            "messages": [_serialize_message(msg) for msg in page["messages"]],
+            "totalMessages": page["total"],
+            "nextCursor": page["start"] or None
+        })
+    except InvalidId:
+        return _json({"error": "Invalid userId format"}, 400)
+    except Exception as e:
+        log.exception("chat.get_messages_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.get("/api/chat/write-behind/stats")
+async def chat_write_behind_stats():
+    if chat_writer is None:
+        return _json({"enabled": False})
+    return _json({"enabled": True, **chat_writer.stats()})
+
+@app.delete("/api/chat/delete/{session_id}")
+async def delete_chat_session(session_id: str, request: Request):
+    await _flush_chat_writes()
+    try:
+        user_id = _arg(request, "userId")
+        if not user_id:
+            return _json({"error": "userId parameter is required"}, 400)
+
+        db = get_async_db()
+        user_obj_id = ObjectId(user_id)
+        delete_result = await db.chatSessions.delete_one({"sessionId": session_id, "userId": user_obj_id})
+
+        if delete_result.deleted_count > 0:
+            await async_chat_store.delete_messages(db, session_id, user_obj_id)
+            if chat_writer is not None:
+                chat_writer.forget(session_id, user_obj_id)
+            return _json({"message": "Session deleted successfully"})
+        else:
+            return _json({"error": "Session not found"}, 404)
+    except InvalidId:
+        return _json({"error": "Invalid userId format"}, 400)
+    except Exception as e:
+        log.exception("chat.delete_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+@app.put("/api/chat/rename")
+async def rename_chat_session(request: Request):
+    try:
+        data = await request.json()
+        session_id = data.get("sessionId")
+        user_id = data.get("userId")
+        new_title = data.get("newTitle")
+
+        if not all([session_id, user_id, new_title]):
+            return _json({"error": "Missing required fields"}, 400)
+
+        user_obj_id = ObjectId(user_id)
+        update_result = await get_async_db().chatSessions.update_one(
+            {"sessionId": session_id, "userId": user_obj_id},
+            {"$set": {"title": new_title, "updatedAt": datetime.utcnow()}},
+        )
+
+        if update_result.modified_count > 0:
+            return _json({"message": "Session renamed successfully"})
+        else:
+            return _json({"error": "Session not found"}, 404)
+    except InvalidId:
+        return _json({"error": "Invalid userId format"}, 400)
+    except Exception as e:
+        log.exception("chat.rename_failed", error=str(e))
+        return _json({"error": "Internal server error"}, 500)
+
+# --- AMAZON RAPIDAPI ROUTES ---
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=to_jsonable)}\n\n"
+
+def _cache_mode(request: Request):
+    mode = _arg(request, "cache", "default").lower()
+    if _arg(request, "refresh", "false").lower() == "true":
+        mode = "refresh"
+    return mode if mode in CACHE_MODES else "default"
+
+@app.get("/api/amazon/search")
+async def amazon_search(request: Request):
+    try:
+        keyword = _arg(request, "keyword") or _arg(request, "query")
+        if not keyword:
+            return _json({"error": "Keyword parameter is required"}, 400)
+
+        page = _arg(request, "page", 1, type=int)
+        country = _arg(request, "country", "US").upper()
+        sort_by = _arg(request, "sort_by", "RELEVANCE")
+
+        product_data = await search_products(keyword, page, country, sort_by, cache_mode=_cache_mode(request))
+
+        if "error" in product_data:
+            log.warning("amazon.search_failed", keyword=keyword, error=product_data["error"])
+            return _json(product_data)
+
+        if product_data.get("success") and product_data.get("data", {}).get("products"):
+            try:
+                job = await asyncio.to_thread(submit_analysis, product_data["data"]["products"][0])
+                product_data["ai_analysis_job"] = job
+                if job.get("ai_analysis"):
+                    product_data["ai_analysis"] = job["ai_analysis"]
+            except Exception as analysis_error:
+                log.exception("analysis.queue_failed", error=str(analysis_error))
+
+        return _json(product_data)
+
+    except Exception as e:
+        log.exception("amazon.search_error", error=str(e))
+        return _json({
+            "error": "Internal server error",
+            "details": str(e),
+            "message": "Failed to search products"
+        }, 500)
+
+@app.get("/api/amazon/product-details")
+async def amazon_product_details(request: Request):
+    asin = _arg(request, "asin")
+    country = _arg(request, "country", "US")
+    if not asin:
+        return _json({"error": "ASIN is required"}, 400)
+    try:
+        return _json(await get_product_details(asin, country, cache_mode=_cache_mode(request)))
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+@app.get("/api/amazon/seller-details")
+async def amazon_seller_details(request: Request):
+    seller_id = _arg(request, "seller_id")
+    country = _arg(request, "country", "US")
+    if not seller_id:
+        return _json({"error": "sellerId is required"}, 400)
+    try:
+        return _json(await get_seller_details(seller_id, country, cache_mode=_cache_mode(request)))
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+@app.get("/api/amazon/search-enriched")
+async def amazon_search_enriched(request: Request):
+    keyword = _arg(request, "keyword") or _arg(request, "query")
+    if not keyword:
+        return _json({"error": "Keyword parameter is required"}, 400)
+    try:
+        data = await enrich_search_async(
+            keyword,
+            page=_arg(request, "page", 1, type=int),
+            country=_arg(request, "country", "US").upper(),
+            sort_by=_arg(request, "sort_by", "RELEVANCE"),
+            max_products=_arg(request, "limit", type=int),
+            concurrency=_arg(request, "concurrency", type=int),
+            deadline_seconds=_arg(request, "deadline", type=float),
+            cache_mode=_cache_mode(request)
+        )
+        return _json(data)
+    except Exception as e:
+        log.exception("amazon.search_enriched_error", error=str(e))
+        return _json({"error": str(e)}, 500)
+
+@app.get("/api/amazon/analysis/{job_id}")
+async def amazon_analysis(job_id: str, request: Request):
+    wait = min(_arg(request, "wait", 0, type=float), 25)
+    job = await get_job_async(job_id)
+    if job and wait > 0 and job["status"] in ("pending", "running"):
+        job, _ = await wait_for_update_async(job_id, job["status"], None, wait)
+    if not job:
+        return _json({"error": "Analysis job not found"}, 404)
+    return _json(job)
+
+@app.get("/api/amazon/analysis/{job_id}/events")
+async def amazon_analysis_events(job_id: str):
+    if not await get_job_async(job_id):
+        return _json({"error": "Analysis job not found"}, 404)
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        status, seen = None, 0
+        deadline = loop.time() + 120
+        while loop.time() < deadline:
+            job, chunks = await wait_for_update_async(job_id, status, seen, 15)
+            if job is None:
+                break
+            for chunk in chunks:
+                yield _sse("token", {"text": chunk})
+            seen += len(chunks)
+            if job["status"] != status:
+                status = job["status"]
+                yield _sse(status, job)
+                if status in ("done", "failed"):
+                    break
+            elif not chunks:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/amazon/cache/stats")
+async def amazon_cache_stats():
+    return _json(response_cache.stats())
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+# --- END AMAZON RAPIDAPI ROUTES ---
+
+if ASGI_MOUNT_FLASK:
+    from fastapi.middleware.wsgi import WSGIMiddleware
+    from app import app as flask_app
+
+    app.mount("/", WSGIMiddleware(flask_app))
@@ -0,0 +1,136 @@
+# bench/records_memory.py
+"""
+Memory and allocation cost of slotted records (services/records.py) versus the
+per-item dicts they replaced, on large search pages, seller feedback lists and
+vendor rankings.
+
+    python -m bench.records_memory --products 20000 --reviews 20000 --vendors 100000
+
+For each case it reports the memory retained by the result, the peak during
+construction, and the number of live allocated blocks (tracemalloc).
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tracemalloc
+
+os.environ.setdefault("RAPIDAPI_KEY", "bench")
+# Keep per-call log events out of the report (and the timings)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from services.amazon_api import parse_search_response, parse_seller_response  # noqa: E402
+from services.records import to_jsonable  # noqa: E402
+from vendor_logic import score_vendors, vendor_score  # noqa: E402
+
+
+def _legacy_products(content):
+    """The per-product dicts search_products built before records"""
+    return [{
+        "ProductTitle": item.get("product_title", ""),
+        "asin": item.get("asin", ""),
+        "price": item.get("product_price", "N/A"),
+        "discount": item.get("discount", ""),
+        "originalPrice": item.get("product_original_price", "N/A"),
+        "rating": item.get("product_star_rating", "N/A"),
+        "totalRatings": item.get("product_num_ratings", "N/A"),
+        "productUrl": item.get("product_url", ""),
+        "productImage": item.get("product_photo", ""),
+        "isPrime": item.get("is_prime", "false"),
+        "isBestSeller": item.get("is_best_seller", "false"),
+        "isAmazonChoice": item.get("is_amazon_choice", "false"),
+        "variantsAvailable": item.get("has_variants", "false")
+    } for item in json.loads(content)["data"]["products"] if isinstance(item, dict)]
+
+
+def _legacy_reviews(content):
+    return [{
+        "rating": review.get("rating", ""),
+        "reviewText": review.get("feedback_text", ""),
+        "username": review.get("reviewer_name", ""),
+        "date": review.get("feedback_date", ""),
+        "suppressedMessage": review.get("suppressed_message", "Not Available")
+    } for review in json.loads(content)["data"].get("seller_feedback", [])]
+
+
+def _legacy_score_vendors(vendors, request):
+    scored = [{**v, "score": vendor_score(v, request["location"] in v["location"])} for v in vendors]
+    return sorted(scored, key=lambda x: x["score"], reverse=True)
+
+
+def search_page(n):
+    return json.dumps({"data": {"total_products": n, "products": [{
+        "product_title": f"Industrial part {i}", "asin": f"B{i:09d}", "product_price": f"${i % 500}.99",
+        "product_original_price": f"${i % 500 + 10}.99", "product_star_rating": "4.5",
+        "product_num_ratings": i % 9000, "product_url": f"https://www.amazon.com/dp/B{i:09d}",
+        "product_photo": f"https://m.media-amazon.com/images/I/{i}.jpg", "is_prime": i % 2 == 0,
+    } for i in range(n)]}, "request_info": {}}).encode()
+
+
+def seller_page(n):
+    return json.dumps({"data": {"seller_id": "A1", "name": "Bench Seller", "seller_feedback": [{
+        "rating": "5 out of 5 stars", "feedback_text": f"Fast shipping, item {i} as described",
+        "reviewer_name": f"buyer{i}", "feedback_date": "2024-01-01",
+    } for i in range(n)]}, "request_info": {}}).encode()
+
+
+def catalog(n):
+    rng = random.Random(7)
+    locations = ["Mumbai", "Pune", "Delhi", "Chennai", "Bangalore"]
+    return [{
+        "id": f"v{i}", "name": f"Vendor {i}", "category": "Raw Materials", "items": ["steel"],
+        "price": rng.uniform(10, 100), "delivery_days": rng.randint(1, 20), "location": rng.choice(locations),
+        "rating": round(rng.uniform(1, 5), 1), "response_hours": rng.randint(1, 48), "certified": rng.random() < 0.5,
+    } for i in range(n)]
+
+
+def measure(build):
+    """(retained bytes, peak bytes, live blocks) of what build() returns"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    snapshot = tracemalloc.take_snapshot()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    # Serialize once so both variants are shown to produce the same payload
+    payload = json.dumps(result, default=to_jsonable, sort_keys=True)
+    del result
+    return retained, peak, blocks, payload
+
+
+def report(name, legacy, records):
+    old, new = measure(legacy), measure(records)
+    if old[3] != new[3]:
+        raise SystemExit(f"{name}: records serialize differently from the legacy dicts")
+    print(f"{name}")
+    for label, index in (("retained", 0), ("peak", 1)):
+        print(f"  {label:9} dicts {old[index] / 1e6:8.2f} MB   records {new[index] / 1e6:8.2f} MB   "
+              f"saved {100 * (1 - new[index] / old[index]):5.1f}%")
+    print(f"  {'blocks':9} dicts {old[2]:11,}   records {new[2]:11,}   "
+          f"saved {100 * (1 - new[2] / old[2]):5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--vendors", type=int, default=100000)
+    args = parser.parse_args()
+
+    content = search_page(args.products)
+    report(f"search page ({args.products:,} products)", lambda: _legacy_products(content),
+           lambda: parse_search_response(200, content, {}, "RELEVANT")["data"]["products"])
+
+    content = seller_page(args.reviews)
+    report(f"seller feedback ({args.reviews:,} reviews)", lambda: _legacy_reviews(content),
+           lambda: parse_seller_response(200, content)["data"]["reviews"])
+
+    vendors, request = catalog(args.vendors), {"location": "Mumbai"}
+    report(f"score_vendors ({args.vendors:,} vendors)", lambda: _legacy_score_vendors(vendors, request),
+           lambda: score_vendors(vendors, request))
+
+
+if __name__ == "__main__":
+    main()
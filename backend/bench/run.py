@@ -0,0 +1,379 @@
+# bench/run.py
+"""
+Benchmarks for the backend hot paths, run against local stand-ins only.
+
+    python -m bench.run                          # all cases, compared with bench/baseline.json
+    python -m bench.run --only vendor prompt     # cases whose name starts with a prefix
+    python -m bench.run --save-baseline          # record the current numbers as the baseline
+    python -m bench.run --mongo-uri mongodb://localhost:27017   # chat cases on a real mongod
+
+Cases:
+  vendor.*  recommend_vendors / score_vendors over a synthetic catalog (--vendors)
+  prompt.*  build_prompt for a vendor recommendation
+  amazon.*  search_products / get_product_details / get_seller_details against
+            stubs/amazon_server.py serving bench/fixtures (cache bypassed), plus
+            the parsers alone
+  chat.*    chat_store append / paged load on mongomock, or on --mongo-uri
+
+Each case reports throughput and latency percentiles of its fastest round
+(--repeat). A case regresses when its p50 or throughput is more than
+--tolerance worse than the baseline; the exit status is 1 if any case regressed.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# A case is a name and a setup function returning the operation to time
+Case = Tuple[str, Callable[[argparse.Namespace], Callable[[], Any]]]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(round(p / 100 * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def measure(op: Callable[[], Any], iterations: int, warmup: int, min_seconds: float) -> Dict[str, float]:
+    """Time `op` at least `iterations` times and for at least `min_seconds`"""
+    for _ in range(warmup):
+        op()
+    gc.collect()
+    timings: List[float] = []
+    clock = time.perf_counter
+    started = clock()
+    while len(timings) < iterations or clock() - started < min_seconds:
+        t0 = clock()
+        op()
+        timings.append(clock() - t0)
+    elapsed = clock() - started
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "opsPerSec": round(len(timings) / elapsed, 1),
+        "p50Ms": round(percentile(timings, 50) * 1000, 4),
+        "p90Ms": round(percentile(timings, 90) * 1000, 4),
+        "p99Ms": round(percentile(timings, 99) * 1000, 4),
+        "maxMs": round(timings[-1] * 1000, 4),
+    }
+
+
+# --- Vendor ranking and prompts ---
+
+def synthetic_catalog(n: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Vendors with the fields of data/vendors.json plus the recommend_vendors scores"""
+    rng = random.Random(seed)
+    categories = ["Raw Materials", "Electronics", "Packaging", "Chemicals", "Office Supplies"]
+    locations = ["Mumbai", "Pune", "Delhi", "Chennai", "Bangalore", "Navi Mumbai", "Hyderabad"]
+    return [{
+        "id": f"v{i}",
+        "name": f"Vendor {i}",
+        "category": rng.choice(categories),
+        "items": ["steel sheets", "copper wire", "corrugated boxes"][: rng.randint(1, 3)],
+        "price": round(rng.uniform(5, 150), 2),
+        "delivery_days": rng.randint(1, 21),
+        "location": rng.choice(locations),
+        "rating": round(rng.uniform(2.5, 5), 1),
+        "response_hours": rng.randint(1, 48),
+        "certified": rng.random() < 0.6,
+        "lead_time": rng.randint(1, 30),
+        "compliance_score": round(rng.random(), 2),
+        "reliability_score": round(rng.random(), 2),
+        "sustainability_score": round(rng.random(), 2),
+    } for i in range(n)]
+
+
+def _recommend_vendors(args):
+    from services.vendor_recommender import recommend_vendors
+
+    vendors = synthetic_catalog(args.vendors)
+    return lambda: recommend_vendors(vendors, product_type="raw", location="mumbai", rating_min=3.5, top_n=5)
+
+
+def _score_vendors(args):
+    from vendor_logic import score_vendors
+
+    vendors = synthetic_catalog(args.vendors)
+    request = {"item": "steel sheets", "quantity": 500, "location": "Mumbai", "days_needed": 7}
+    return lambda: score_vendors(vendors, request)[:3]
+
+
+def _build_prompt(args):
+    from prompts import build_prompt
+    from vendor_logic import score_vendors
+
+    request = {"item": "steel sheets", "quantity": 500, "location": "Mumbai", "days_needed": 7}
+    top_vendors = score_vendors(synthetic_catalog(50), request)[:3]
+    return lambda: build_prompt(request, top_vendors)
+
+
+# --- Amazon API against the local stub ---
+
+_stub: Dict[str, Any] = {"server": None}
+
+
+def _amazon_api(args):
+    """services.amazon_api pointed at a stubs/amazon_server.py instance started on first use"""
+    if _stub["server"] is None:
+        from stubs.amazon_server import make_server
+
+        server = make_server(port=0, delay=args.upstream_delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        _stub["server"] = server
+        os.environ["RAPIDAPI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+        if "services.amazon_api" in sys.modules:
+            sys.modules["services.amazon_api"].RAPIDAPI_BASE_URL = os.environ["RAPIDAPI_BASE_URL"]
+    from services import amazon_api
+
+    return amazon_api
+
+
+def _fixture(name: str) -> bytes:
+    with open(os.path.join(BENCH_DIR, "fixtures", f"{name}.json"), "rb") as f:
+        return f.read()
+
+
+def _amazon_search(args):
+    api = _amazon_api(args)
+
+    def op():
+        result = api.search_products("industrial supplies", cache_mode="bypass")
+        assert result.get("success"), result
+    return op
+
+
+def _amazon_product(args):
+    api = _amazon_api(args)
+
+    def op():
+        result = api.get_product_details("B0BENCH001", cache_mode="bypass")
+        assert result.get("success"), result
+    return op
+
+
+def _amazon_seller(args):
+    api = _amazon_api(args)
+
+    def op():
+        result = api.get_seller_details("A2BENCHSELLER", cache_mode="bypass")
+        assert result.get("success"), result
+    return op
+
+
+def _parse_search(args):
+    from services.amazon_api import parse_search_response, search_params
+
+    content, params = _fixture("search"), search_params("industrial supplies")
+    return lambda: parse_search_response(200, content, params, "RELEVANT")
+
+
+def _parse_product(args):
+    from services.amazon_api import parse_product_response
+
+    content = _fixture("product")
+    return lambda: parse_product_response(200, content)
+
+
+# --- Chat storage ---
+
+_chat: Dict[str, Any] = {"db": None}
+
+
+def _chat_db(args):
+    """A fresh database on --mongo-uri, else an in-memory mongomock one"""
+    if _chat["db"] is None:
+        if args.mongo_uri:
+            from pymongo import MongoClient
+
+            client = MongoClient(args.mongo_uri)
+            name = f"procuredb_bench_{os.getpid()}"
+            _chat["cleanup"] = lambda: client.drop_database(name)
+            _chat["db"] = client[name]
+        else:
+            try:
+                import mongomock
+            except ImportError:
+                raise RuntimeError("chat cases need mongomock installed or --mongo-uri")
+            _chat["db"] = mongomock.MongoClient()["procuredb_bench"]
+    return _chat["db"]
+
+
+def _new_session(db, user_id, messages: int = 0) -> str:
+    from bson import ObjectId
+    from services import chat_store
+
+    session_id = str(ObjectId())
+    db.chatSessions.insert_one({
+        "sessionId": session_id, "userId": user_id, "productType": "Bench", "title": "Chat about Bench",
+        "createdAt": datetime.utcnow(), "updatedAt": datetime.utcnow(), **chat_store.new_session_fields(), "state": {},
+    })
+    for i in range(messages):
+        chat_store.append_message(db, session_id, user_id, _message(i), {"stage": "bench"})
+    return session_id
+
+
+def _message(i: int) -> Dict[str, Any]:
+    return {"role": "user" if i % 2 else "assistant", "content": f"Message {i}: need 500 units of steel sheets",
+            "url": None, "timestamp": datetime.utcnow()}
+
+
+def _chat_save(args):
+    from bson import ObjectId
+    from services import chat_store
+
+    db, user_id = _chat_db(args), ObjectId()
+    # Conversations of realistic length: a new session every 50 messages
+    current = {"session": _new_session(db, user_id), "count": 0}
+
+    def op():
+        if current["count"] == 50:
+            current["session"], current["count"] = _new_session(db, user_id), 0
+        assert chat_store.append_message(db, current["session"], user_id, _message(current["count"]), {"stage": "bench"})
+        current["count"] += 1
+    return op
+
+
+def _chat_load(args):
+    from bson import ObjectId
+    from services import chat_store
+
+    db, user_id = _chat_db(args), ObjectId()
+    session_id = _new_session(db, user_id, messages=200)
+    return lambda: chat_store.load_message_page(db, session_id, user_id, limit=50)
+
+
+CASES: List[Case] = [
+    ("vendor.recommend_vendors", _recommend_vendors),
+    ("vendor.score_vendors", _score_vendors),
+    ("prompt.build_prompt", _build_prompt),
+    ("amazon.search_products", _amazon_search),
+    ("amazon.get_product_details", _amazon_product),
+    ("amazon.get_seller_details", _amazon_seller),
+    ("amazon.parse_search", _parse_search),
+    ("amazon.parse_product", _parse_product),
+    ("chat.save", _chat_save),
+    ("chat.load_page", _chat_load),
+]
+
+
+# --- Baseline comparison ---
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+            tolerance: float) -> List[Tuple[str, Optional[float], Optional[float], bool]]:
+    """
+    Per case: (name, p50 change, throughput change, regressed), changes as
+    fractions of the baseline (positive p50 change = slower)
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            rows.append((name, None, None, False))
+            continue
+        p50_change = current["p50Ms"] / base["p50Ms"] - 1 if base["p50Ms"] else 0.0
+        ops_change = current["opsPerSec"] / base["opsPerSec"] - 1 if base["opsPerSec"] else 0.0
+        regressed = p50_change > tolerance or ops_change < -tolerance / (1 + tolerance)
+        rows.append((name, p50_change, ops_change, regressed))
+    return rows
+
+
+def _print_results(results, rows):
+    changes = {name: (p50, ops, regressed) for name, p50, ops, regressed in rows}
+    print(f"{'case':28} {'iters':>7} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}  vs baseline")
+    for name, r in results.items():
+        p50, ops, regressed = changes.get(name, (None, None, False))
+        versus = "no baseline" if p50 is None else f"p50 {p50:+.1%}  ops/s {ops:+.1%}"
+        if regressed:
+            versus += "  REGRESSION"
+        print(f"{name:28} {r['iterations']:>7} {r['opsPerSec']:>10.1f} {r['p50Ms']:>9.3f} {r['p90Ms']:>9.3f} "
+              f"{r['p99Ms']:>9.3f} {r['maxMs']:>9.3f}  {versus}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backend hot-path benchmarks")
+    parser.add_argument("--only", nargs="*", default=[], help="Run cases whose name starts with one of these")
+    parser.add_argument("--iterations", type=int, default=200, help="Minimum timed iterations per case")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds per case; the fastest (by p50) is reported")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum timed duration per case")
+    parser.add_argument("--vendors", type=int, default=5000, help="Synthetic catalog size for vendor cases")
+    parser.add_argument("--upstream-delay", type=float, default=0.0, help="Seconds the Amazon stub waits per response")
+    parser.add_argument("--mongo-uri", default=None, help="Run chat cases on this mongod instead of mongomock")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging a regression")
+    parser.add_argument("--json", dest="json_out", default=None, help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("RAPIDAPI_KEY", "bench")
+    # Keep per-call log events out of the report (and the timings)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Measure the client, not the RapidAPI rate limit
+    os.environ.setdefault("RAPIDAPI_RATE_LIMIT", "0")
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        for name, setup in CASES:
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            try:
+                op = setup(args)
+            except RuntimeError as e:
+                print(f"[Bench] Skipping {name}: {str(e)}")
+                continue
+            rounds = [measure(op, args.iterations, args.warmup, args.min_seconds) for _ in range(max(1, args.repeat))]
+            # Noise only ever makes a round slower
+            results[name] = min(rounds, key=lambda r: r["p50Ms"])
+    finally:
+        if _stub["server"] is not None:
+            _stub["server"].shutdown()
+        if "cleanup" in _chat:
+            _chat["cleanup"]()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance)
+    _print_results(results, rows)
+
+    report = {
+        "recordedAt": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"vendors": args.vendors, "upstreamDelay": args.upstream_delay,
+                     "chatBackend": "mongod" if args.mongo_uri else "mongomock"},
+        "cases": results,
+    }
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        # Keep baseline entries of cases not run this time
+        report["cases"] = {**baseline.get("cases", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"[Bench] Baseline written to {args.baseline}")
+        return 0
+
+    regressions = [name for name, _, _, regressed in rows if regressed]
+    if regressions:
+        print(f"[Bench] Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,24 @@
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from typing import List, Optional
 from models import ChatSession, ChatMessage, ChatSessionList
+from database import get_async_db
 import datetime
-import os
-from dotenv import load_dotenv
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
-# Load MongoDB URI from .env
-load_dotenv()
-MONGODB_URI = os.getenv("MONGO_URI")
-if not MONGODB_URI:
-    raise ValueError("MONGO_URI not found in environment variables")
-
-client = AsyncIOMotorClient(MONGODB_URI)
-db = client.get_database("procuredb")
-
 # Use underscore everywhere
 async def create_indexes():
-    await db.chat_history.create_index([("userId", 1)])
-    await db.chat_history.create_index([("sessionId", 1)])
-    await db.chat_history.create_index([("userId", 1), ("createdAt", -1)])
+    chat_history = get_async_db().chat_history
+    await chat_history.create_index([("userId", 1)])
+    await chat_history.create_index([("sessionId", 1)])
+    await chat_history.create_index([("userId", 1), ("createdAt", -1)])
 
 # Get chat sessions list (for sidebar)
 @router.get("/sessions/{user_id}", response_model=List[ChatSessionList])
 async def get_chat_sessions(user_id: str, limit: int = 10, skip: int = 0):
     try:
-        chats = await db.chat_history.find(
+        chats = await get_async_db().chat_history.find(
             {"userId": ObjectId(user_id), "isDeleted": {"$ne": True}}
         ).sort("createdAt", -1).skip(skip).limit(limit).to_list(None)
         
@@ -51,7 +41,7 @@ async def get_chat_sessions(user_id: str, limit: int = 10, skip: int = 0):
 @router.get("/session/{session_id}", response_model=ChatSession)
 async def get_chat_session(session_id: str, user_id: str):
     try:
-        chat = await db.chat_history.find_one({
+        chat = await get_async_db().chat_history.find_one({
             "sessionId": session_id,
             "userId": ObjectId(user_id),
             "isDeleted": {"$ne": True}
@@ -101,7 +91,7 @@ async def save_chat(chat: ChatSession):
             for msg in chat_data["messages"]
         ]
 
-        await db.chat_history.update_one(
+        await get_async_db().chat_history.update_one(
             {"userId": chat_data["userId"], "sessionId": chat_data["id"]},
             {"$set": chat_data},
             upsert=True
@@ -114,7 +104,7 @@ async def save_chat(chat: ChatSession):
 @router.post("/delete/{session_id}")
 async def delete_chat(session_id: str, user_id: str):
     try:
-        result = await db.chat_history.update_one(
+        result = await get_async_db().chat_history.update_one(
             {"userId": ObjectId(user_id), "sessionId": session_id},
             {"$set": {
                 "isDeleted": True,
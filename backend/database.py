@@ -0,0 +1,237 @@
+# database.py
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+from services.metrics import mongo_command_listener
+
+load_dotenv()
+
+# === Config ===
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "procuredb")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Empty means the server/URI default
+MONGO_WRITE_CONCERN_W = os.getenv("MONGO_WRITE_CONCERN_W", "")
+MONGO_WRITE_CONCERN_JOURNAL = os.getenv("MONGO_WRITE_CONCERN_JOURNAL", "")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so pool utilization can be reported"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.open = 0
+        self.checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.check_outs = 0
+        self.check_out_failures = 0
+        self.pool_clears = 0
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(created=1, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(closed=1, open=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add(check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(check_outs=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checkedOut": self.checked_out,
+                "created": self.created,
+                "closed": self.closed,
+                "checkOuts": self.check_outs,
+                "checkOutFailures": self.check_out_failures,
+                "poolClears": self.pool_clears,
+            }
+
+
+_lock = threading.Lock()
+_client: Optional[MongoClient] = None
+_client_pid: Optional[int] = None
+_pool_listener = PoolStatsListener()
+# Motor client for the ASGI app (asgi_app.py); created only when that app is used
+_async_client = None
+_async_client_pid: Optional[int] = None
+_async_pool_listener = PoolStatsListener()
+
+
+def _client_options(listener: PoolStatsListener) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "event_listeners": [listener, mongo_command_listener],
+    }
+    if MONGO_WRITE_CONCERN_W:
+        options["w"] = int(MONGO_WRITE_CONCERN_W) if MONGO_WRITE_CONCERN_W.isdigit() else MONGO_WRITE_CONCERN_W
+    if MONGO_WRITE_CONCERN_JOURNAL:
+        options["journal"] = MONGO_WRITE_CONCERN_JOURNAL.lower() == "true"
+    return options
+
+
+def get_client() -> MongoClient:
+    """
+    Return this process's MongoClient, creating it on first use.
+    A client inherited through fork() is never reused: its pool and monitor
+    threads belong to the parent, so the child builds its own.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _pool_listener.reset()
+                _client = MongoClient(MONGO_URI, **_client_options(_pool_listener))
+                _client_pid = pid
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+def get_async_client():
+    """
+    Return this process's motor client. Motor binds to the event loop it is
+    first used on, so use it from a single loop per process (one per uvicorn worker).
+    """
+    global _async_client, _async_client_pid
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        with _lock:
+            if _async_client is None or _async_client_pid != pid:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                _async_pool_listener.reset()
+                _async_client = AsyncIOMotorClient(MONGO_URI, **_client_options(_async_pool_listener))
+                _async_client_pid = pid
+    return _async_client
+
+
+def get_async_db():
+    return get_async_client()[MONGO_DB_NAME]
+
+
+def close_client():
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_pid = None, None
+
+
+def close_async_client():
+    global _async_client, _async_client_pid
+    with _lock:
+        if _async_client is not None and _async_client_pid == os.getpid():
+            _async_client.close()
+        _async_client, _async_client_pid = None, None
+
+
+def _after_fork_in_child():
+    # Drop the parent's clients without closing them; their sockets are shared with the parent
+    global _client, _client_pid, _async_client, _async_client_pid
+    _client, _client_pid = None, None
+    _async_client, _async_client_pid = None, None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _DatabaseProxy:
+    """
+    Module-level stand-in for the Database, resolved on every access so that
+    names bound at import time keep working after a fork.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+
+class _CollectionProxy:
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self._name], attr)
+
+
+db = _DatabaseProxy()
+
+
+def collection(name: str) -> _CollectionProxy:
+    """A fork-safe handle on a collection, suitable for module-level globals"""
+    return _CollectionProxy(name)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage of this process's client (and of its motor client, if any)"""
+    stats = _listener_stats(_pool_listener, _client is not None and _client_pid == os.getpid())
+    if _async_client is not None and _async_client_pid == os.getpid():
+        stats["async"] = _listener_stats(_async_pool_listener, True)
+    return stats
+
+
+def _listener_stats(listener: PoolStatsListener, connected: bool) -> Dict[str, Any]:
+    events = listener.snapshot()
+    return {
+        "pid": os.getpid(),
+        "connected": connected,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "writeConcern": MONGO_WRITE_CONCERN_W or "default",
+        "utilization": round(events["checkedOut"] / MONGO_MAX_POOL_SIZE, 4) if MONGO_MAX_POOL_SIZE else 0.0,
+        **events,
+    }
@@ -1,8 +1,9 @@
-import requests
 import json
 from typing import Dict, Any
 import os
 import dotenv
+from services import http_client
+from services.log import get_logger
 
 dotenv.load_dotenv()
 
@@ -16,6 +17,8 @@ HEADERS = {
     "X-RapidAPI-Host": RAPIDAPI_HOST
 }
 
+log = get_logger(__name__)
+
 # === Function ===
 def get_seller_profile(seller_id: str, country: str = "US") -> Dict[str, Any]:
     """
@@ -35,9 +38,9 @@ def get_seller_profile(seller_id: str, country: str = "US") -> Dict[str, Any]:
     }
 
     try:
-        print(f"Making request to {url} with params: {params}")
-        response = requests.get(url, headers=HEADERS, params=params, timeout=15)
-        print(f"Response status: {response.status_code}")
+        log.info("amazon.request", url=url, params=params)
+        response = http_client.get(url, headers=HEADERS, params=params)
+        log.info("amazon.response", endpoint="seller-profile", status=response.status_code)
 
         if response.status_code != 200:
             return {
@@ -67,9 +70,7 @@ def get_seller_profile(seller_id: str, country: str = "US") -> Dict[str, Any]:
             "store_link": profile_data.get("store_link")
         }
 
-        print("\n=== Selected Seller Profile Details ===")
-        for key, value in selected_data.items():
-            print(f"{key}: {value}")
+        log.debug("seller_profile.selected", **selected_data)
 
         return {
             "success": True,
@@ -77,6 +78,7 @@ def get_seller_profile(seller_id: str, country: str = "US") -> Dict[str, Any]:
         }
 
     except Exception as e:
+        log.exception("seller_profile.error", seller_id=seller_id, error=str(e))
         return {
             "error": "Unexpected error",
             "details": str(e)
@@ -1,19 +1,17 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 import bcrypt
-from pymongo import MongoClient
-import os
 from dotenv import load_dotenv
+from database import collection
+from services.log import get_logger
 
 load_dotenv()
 login = Blueprint("login", __name__)
 
 CORS(login, origins=["http://localhost:5173"], supports_credentials=True)
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri)
-db = mongo_client["procuredb"]
-users_collection = db["users"]
+users_collection = collection("users")
+log = get_logger(__name__)
 
 @login.route("/api/login", methods=["POST"])
 def login_user():
@@ -37,5 +35,5 @@ def login_user():
         else:
             return jsonify({"success": False, "message": "Invalid credentials"}), 401
     except Exception as e:
-        print("Login Error:", e)
+        log.exception("login.error", error=str(e))
         return jsonify({"success": False, "message": "Login failed"}), 500
@@ -0,0 +1,49 @@
+# migrate_chat_messages.py
+"""
+Move chat messages embedded in chatSessions documents into chatMessageBuckets.
+
+    python migrate_chat_messages.py --dry-run
+    python migrate_chat_messages.py [--user <userId>] [--limit N]
+
+Run it after (or just before) switching CHAT_STORAGE_MODE to "bucketed". Stop chat
+writes while it runs: a message saved to a session mid-migration can be lost.
+Sessions without embedded messages are skipped, so the tool can be re-run safely.
+Switching back to "embedded" after migrating is not supported.
+"""
+import argparse
+
+from bson import ObjectId
+
+from database import get_db
+from services import chat_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate embedded chat messages into buckets")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--user", help="Only migrate sessions of this userId")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many sessions")
+    args = parser.parse_args()
+
+    db = get_db()
+
+    query = {"messages.0": {"$exists": True}}
+    if args.user:
+        query["userId"] = ObjectId(args.user)
+
+    sessions_done = messages_done = 0
+    for session in db.chatSessions.find(query).limit(args.limit):
+        if args.dry_run:
+            count = chat_store.message_count(session)
+        else:
+            count = chat_store.migrate_session(db, session)
+        sessions_done += 1
+        messages_done += count
+        print(f"{'Would migrate' if args.dry_run else 'Migrated'} session {session['sessionId']}: {count} messages")
+
+    print(f"{sessions_done} sessions, {messages_done} messages "
+          f"({'dry run' if args.dry_run else f'bucket size {chat_store.CHAT_BUCKET_SIZE}'})")
+
+
+if __name__ == "__main__":
+    main()
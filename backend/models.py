@@ -1,11 +1,11 @@
 # models.py
-from pymongo import MongoClient
 from datetime import datetime
 from bson import ObjectId
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field, validator
-import os
 from dotenv import load_dotenv
+from database import get_client, get_db
+from services.indexes import ensure_indexes
 
 # Load environment variables
 load_dotenv()
@@ -41,17 +41,14 @@ class ChatSession(BaseModel):
 
 class ChatHistoryModel:
     def __init__(self):
-        self.client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
-        self.db = self.client.get_database("procuredb")
+        self.client = get_client()
+        self.db = get_db()
         self.chat_history = self.db["chat_history"]
         self._create_indexes()
 
     def _create_indexes(self):
-        """Ensure proper indexes exist for performance"""
-        self.chat_history.create_index([("userId", 1)])
-        self.chat_history.create_index([("sessionId", 1)], unique=True)
-        self.chat_history.create_index([("userId", 1), ("createdAt", -1)])
-        self.chat_history.create_index([("title", "text")])  # For text search
+        """Ensure proper indexes exist for performance (declared in services/indexes.py)"""
+        ensure_indexes(self.db, collections=["chat_history"])
 
     def save_chat_session(self, chat_data: Dict):
         """
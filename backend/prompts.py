@@ -19,4 +19,23 @@ User Request: {request['item']} ({request['quantity']} units) needed in {request
 Top Vendors:
 {vendor_lines}
 
-Suggest the best-fit vendor with a brief comparison and reasoning. Format your response for easy reading in a chat interface without using any special markdown symbols."""
\ No newline at end of file
+Suggest the best-fit vendor with a brief comparison and reasoning. Format your response for easy reading in a chat interface without using any special markdown symbols."""
+
+def prompt_facts(request):
+    """The request fields build_prompt uses, for keying near-duplicate LLM cache hits"""
+    return "|".join(
+        " ".join(str(request[field]).lower().split())
+        for field in ("item", "quantity", "location", "days_needed")
+    )
+
+def build_analysis_prompt(product):
+    return f"""Analyze this product for procurement:
+                Product: {product['ProductTitle']}
+                Price: {product.get('price', 'N/A')}
+                
+                Provide a brief procurement recommendation including:
+                1. Suggested quantity range
+                2. Key specifications to verify
+                3. Potential alternatives to consider
+                
+                Format response in a conversational tone."""
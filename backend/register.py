@@ -1,18 +1,16 @@
 from flask import Blueprint, request, jsonify
 import bcrypt
-from pymongo import MongoClient
-import os
 from dotenv import load_dotenv
+from database import collection
+from services.log import get_logger
 from flask_cors import CORS
 
 load_dotenv()
 register = Blueprint("register", __name__)
 CORS(register, origins=["http://localhost:5173", "http://127.0.0.1:5173"], supports_credentials=True)
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri)
-db = mongo_client["procuredb"]
-users_collection = db["users"]
+users_collection = collection("users")
+log = get_logger(__name__)
 
 @register.route("/api/register", methods=["POST"])
 def register_user():
@@ -47,5 +45,5 @@ def register_user():
 
         return jsonify({"success": True, "message": "User registered successfully", "user": user_obj}), 201
     except Exception as e:
-        print("Register Error:", e)
+        log.exception("register.error", error=str(e))
         return jsonify({"success": False, "message": "Registration failed"}), 500
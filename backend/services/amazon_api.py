@@ -2,9 +2,18 @@ import os
 import requests
 from typing import Dict, Any
 import json
+from services.cache import response_cache, make_key
+from services import http_client
+from services.records import Product, Review
+from services.rate_limiter import RateLimited, INTERACTIVE
+from services.circuit_breaker import CircuitOpen, get_breaker
+from services.log import get_logger
+
+log = get_logger(__name__)
 
 # RAPIDAPI constants
-RAPIDAPI_BASE_URL = "https://realtime-amazon-data.p.rapidapi.com"
+# Overridable to run against a local stand-in (stubs/amazon_server.py)
+RAPIDAPI_BASE_URL = os.getenv("RAPIDAPI_BASE_URL", "https://realtime-amazon-data.p.rapidapi.com")
 RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST", "realtime-amazon-data.p.rapidapi.com")
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
 
@@ -20,13 +29,48 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-def search_products(query: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANT") -> Dict[str, Any]:
+def search_products(query: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANT",
+                    cache_mode: str = "default", priority: str = INTERACTIVE) -> Dict[str, Any]:
+    """
+    Search for products on Amazon using RapidAPI, served from the response cache when possible.
+    `priority` is the rate limit class of the upstream request (services/rate_limiter.py).
+    """
+    # Normalized once so the cache key, the upstream request and the echoed sortBy agree
+    sort_by = normalize_sort_by(sort_by)
+    key = make_key("search", query, int(page), country.upper(), sort_by)
+    return response_cache.fetch(
+        "search", key, lambda: _search_products(query, page, country, sort_by, priority), mode=cache_mode,
+        breaker=get_breaker("rapidapi", "search")
+    )
+
+def _search_products(query: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANT",
+                     priority: str = INTERACTIVE) -> Dict[str, Any]:
     """
     Search for products on Amazon using RapidAPI
     """
     url = f"{RAPIDAPI_BASE_URL}/search"
-    
-    params = {
+    params = search_params(query, page, country, sort_by)
+
+    try:
+        log.info("amazon.request", url=url, params=params)
+        response = http_client.get(url, headers=HEADERS, params=params, upstream="rapidapi", priority=priority)
+    except (RateLimited, CircuitOpen) as e:
+        return not_sent_error(url, e)
+    except requests.exceptions.RequestException as e:
+        log.error("amazon.request_failed", url=url, error=str(e))
+        return {"error": "Request failed", "details": str(e)}
+    except Exception as e:
+        log.exception("amazon.request_error", url=url, error=str(e))
+        return {"error": "Unexpected error", "details": str(e)}
+
+    return parse_search_response(response.status_code, response.content, params, sort_by)
+
+def normalize_sort_by(sort_by: str) -> str:
+    """Sort order as RapidAPI expects it: trimmed and upper-case, e.g. PRICE_LOW_TO_HIGH"""
+    return sort_by.strip().upper()
+
+def search_params(query: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANT") -> Dict[str, str]:
+    return {
         "query": query,
         "page": str(page),
         "country": country.upper(),
@@ -34,27 +78,35 @@ def search_products(query: str, page: int = 1, country: str = "US", sort_by: str
         "product_condition": "ALL",
         "is_prime": "false"
     }
-    
-    try:
-        print(f"[AmazonAPI] Requesting: {url}")
-        print(f"[AmazonAPI] Params: {params}")
 
-        response = requests.get(url, headers=HEADERS, params=params, timeout=15)
-        
-        print(f"[AmazonAPI] Response status: {response.status_code}")
+def not_sent_error(url: str, error: Exception) -> Dict[str, Any]:
+    """Error payload for a request stopped by the rate limiter (RateLimited) or a circuit breaker (CircuitOpen)"""
+    kind = "Upstream unavailable" if isinstance(error, CircuitOpen) else "Rate limited"
+    log.warning("amazon.not_sent", url=url, reason=kind, error=str(error), retry_after=round(error.retry_after, 3))
+    return {"error": kind, "details": str(error), "retryAfter": round(error.retry_after, 3)}
 
-        if response.status_code != 200:
-            print(f"[AmazonAPI] Error response: {response.text}")
+def _error_text(content: bytes) -> str:
+    return content.decode("utf-8", errors="replace")
+
+def parse_search_response(status_code: int, content: bytes, params: Dict[str, str], sort_by: str) -> Dict[str, Any]:
+    """
+    Turn a RapidAPI /search response into the search payload.
+    Pure function shared by the sync client and the async one (services/async_amazon_api.py).
+    """
+    try:
+        if status_code != 200:
+            log.warning("amazon.error_response", endpoint="search", status=status_code,
+                        details=_error_text(content))
             return {
                 "error": "API request failed",
-                "status": response.status_code,
-                "details": response.text
+                "status": status_code,
+                "details": _error_text(content)
             }
 
-        data = response.json()
+        data = json.loads(content)
         
         products_list = data.get("data", {}).get("products", [])
-        print(f"[AmazonAPI] Products returned: {len(products_list)}")
+        log.info("amazon.response", endpoint="search", status=status_code, products=len(products_list))
 
         if not isinstance(data, dict):
             return {
@@ -63,31 +115,15 @@ def search_products(query: str, page: int = 1, country: str = "US", sort_by: str
             }
             
         if not products_list:
-            print(f"[AmazonAPI] No products found for params: {params}")
+            log.info("amazon.no_results", params=params)
             return {
                 "success": False,
                 "error": "No products found"
             }
         
-        products = []
-        for item in products_list:
-            if isinstance(item, dict):
-                products.append({
-                    "ProductTitle": item.get("product_title", ""),
-                    "asin": item.get("asin", ""),
-                    "price": item.get("product_price", "N/A"),
-                    "discount": item.get("discount", ""),
-                    "originalPrice": item.get("product_original_price", "N/A"),
-                    "rating": item.get("product_star_rating", "N/A"),
-                    "totalRatings": item.get("product_num_ratings", "N/A"),
-                    "productUrl": item.get("product_url", ""),
-                    "productImage": item.get("product_photo", ""),
-                    "isPrime": item.get("is_prime", "false"),
-                    "isBestSeller": item.get("is_best_seller", "false"),
-                    "isAmazonChoice": item.get("is_amazon_choice", "false"),
-                    "variantsAvailable": item.get("has_variants", "false")
-                })
-            
+        # Slotted records; they become dicts only when the response is serialized
+        products = [Product.from_api(item) for item in products_list if isinstance(item, dict)]
+
         return {
             "success": True,
             "data": {
@@ -103,42 +139,68 @@ def search_products(query: str, page: int = 1, country: str = "US", sort_by: str
             }
         }
         
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {str(e)}")
-        return {"error": "Request failed", "details": str(e)}
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
+        log.error("amazon.invalid_json", status=status_code, error=str(e))
         return {"error": "Invalid JSON response", "details": str(e)}
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        log.exception("amazon.parse_error", status=status_code, error=str(e))
         return {"error": "Unexpected error", "details": str(e)}
 
-def get_product_details(asin: str, country: str = "US") -> Dict[str, Any]:
+def get_product_details(asin: str, country: str = "US", cache_mode: str = "default",
+                        priority: str = INTERACTIVE) -> Dict[str, Any]:
+    """
+    Get product details, served from the response cache when possible
+    """
+    key = make_key("product", asin.strip().upper(), country.upper())
+    return response_cache.fetch(
+        "product", key, lambda: _get_product_details(asin, country, priority), mode=cache_mode,
+        breaker=get_breaker("rapidapi", "product-details")
+    )
+
+def _get_product_details(asin: str, country: str = "US", priority: str = INTERACTIVE) -> Dict[str, Any]:
     """
     Get detailed information about a specific Amazon product using RapidAPI
     """
     url = f"{RAPIDAPI_BASE_URL}/product-details"
-    
-    params = {
+    params = product_params(asin, country)
+
+    try:
+        log.info("amazon.request", url=url, params=params)
+        
+        response = http_client.get(url, headers=HEADERS, params=params, upstream="rapidapi", priority=priority)
+    except (RateLimited, CircuitOpen) as e:
+        return not_sent_error(url, e)
+    except requests.exceptions.RequestException as e:
+        log.error("amazon.request_failed", url=url, error=str(e))
+        return {"error": "Request failed", "details": str(e)}
+    except Exception as e:
+        log.exception("amazon.request_error", url=url, error=str(e))
+        return {"error": "Unexpected error", "details": str(e)}
+
+    return parse_product_response(response.status_code, response.content)
+
+def product_params(asin: str, country: str = "US") -> Dict[str, str]:
+    return {
         "asin": asin,
         "country": country.upper()
     }
-    
+
+def parse_product_response(status_code: int, content: bytes) -> Dict[str, Any]:
+    """
+    Turn a RapidAPI /product-details response into the product payload
+    """
     try:
-        print(f"[AmazonAPI] Requesting: {url}")
-        print(f"[AmazonAPI] Params: {params}")
-        
-        response = requests.get(url, headers=HEADERS, params=params, timeout=15)
-        print(f"[AmazonAPI] Response status: {response.status_code}")
-        
-        if response.status_code != 200:
+        if status_code != 200:
+            log.warning("amazon.error_response", endpoint="product-details", status=status_code,
+                        details=_error_text(content))
             return {
                 "error": "API request failed",
-                "status": response.status_code,
-                "details": response.text
+                "status": status_code,
+                "details": _error_text(content)
             }
-        
-        data = response.json()
+        log.info("amazon.response", endpoint="product-details", status=status_code)
+
+        data = json.loads(content)
         
         if not data.get("data"):
             return {
@@ -176,42 +238,68 @@ def get_product_details(asin: str, country: str = "US") -> Dict[str, Any]:
             }
         }
         
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {str(e)}")
-        return {"error": "Request failed", "details": str(e)}
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
+        log.error("amazon.invalid_json", status=status_code, error=str(e))
         return {"error": "Invalid JSON response", "details": str(e)}
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        log.exception("amazon.parse_error", status=status_code, error=str(e))
         return {"error": "Unexpected error", "details": str(e)}
 
-def get_seller_details(seller_id: str, country: str = "US") -> Dict[str, Any]:
+def get_seller_details(seller_id: str, country: str = "US", cache_mode: str = "default",
+                       priority: str = INTERACTIVE) -> Dict[str, Any]:
+    """
+    Get seller details, served from the response cache when possible
+    """
+    key = make_key("seller", seller_id.strip().upper(), country.upper())
+    return response_cache.fetch(
+        "seller", key, lambda: _get_seller_details(seller_id, country, priority), mode=cache_mode,
+        breaker=get_breaker("rapidapi", "seller-details")
+    )
+
+def _get_seller_details(seller_id: str, country: str = "US", priority: str = INTERACTIVE) -> Dict[str, Any]:
     """
     Get profile information for a specific Amazon seller using RapidAPI
     """
     url = f"{RAPIDAPI_BASE_URL}/seller-details"
-    
-    params = {
+    params = seller_params(seller_id, country)
+
+    try:
+        log.info("amazon.request", url=url, params=params)
+        
+        response = http_client.get(url, headers=HEADERS, params=params, upstream="rapidapi", priority=priority)
+    except (RateLimited, CircuitOpen) as e:
+        return not_sent_error(url, e)
+    except requests.exceptions.RequestException as e:
+        log.error("amazon.request_failed", url=url, error=str(e))
+        return {"error": "Request failed", "details": str(e)}
+    except Exception as e:
+        log.exception("amazon.request_error", url=url, error=str(e))
+        return {"error": "Unexpected error", "details": str(e)}
+
+    return parse_seller_response(response.status_code, response.content, country)
+
+def seller_params(seller_id: str, country: str = "US") -> Dict[str, str]:
+    return {
         "sellerId": seller_id,
         "country": country.upper()
     }
-    
+
+def parse_seller_response(status_code: int, content: bytes, country: str = "US") -> Dict[str, Any]:
+    """
+    Turn a RapidAPI /seller-details response into the seller payload
+    """
     try:
-        print(f"[AmazonAPI] Requesting: {url}")
-        print(f"[AmazonAPI] Params: {params}")
-        
-        response = requests.get(url, headers=HEADERS, params=params, timeout=15)
-        print(f"[AmazonAPI] Response status: {response.status_code}")
-        
-        if response.status_code != 200:
+        if status_code != 200:
+            log.warning("amazon.error_response", endpoint="seller-details", status=status_code,
+                        details=_error_text(content))
             return {
                 "error": "API request failed",
-                "status": response.status_code,
-                "details": response.text
+                "status": status_code,
+                "details": _error_text(content)
             }
-        
-        data = response.json()
+        log.info("amazon.response", endpoint="seller-details", status=status_code)
+
+        data = json.loads(content)
         
         if not data.get("data"):
             return {
@@ -221,15 +309,7 @@ def get_seller_details(seller_id: str, country: str = "US") -> Dict[str, Any]:
         
         profile_data = data.get("data", {})
         
-        reviews = []
-        for review in profile_data.get("seller_feedback", []):
-            reviews.append({
-                "rating": review.get("rating", ""),
-                "reviewText": review.get("feedback_text", ""),
-                "username": review.get("reviewer_name", ""),
-                "date": review.get("feedback_date", ""),
-                "suppressedMessage": review.get("suppressed_message", "Not Available")
-            })
+        reviews = [Review.from_api(review) for review in profile_data.get("seller_feedback", [])]
         
         return {
             "success": True,
@@ -251,12 +331,9 @@ def get_seller_details(seller_id: str, country: str = "US") -> Dict[str, Any]:
             }
         }
         
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {str(e)}")
-        return {"error": "Request failed", "details": str(e)}
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
+        log.error("amazon.invalid_json", status=status_code, error=str(e))
         return {"error": "Invalid JSON response", "details": str(e)}
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        log.exception("amazon.parse_error", status=status_code, error=str(e))
         return {"error": "Unexpected error", "details": str(e)}
\ No newline at end of file
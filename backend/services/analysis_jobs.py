@@ -0,0 +1,358 @@
+# services/analysis_jobs.py
+"""
+Background procurement analyses for product pages.
+
+A job streams its Gemini completion into `chunks`; clients poll it or follow
+its /events stream. With ANALYSIS_JOBS_STORE=mongo (the default) jobs live in
+the analysisJobs collection, one document per dedup key, so a poll may reach
+any worker and concurrent requests for an ASIN share one job across workers.
+The worker running a job also keeps it in memory and wakes its own waiters
+directly; other workers poll the document every ANALYSIS_POLL_INTERVAL.
+ANALYSIS_JOBS_STORE=memory keeps jobs in the process only, which is correct
+with a single worker.
+"""
+import os
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from prompts import build_analysis_prompt
+from services.gemini import stream_generate_content
+from services.log import get_logger
+
+# === Config ===
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+# How long a finished analysis is kept and reused for the same ASIN
+ANALYSIS_JOB_TTL = int(os.getenv("ANALYSIS_JOB_TTL", "900"))
+# A job still pending or running after this many seconds is reported as failed
+ANALYSIS_JOB_TIMEOUT = int(os.getenv("ANALYSIS_JOB_TIMEOUT", "180"))
+# "mongo" (shared by all workers) or "memory" (single worker only)
+ANALYSIS_JOBS_STORE = os.getenv("ANALYSIS_JOBS_STORE", "mongo").lower()
+ANALYSIS_JOBS_COLLECTION = os.getenv("ANALYSIS_JOBS_COLLECTION", "analysisJobs")
+# Seconds between writes of streamed text to MongoDB, and between polls by other workers
+ANALYSIS_FLUSH_INTERVAL = float(os.getenv("ANALYSIS_FLUSH_INTERVAL", "0.25"))
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", "0.5"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+log = get_logger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+# Jobs this process runs (and, in memory mode, all jobs)
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_by_key: Dict[str, str] = {}
+_cond = threading.Condition()
+# (loop, event) pairs of coroutines in wait_for_update_async
+_async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+_collection = None
+_collection_lock = threading.Lock()
+
+
+def _shared() -> bool:
+    return ANALYSIS_JOBS_STORE == "mongo"
+
+
+def _get_collection():
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                from database import collection as shared_collection
+                collection = shared_collection(ANALYSIS_JOBS_COLLECTION)
+                collection.create_index([("jobId", ASCENDING)], name="jobId_1", unique=True)
+                collection.create_index("expiresAt", expireAfterSeconds=0)
+                _collection = collection
+    return _collection
+
+
+def _job_key(product: Dict[str, Any]) -> str:
+    asin = (product.get("asin") or "").strip().upper()
+    return asin or " ".join(product.get("ProductTitle", "").split()).lower()
+
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    result = {"jobId": job["jobId"], "status": job["status"], "asin": job["asin"]}
+    if job["status"] == "done":
+        result["ai_analysis"] = job["result"]
+    elif job["status"] == "failed":
+        result["error"] = job["error"]
+    return result
+
+
+def _check_timeout(job: Dict[str, Any], now: float) -> bool:
+    """Mark a job failed if it has been pending or running too long, e.g. its thread hangs"""
+    if job["status"] in ACTIVE_STATUSES and now - job["createdAt"] > ANALYSIS_JOB_TIMEOUT:
+        job.update(status="failed", result=None, error="Analysis timed out", finishedAt=now)
+        return True
+    return False
+
+
+def _expires_at(job: Dict[str, Any]) -> datetime:
+    # Unfinished jobs expire as if they had timed out, so a hung one is still removed
+    ends = job["finishedAt"] if job["finishedAt"] is not None else job["createdAt"] + ANALYSIS_JOB_TIMEOUT
+    return datetime.utcfromtimestamp(ends) + timedelta(seconds=ANALYSIS_JOB_TTL)
+
+
+def _prune(now: float):
+    # Caller holds _cond
+    expired = []
+    for job_id, job in _jobs.items():
+        if _check_timeout(job, now):
+            log.warning("analysis.timed_out", job=job_id)
+            _notify()
+        if job["finishedAt"] is not None and now - job["finishedAt"] > ANALYSIS_JOB_TTL:
+            expired.append(job_id)
+    for job_id in expired:
+        job = _jobs.pop(job_id)
+        if _jobs_by_key.get(job["key"]) == job_id:
+            del _jobs_by_key[job["key"]]
+
+
+def _notify():
+    # Caller holds _cond
+    _cond.notify_all()
+    for loop, event in _async_waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The waiter's loop is closed
+            pass
+
+
+# --- MongoDB store ---
+
+_DOC_FIELDS = ("jobId", "asin", "status", "result", "error", "chunks", "createdAt", "finishedAt")
+
+
+def _to_doc(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {**{field: job[field] for field in _DOC_FIELDS}, "expiresAt": _expires_at(job)}
+
+
+def _from_doc(doc: Dict[str, Any], now: float) -> Dict[str, Any]:
+    job = {field: doc.get(field) for field in _DOC_FIELDS}
+    job["key"] = doc["_id"]
+    job["chunks"] = job["chunks"] or []
+    # Its worker may have died; the document then stays pending until the timeout
+    _check_timeout(job, now)
+    return job
+
+
+def _claim(job: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+    """
+    Store a new job under its key unless a live one exists.
+    Returns:
+        None if `job` was stored, else the existing job
+    """
+    collection = _get_collection()
+    try:
+        collection.insert_one({"_id": job["key"], **_to_doc(job)})
+        return None
+    except DuplicateKeyError:
+        pass
+    # Take over a failed, expired or timed-out job's document
+    replaced = collection.find_one_and_update(
+        {"_id": job["key"], "$or": [
+            {"status": "failed"},
+            {"expiresAt": {"$lte": datetime.utcnow()}},
+            {"status": {"$in": list(ACTIVE_STATUSES)}, "createdAt": {"$lt": now - ANALYSIS_JOB_TIMEOUT}},
+        ]},
+        {"$set": _to_doc(job)},
+    )
+    if replaced is not None:
+        return None
+    current = collection.find_one({"_id": job["key"]})
+    if current is None:
+        # Removed by the TTL monitor in between
+        return _claim(job, now)
+    return _from_doc(current, now)
+
+
+def _persist(job: Dict[str, Any]):
+    """Write a job this process runs; a document taken over by a newer job is left alone"""
+    snapshot = _to_doc(job)
+    try:
+        _get_collection().update_one({"_id": job["key"], "jobId": job["jobId"]}, {"$set": snapshot})
+    except Exception as e:
+        log.warning("analysis.persist_failed", job=job["jobId"], error=str(e))
+
+
+def _load_shared(job_id: str) -> Optional[Dict[str, Any]]:
+    doc = _get_collection().find_one({"jobId": job_id})
+    return _from_doc(doc, time.time()) if doc else None
+
+
+# --- jobs ---
+
+def _run(job_id: str, prompt: str, facts: str):
+    with _cond:
+        job = _jobs[job_id]
+        job["status"] = "running"
+        _notify()
+    if _shared():
+        _persist(job)
+
+    flushed_at = time.monotonic()
+    try:
+        # Stream so /events subscribers see tokens as they are generated
+        # The product key keeps near-duplicate cache hits to the same product
+        for chunk in stream_generate_content(prompt, cache_facts=facts):
+            with _cond:
+                job["chunks"].append(chunk)
+                _notify()
+            if _shared() and time.monotonic() - flushed_at >= ANALYSIS_FLUSH_INTERVAL:
+                _persist(job)
+                flushed_at = time.monotonic()
+        with _cond:
+            text = "".join(job["chunks"])
+        status, result, error = "done", text, None
+    except Exception as e:
+        log.exception("gemini.error", job=job_id, error=str(e))
+        status, result, error = "failed", None, str(e)
+
+    with _cond:
+        if job["status"] in ACTIVE_STATUSES:
+            job.update(status=status, result=result, error=error, finishedAt=time.time())
+        else:
+            # Timed out meanwhile; waiters were already told it failed
+            log.warning("analysis.finished_after_timeout", job=job_id, status=status)
+        _notify()
+    if _shared():
+        _persist(job)
+
+
+def submit_analysis(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Queue a procurement analysis for a product.
+    Concurrent or repeated requests for the same ASIN share one job (and one
+    LLM call) until it fails, times out or its result expires.
+    Returns:
+        The public job view: jobId, status and, once finished, ai_analysis or error
+    """
+    key = _job_key(product)
+    now = time.time()
+    job = {
+        "jobId": uuid.uuid4().hex,
+        "key": key,
+        "asin": product.get("asin", ""),
+        "status": "pending",
+        "result": None,
+        "error": None,
+        "chunks": [],
+        "createdAt": now,
+        "finishedAt": None,
+    }
+    with _cond:
+        _prune(now)
+        existing = _jobs.get(_jobs_by_key.get(key, ""))
+        if existing and existing["status"] != "failed":
+            return _public(existing)
+
+    if _shared():
+        existing = _claim(job, now)
+        if existing is not None:
+            return _public(existing)
+
+    with _cond:
+        _jobs[job["jobId"]] = job
+        _jobs_by_key[key] = job["jobId"]
+
+    _executor.submit(_run, job["jobId"], build_analysis_prompt(product), key)
+    return _public(job)
+
+
+def _find(job_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """(job, whether this process runs it)"""
+    with _cond:
+        job = _jobs.get(job_id)
+        if job is not None:
+            if _check_timeout(job, time.time()):
+                _notify()
+            return job, True
+    if _shared():
+        return _load_shared(job_id), False
+    return None, False
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job, _ = _find(job_id)
+    return _public(job) if job else None
+
+
+async def get_job_async(job_id: str) -> Optional[Dict[str, Any]]:
+    """get_job() for the ASGI app; a MongoDB lookup runs on a worker thread"""
+    if job_id in _jobs or not _shared():
+        return get_job(job_id)
+    return await asyncio.to_thread(get_job, job_id)
+
+
+def _changed(job: Dict[str, Any], last_status: Optional[str],
+             seen_chunks: Optional[int]) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+    new_chunks = job["chunks"][seen_chunks:] if seen_chunks is not None else []
+    if job["status"] != last_status or new_chunks:
+        return _public(job), new_chunks
+    return None
+
+
+def wait_for_update(job_id: str, last_status: Optional[str], seen_chunks: Optional[int],
+                    timeout: float) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Block until the job's status differs from `last_status`, new text chunks
+    arrive past `seen_chunks` (ignored when None), or `timeout` passes.
+    Returns:
+        The current public job view (None if the job does not exist) and any new chunks
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job, local = _find(job_id)
+        if job is None:
+            return None, []
+        with _cond:
+            update = _changed(job, last_status, seen_chunks)
+            if update is not None:
+                return update
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return _public(job), []
+            if local:
+                # Woken by the job's thread; the timeout check needs a wake-up now and then too
+                _cond.wait(min(remaining, ANALYSIS_JOB_TIMEOUT))
+                continue
+        time.sleep(min(remaining, ANALYSIS_POLL_INTERVAL))
+
+
+async def wait_for_update_async(job_id: str, last_status: Optional[str], seen_chunks: Optional[int],
+                                timeout: float) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """wait_for_update() for the ASGI app: waits on an asyncio.Event instead of blocking a thread"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    waiter = (loop, asyncio.Event())
+    with _cond:
+        _async_waiters.add(waiter)
+    try:
+        while True:
+            local = job_id in _jobs
+            if local or not _shared():
+                job, new_chunks = wait_for_update(job_id, last_status, seen_chunks, 0)
+            else:
+                job, new_chunks = await asyncio.to_thread(wait_for_update, job_id, last_status, seen_chunks, 0)
+            if job is None or job["status"] != last_status or new_chunks:
+                return job, new_chunks
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return job, []
+            try:
+                # Jobs run by another worker are polled
+                await asyncio.wait_for(waiter[1].wait(), remaining if local else min(remaining, ANALYSIS_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+            waiter[1].clear()
+    finally:
+        with _cond:
+            _async_waiters.discard(waiter)
@@ -0,0 +1,90 @@
+# services/async_amazon_api.py
+"""
+Non-blocking versions of the services/amazon_api.py lookups for the ASGI app.
+Requests go through services/async_http_client.py; response parsing and the
+response cache are shared with the sync client.
+"""
+from typing import Any, Dict
+
+import httpx
+
+from services.amazon_api import (
+    RAPIDAPI_BASE_URL,
+    HEADERS,
+    search_params,
+    product_params,
+    seller_params,
+    parse_search_response,
+    parse_product_response,
+    parse_seller_response,
+    normalize_sort_by,
+    not_sent_error,
+)
+from services.cache import response_cache, make_key
+from services import async_http_client
+from services.rate_limiter import RateLimited, INTERACTIVE
+from services.circuit_breaker import CircuitOpen, get_breaker
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+
+async def _get(url: str, params: Dict[str, str], priority: str = INTERACTIVE):
+    """
+    Returns:
+        The response, or the error payload if the request could not be made
+    """
+    try:
+        log.info("amazon.request", url=url, params=params)
+        return await async_http_client.get(url, headers=HEADERS, params=params, upstream="rapidapi",
+                                           priority=priority)
+    except (RateLimited, CircuitOpen) as e:
+        return not_sent_error(url, e)
+    except httpx.HTTPError as e:
+        log.error("amazon.request_failed", url=url, error=str(e))
+        return {"error": "Request failed", "details": str(e)}
+    except Exception as e:
+        log.exception("amazon.request_error", url=url, error=str(e))
+        return {"error": "Unexpected error", "details": str(e)}
+
+
+async def search_products(query: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANT",
+                          cache_mode: str = "default", priority: str = INTERACTIVE) -> Dict[str, Any]:
+    sort_by = normalize_sort_by(sort_by)
+
+    async def load():
+        params = search_params(query, page, country, sort_by)
+        response = await _get(f"{RAPIDAPI_BASE_URL}/search", params, priority)
+        if isinstance(response, dict):
+            return response
+        return parse_search_response(response.status_code, response.content, params, sort_by)
+
+    key = make_key("search", query, int(page), country.upper(), sort_by)
+    return await response_cache.fetch_async("search", key, load, mode=cache_mode,
+                                            breaker=get_breaker("rapidapi", "search"))
+
+
+async def get_product_details(asin: str, country: str = "US", cache_mode: str = "default",
+                              priority: str = INTERACTIVE) -> Dict[str, Any]:
+    async def load():
+        response = await _get(f"{RAPIDAPI_BASE_URL}/product-details", product_params(asin, country), priority)
+        if isinstance(response, dict):
+            return response
+        return parse_product_response(response.status_code, response.content)
+
+    key = make_key("product", asin.strip().upper(), country.upper())
+    return await response_cache.fetch_async("product", key, load, mode=cache_mode,
+                                            breaker=get_breaker("rapidapi", "product-details"))
+
+
+async def get_seller_details(seller_id: str, country: str = "US", cache_mode: str = "default",
+                             priority: str = INTERACTIVE) -> Dict[str, Any]:
+    async def load():
+        response = await _get(f"{RAPIDAPI_BASE_URL}/seller-details", seller_params(seller_id, country), priority)
+        if isinstance(response, dict):
+            return response
+        return parse_seller_response(response.status_code, response.content, country)
+
+    key = make_key("seller", seller_id.strip().upper(), country.upper())
+    return await response_cache.fetch_async("seller", key, load, mode=cache_mode,
+                                            breaker=get_breaker("rapidapi", "seller-details"))
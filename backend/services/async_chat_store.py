@@ -0,0 +1,95 @@
+# services/async_chat_store.py
+"""
+Motor (non-blocking) versions of the services/chat_store.py reads and writes,
+used by the ASGI app. Storage layout and query shapes are identical; see
+chat_store for the details of each operation.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from services.chat_store import (
+    BUCKETS_COLLECTION,
+    CHAT_BUCKET_SIZE,
+    is_bucketed,
+    session_list_pipeline,
+    paginate_sessions,
+    message_counts_pipeline,
+    page_bounds,
+    embedded_slice_projection,
+    bucket_range,
+    messages_in_range,
+)
+
+
+async def append_message(db, session_id: str, user_obj_id, message: Dict[str, Any], state: Dict[str, Any]) -> bool:
+    now = datetime.utcnow()
+    if not is_bucketed():
+        result = await db.chatSessions.update_one(
+            {"sessionId": session_id, "userId": user_obj_id},
+            {"$push": {"messages": message}, "$set": {"state": state, "updatedAt": now}, "$inc": {"stateVersion": 1}},
+        )
+        return result.modified_count > 0
+
+    session = await db.chatSessions.find_one_and_update(
+        {"sessionId": session_id, "userId": user_obj_id},
+        {"$inc": {"messageCount": 1, "stateVersion": 1}, "$set": {"state": state, "updatedAt": now}},
+        projection={"messageCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not session:
+        return False
+
+    seq = session["messageCount"] - 1
+    await db[BUCKETS_COLLECTION].update_one(
+        {"sessionId": session_id, "userId": user_obj_id, "bucket": seq // CHAT_BUCKET_SIZE},
+        {"$push": {"messages": {**message, "seq": seq}}, "$inc": {"count": 1}},
+        upsert=True,
+    )
+    return True
+
+
+async def load_messages(db, session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    messages = list(session.get("messages", []))
+    if session.get("messageCount"):
+        buckets = db[BUCKETS_COLLECTION].find(
+            {"sessionId": session["sessionId"], "userId": session["userId"]},
+            {"_id": 0, "messages": 1},
+        ).sort("bucket", 1)
+        async for bucket in buckets:
+            messages.extend(sorted(bucket["messages"], key=lambda m: m["seq"]))
+    return messages
+
+
+async def delete_messages(db, session_id: str, user_obj_id):
+    await db[BUCKETS_COLLECTION].delete_many({"sessionId": session_id, "userId": user_obj_id})
+
+
+async def list_sessions(db, user_obj_id, limit: Optional[int] = None,
+                        cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    pipeline, limit = session_list_pipeline(user_obj_id, limit, cursor)
+    sessions = await db.chatSessions.aggregate(pipeline).to_list(None)
+    return paginate_sessions(sessions, limit)
+
+
+async def load_message_page(db, session_id: str, user_obj_id, before: Optional[int] = None,
+                            limit: int = 50) -> Optional[Dict[str, Any]]:
+    query = {"sessionId": session_id, "userId": user_obj_id}
+    counts = await db.chatSessions.aggregate(message_counts_pipeline(query)).to_list(1)
+    if not counts:
+        return None
+
+    embedded, total, start, end = page_bounds(counts[0], before, limit)
+    messages: List[Dict[str, Any]] = []
+    if start < min(end, embedded):
+        doc = await db.chatSessions.find_one(query, embedded_slice_projection(start, end, embedded))
+        messages.extend(doc.get("messages", []))
+
+    if end > embedded:
+        bucket_filter, first_seq, end_seq = bucket_range(query, start, end, embedded)
+        buckets = db[BUCKETS_COLLECTION].find(bucket_filter, {"_id": 0, "messages": 1}).sort("bucket", 1)
+        async for bucket in buckets:
+            messages.extend(messages_in_range(bucket, first_seq, end_seq))
+
+    return {"messages": messages, "total": total, "start": start}
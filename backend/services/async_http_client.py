@@ -0,0 +1,123 @@
+# services/async_http_client.py
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from services.http_client import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_POOL_MAXSIZE,
+    HTTP_RETRY_DEADLINE,
+    RETRY_STATUSES,
+    default_retries,
+    retry_delay,
+    _observe,
+)
+from services.metrics import upstream_endpoint
+from services.rate_limiter import get_limiter, INTERACTIVE, RateLimited
+from services.circuit_breaker import get_breaker
+
+# === Config ===
+# Concurrent upstream connections per event loop; idle ones beyond HTTP_POOL_MAXSIZE are closed
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "1000"))
+
+# One client per (process, event loop): httpx connections are bound to the loop that opened them
+_clients: Dict[Tuple[int, int], httpx.AsyncClient] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the keep-alive client of the running event loop"""
+    key = (os.getpid(), id(asyncio.get_running_loop()))
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAXSIZE,
+            ),
+        )
+        _clients[key] = client
+    return client
+
+
+async def close_client():
+    key = (os.getpid(), id(asyncio.get_running_loop()))
+    client = _clients.pop(key, None)
+    if client is not None:
+        await client.aclose()
+
+
+async def request(method: str, url: str, timeout=None, retries: Optional[int] = None, upstream: Optional[str] = None,
+                  priority: str = INTERACTIVE, retry_deadline: Optional[float] = None, **kwargs) -> httpx.Response:
+    """
+    Non-blocking counterpart of http_client.request, with the same retry policy.
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        timeout: Seconds, or a (connect, read) tuple. Defaults to the configured timeouts.
+        retries: Retries on 429/503 and connection failures (never on read timeouts).
+            Defaults to HTTP_MAX_RETRIES for idempotent methods and 0 otherwise.
+        upstream: Name for the upstream metrics and spans, e.g. "rapidapi". Defaults to the host.
+        priority: Rate limit priority class, "interactive" or "background"
+        retry_deadline: Seconds after the first attempt past which no retry starts. Defaults to HTTP_RETRY_DEADLINE.
+        **kwargs: Passed through to httpx.AsyncClient.request
+    Returns:
+        The final response. A retryable status is returned as-is once retries run out.
+    """
+    if isinstance(timeout, tuple):
+        timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    if retries is None:
+        retries = default_retries(method)
+    deadline = time.monotonic() + (HTTP_RETRY_DEADLINE if retry_deadline is None else retry_deadline)
+
+    client = get_client()
+    limiter = get_limiter(upstream)
+    breaker = get_breaker(upstream, upstream_endpoint(url))
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        if limiter is not None:
+            try:
+                await limiter.acquire_async(priority)
+            except (RateLimited, asyncio.CancelledError):
+                if breaker is not None:
+                    breaker.cancel()
+                raise
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            _observe(breaker, upstream, url, type(e).__name__, started)
+            # Only failures before the request reached the upstream; read timeouts are not retried
+            retryable = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+            delay = retry_delay(attempt, retries, deadline) if retryable else None
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        _observe(breaker, upstream, url, response.status_code, started)
+
+        if response.status_code not in RETRY_STATUSES:
+            return response
+        delay = retry_delay(attempt, retries, deadline, response)
+        if delay is None:
+            return response
+        await response.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
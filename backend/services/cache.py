@@ -0,0 +1,455 @@
+# services/cache.py
+import os
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.records import to_jsonable
+from services.log import get_logger
+from services.singleflight import Group, AsyncGroup
+from services.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN
+from services.metrics import STALE_RESPONSES
+
+# === Config ===
+CACHE_MAX_ENTRIES = int(os.getenv("AMAZON_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MONGO_ENABLED = os.getenv("AMAZON_CACHE_MONGO", "false").lower() in ("1", "true", "yes")
+CACHE_MONGO_COLLECTION = os.getenv("AMAZON_CACHE_COLLECTION", "amazonCache")
+
+# Seconds each endpoint's responses stay fresh
+CACHE_TTLS = {
+    "search": int(os.getenv("AMAZON_CACHE_TTL_SEARCH", "600")),
+    "product": int(os.getenv("AMAZON_CACHE_TTL_PRODUCT", "3600")),
+    "seller": int(os.getenv("AMAZON_CACHE_TTL_SELLER", "21600")),
+}
+
+# Seconds a response is kept past its TTL as the last known good copy, served
+# (marked stale) only while the upstream is failing or its circuit is open
+CACHE_STALE_TTL = int(os.getenv("AMAZON_CACHE_STALE_TTL", "86400"))
+
+# Per-request cache modes accepted by the /api/amazon/* routes
+CACHE_MODES = ("default", "bypass", "refresh")
+
+log = get_logger(__name__)
+
+
+def make_key(endpoint: str, *parts: Any) -> str:
+    """
+    Build a cache key from normalized request parts.
+    Strings are trimmed, whitespace-collapsed and lowercased so that
+    "USB  Cable" and "usb cable" share one entry.
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, str):
+            normalized.append(" ".join(part.split()).lower())
+        else:
+            normalized.append(str(part))
+    return f"{endpoint}:" + "|".join(normalized)
+
+
+def _copy(result: Any) -> Any:
+    # Responses from a shared load go to several callers, which may add top-level keys
+    return dict(result) if isinstance(result, dict) else result
+
+
+def _upstream_failed(result: Any) -> bool:
+    """
+    Whether an error response means the upstream could not answer (down, 5xx,
+    throttling us or circuit open), as opposed to e.g. "Product not found"
+    """
+    if not isinstance(result, dict) or result.get("success"):
+        return False
+    status = result.get("status")
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    return result.get("error") in ("Request failed", "Rate limited", "Upstream unavailable")
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU with a per-entry expiry. Entries may outlive
+    their expiry as stale copies, which only get_stale returns.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (fresh until, stale until, value)
+        self._entries: "OrderedDict[str, Tuple[float, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            fresh_until, stale_until, value = entry
+            now = time.time()
+            if fresh_until <= now:
+                if stale_until <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def get_stale(self, key: str) -> Tuple[bool, Any]:
+        """The entry's value even if it is no longer fresh, as long as it is kept"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return False, None
+            return True, entry[2]
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0):
+        """Store `value` fresh for `ttl` seconds and as a stale copy `stale_ttl` seconds more"""
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (now + ttl, now + ttl + stale_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class MongoCacheTier:
+    """
+    Shared cache tier backed by a MongoDB collection.
+    Documents are fresh until `freshUntil` and expire (stale copy included)
+    through a TTL index on `expiresAt`; values are stored as JSON strings
+    because Amazon payloads may contain keys MongoDB rejects.
+    """
+
+    def __init__(self, collection_name: str = CACHE_MONGO_COLLECTION):
+        self.collection_name = collection_name
+        self._collection = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _get_collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    from database import collection as shared_collection
+                    collection = shared_collection(self.collection_name)
+                    collection.create_index("expiresAt", expireAfterSeconds=0)
+                    self._collection = collection
+        return self._collection
+
+    def get(self, key: str) -> Tuple[bool, Any, float]:
+        try:
+            doc = self._get_collection().find_one({"_id": key})
+        except Exception as e:
+            self.errors += 1
+            log.warning("cache.mongo_read_failed", collection=self.collection_name, error=str(e))
+            return False, None, 0
+        # The TTL monitor only runs once a minute, so double-check expiry here.
+        # Documents written before freshUntil existed are fresh until they expire.
+        now = datetime.utcnow()
+        if not doc or doc.get("freshUntil", doc["expiresAt"]) <= now:
+            self.misses += 1
+            return False, None, 0
+        self.hits += 1
+        remaining = (doc.get("freshUntil", doc["expiresAt"]) - now).total_seconds()
+        return True, json.loads(doc["value"]), remaining
+
+    def get_stale(self, key: str) -> Tuple[bool, Any]:
+        try:
+            doc = self._get_collection().find_one({"_id": key})
+        except Exception as e:
+            self.errors += 1
+            log.warning("cache.mongo_read_failed", collection=self.collection_name, error=str(e))
+            return False, None
+        if not doc or doc["expiresAt"] <= datetime.utcnow():
+            return False, None
+        return True, json.loads(doc["value"])
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0):
+        now = datetime.utcnow()
+        try:
+            self._get_collection().replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "value": json.dumps(value, default=to_jsonable),
+                    "freshUntil": now + timedelta(seconds=ttl),
+                    "expiresAt": now + timedelta(seconds=ttl + stale_ttl),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            self.errors += 1
+            log.warning("cache.mongo_write_failed", collection=self.collection_name, error=str(e))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+class TieredCache:
+    """
+    LRU in front of an optional shared MongoDB tier.
+    Entries found in the shared tier are promoted into the LRU for the rest
+    of their lifetime.
+
+    Responses are kept CACHE_STALE_TTL seconds past their TTL. When an
+    endpoint's circuit breaker is not closed, or the upstream call fails, the
+    last good response is served with "stale": True instead of the error; a
+    half-open breaker's probe is then sent in the background to revalidate it.
+    """
+
+    def __init__(self, lru: LRUCache, shared: Optional[MongoCacheTier] = None):
+        self.lru = lru
+        self.shared = shared
+        self._endpoint_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        # Per endpoint: concurrent misses for one key share a single load
+        self._flights: Dict[str, Tuple[Group, AsyncGroup]] = {}
+        # Background revalidations: keys in flight, the worker threads and the async tasks
+        self._revalidating = set()
+        self._revalidate_pool: Optional[ThreadPoolExecutor] = None
+        self._revalidate_tasks = set()
+
+    def _flight(self, endpoint: str) -> Tuple[Group, AsyncGroup]:
+        flights = self._flights.get(endpoint)
+        if flights is None:
+            with self._stats_lock:
+                flights = self._flights.setdefault(endpoint, (Group(endpoint), AsyncGroup(endpoint)))
+        return flights
+
+    def _count(self, endpoint: str, field: str):
+        with self._stats_lock:
+            counters = self._endpoint_stats.setdefault(
+                endpoint, {"hits": 0, "misses": 0, "bypassed": 0, "refreshed": 0, "stale": 0, "revalidated": 0}
+            )
+            counters[field] += 1
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        hit, value = self.lru.get(key)
+        if hit:
+            return True, value
+        if self.shared is not None:
+            hit, value, remaining = self.shared.get(key)
+            if hit:
+                self.lru.set(key, value, remaining, CACHE_STALE_TTL)
+                return True, value
+        return False, None
+
+    def get_stale(self, key: str) -> Tuple[bool, Any]:
+        """The last good response for `key`, fresh or not"""
+        found, value = self.lru.get_stale(key)
+        if not found and self.shared is not None:
+            found, value = self.shared.get_stale(key)
+        return found, value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.lru.set(key, value, ttl, CACHE_STALE_TTL)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl, CACHE_STALE_TTL)
+
+    def _serve_stale(self, endpoint: str, value: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        self._count(endpoint, "stale")
+        STALE_RESPONSES.inc(endpoint=endpoint)
+        log.info("cache.stale_served", endpoint=endpoint, reason=reason)
+        return {**value, "stale": True, "staleReason": reason}
+
+    def _revalidated(self, endpoint: str, key: str, result: Any):
+        with self._stats_lock:
+            self._revalidating.discard((endpoint, key))
+        if isinstance(result, dict) and result.get("success"):
+            self._count(endpoint, "revalidated")
+
+    def _revalidate(self, endpoint: str, key: str, load: Callable[[], Dict[str, Any]]):
+        """Run `load` on a worker thread unless a revalidation of `key` is already running"""
+        with self._stats_lock:
+            if (endpoint, key) in self._revalidating:
+                return
+            self._revalidating.add((endpoint, key))
+            if self._revalidate_pool is None:
+                self._revalidate_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-revalidate")
+
+        def run():
+            result = None
+            try:
+                result = self._flight(endpoint)[0].do(key, load)
+            except Exception as e:
+                log.warning("cache.revalidate_failed", endpoint=endpoint, error=str(e))
+            finally:
+                self._revalidated(endpoint, key, result)
+
+        self._revalidate_pool.submit(run)
+
+    def _revalidate_async(self, endpoint: str, key: str, load: Callable[[], Awaitable[Dict[str, Any]]]):
+        """_revalidate() for a coroutine loader, as a task on the running loop"""
+        with self._stats_lock:
+            if (endpoint, key) in self._revalidating:
+                return
+            self._revalidating.add((endpoint, key))
+
+        async def run():
+            result = None
+            try:
+                result = await self._flight(endpoint)[1].do(key, load)
+            except Exception as e:
+                log.warning("cache.revalidate_failed", endpoint=endpoint, error=str(e))
+            finally:
+                self._revalidated(endpoint, key, result)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._revalidate_tasks.add(task)
+        task.add_done_callback(self._revalidate_tasks.discard)
+
+    def fetch(self, endpoint: str, key: str, loader: Callable[[], Dict[str, Any]],
+              mode: str = "default", breaker: Optional[CircuitBreaker] = None) -> Dict[str, Any]:
+        """
+        Return the cached response for `key`, calling `loader` on a miss.
+        Args:
+            endpoint: One of CACHE_TTLS' keys, used for the TTL and counters
+            key: Key built with make_key
+            loader: Performs the upstream request
+            mode: "default", "bypass" (skip the cache entirely) or
+                  "refresh" (skip the read but store the fresh response)
+            breaker: The upstream endpoint's circuit breaker, if any
+        Returns:
+            The response dict. Only successful responses are stored.
+            Concurrent calls that reach the loader with the same key (in any
+            mode) share one upstream request and get copies of its response.
+            Outside bypass mode, while `breaker` is not closed or when the
+            upstream fails, the last good response is returned instead with
+            "stale": True and "staleReason".
+        """
+        if mode == "bypass":
+            self._count(endpoint, "bypassed")
+            return _copy(self._flight(endpoint)[0].do(key, loader))
+
+        if mode == "refresh":
+            self._count(endpoint, "refreshed")
+        else:
+            hit, value = self.get(key)
+            if hit:
+                self._count(endpoint, "hits")
+                # Shallow copy so callers can add top-level keys without touching the entry
+                return dict(value)
+            self._count(endpoint, "misses")
+
+        def load():
+            result = loader()
+            if isinstance(result, dict) and result.get("success"):
+                self.set(key, dict(result), CACHE_TTLS.get(endpoint, 600))
+            return result
+
+        state = breaker.state if breaker is not None else CLOSED
+        if state != CLOSED:
+            found, stale = self.get_stale(key)
+            if found:
+                if state == HALF_OPEN:
+                    self._revalidate(endpoint, key, load)
+                return self._serve_stale(endpoint, stale, f"circuit {state}")
+
+        result = self._flight(endpoint)[0].do(key, load)
+        if _upstream_failed(result):
+            found, stale = self.get_stale(key)
+            if found:
+                return self._serve_stale(endpoint, stale, result.get("error"))
+        return _copy(result)
+
+    async def fetch_async(self, endpoint: str, key: str, loader: Callable[[], Awaitable[Dict[str, Any]]],
+                          mode: str = "default", breaker: Optional[CircuitBreaker] = None) -> Dict[str, Any]:
+        """
+        fetch() for a coroutine loader. The LRU is read inline; the MongoDB
+        tier, when enabled, is read and written on a worker thread.
+        """
+        if mode == "bypass":
+            self._count(endpoint, "bypassed")
+            return _copy(await self._flight(endpoint)[1].do(key, loader))
+
+        if mode == "refresh":
+            self._count(endpoint, "refreshed")
+        else:
+            hit, value = self.lru.get(key)
+            if not hit and self.shared is not None:
+                hit, value = await asyncio.to_thread(self.get, key)
+            if hit:
+                self._count(endpoint, "hits")
+                return dict(value)
+            self._count(endpoint, "misses")
+
+        async def load():
+            result = await loader()
+            if isinstance(result, dict) and result.get("success"):
+                ttl = CACHE_TTLS.get(endpoint, 600)
+                if self.shared is not None:
+                    await asyncio.to_thread(self.set, key, dict(result), ttl)
+                else:
+                    self.set(key, dict(result), ttl)
+            return result
+
+        async def get_stale():
+            found, stale = self.lru.get_stale(key)
+            if not found and self.shared is not None:
+                found, stale = await asyncio.to_thread(self.shared.get_stale, key)
+            return found, stale
+
+        state = breaker.state if breaker is not None else CLOSED
+        if state != CLOSED:
+            found, stale = await get_stale()
+            if found:
+                if state == HALF_OPEN:
+                    self._revalidate_async(endpoint, key, load)
+                return self._serve_stale(endpoint, stale, f"circuit {state}")
+
+        result = await self._flight(endpoint)[1].do(key, load)
+        if _upstream_failed(result):
+            found, stale = await get_stale()
+            if found:
+                return self._serve_stale(endpoint, stale, result.get("error"))
+        return _copy(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            endpoints = {name: dict(counters) for name, counters in self._endpoint_stats.items()}
+            flights = dict(self._flights)
+        return {
+            "lru": self.lru.stats(),
+            "mongo": self.shared.stats() if self.shared is not None else None,
+            "endpoints": endpoints,
+            "coalesced": {
+                name: {"sync": group.stats(), "async": async_group.stats()}
+                for name, (group, async_group) in flights.items()
+            },
+            "ttls": dict(CACHE_TTLS),
+            "staleTtl": CACHE_STALE_TTL,
+        }
+
+
+response_cache = TieredCache(
+    LRUCache(CACHE_MAX_ENTRIES),
+    MongoCacheTier() if CACHE_MONGO_ENABLED else None,
+)
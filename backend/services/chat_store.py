@@ -0,0 +1,275 @@
+# services/chat_store.py
+import os
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+# === Config ===
+# "embedded" keeps messages in the chatSessions document (the original layout);
+# "bucketed" appends them to fixed-size documents in chatMessageBuckets
+CHAT_STORAGE_MODE = os.getenv("CHAT_STORAGE_MODE", "embedded").lower()
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "100"))
+BUCKETS_COLLECTION = "chatMessageBuckets"
+MAX_PAGE_SIZE = 200
+
+# Session metadata for the sidebar; message bodies never leave MongoDB
+SESSION_SUMMARY_PROJECTION = {
+    "_id": 1,
+    "sessionId": 1,
+    "title": 1,
+    "productType": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "messageCount": {
+        "$add": [
+            {"$size": {"$ifNull": ["$messages", []]}},
+            {"$ifNull": ["$messageCount", 0]},
+        ]
+    },
+}
+
+
+def is_bucketed() -> bool:
+    return CHAT_STORAGE_MODE == "bucketed"
+
+
+def new_session_fields() -> Dict[str, Any]:
+    """Message-storage fields for a new chatSessions document"""
+    if is_bucketed():
+        return {"messageCount": 0}
+    return {"messages": []}
+
+
+def append_message(db, session_id: str, user_obj_id, message: Dict[str, Any], state: Dict[str, Any]) -> bool:
+    """
+    Append a message to a session and replace its state.
+    In bucketed mode the session document only gets a counter increment, and the
+    message is pushed into bucket `seq // CHAT_BUCKET_SIZE`, so the cost of an
+    append does not depend on how long the conversation is.
+    Every state write bumps `stateVersion`, which ChatWriteBehind checks
+    before sending only the changed state fields.
+    Returns:
+        False if the session does not exist for this user
+    """
+    now = datetime.utcnow()
+    if not is_bucketed():
+        result = db.chatSessions.update_one(
+            {"sessionId": session_id, "userId": user_obj_id},
+            {"$push": {"messages": message}, "$set": {"state": state, "updatedAt": now}, "$inc": {"stateVersion": 1}},
+        )
+        return result.modified_count > 0
+
+    session = db.chatSessions.find_one_and_update(
+        {"sessionId": session_id, "userId": user_obj_id},
+        {"$inc": {"messageCount": 1, "stateVersion": 1}, "$set": {"state": state, "updatedAt": now}},
+        projection={"messageCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not session:
+        return False
+
+    seq = session["messageCount"] - 1
+    db[BUCKETS_COLLECTION].update_one(
+        {"sessionId": session_id, "userId": user_obj_id, "bucket": seq // CHAT_BUCKET_SIZE},
+        {"$push": {"messages": {**message, "seq": seq}}, "$inc": {"count": 1}},
+        upsert=True,
+    )
+    return True
+
+
+def load_messages(db, session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Return all messages of a session in order.
+    Messages still embedded in the session document (sessions created before the
+    switch to bucketed mode and not yet migrated) come first.
+    """
+    messages = list(session.get("messages", []))
+    if session.get("messageCount"):
+        buckets = db[BUCKETS_COLLECTION].find(
+            {"sessionId": session["sessionId"], "userId": session["userId"]},
+            {"_id": 0, "messages": 1},
+        ).sort("bucket", 1)
+        for bucket in buckets:
+            # Concurrent appends can land in a bucket out of order
+            messages.extend(sorted(bucket["messages"], key=lambda m: m["seq"]))
+    return messages
+
+
+def message_count(session: Dict[str, Any]) -> int:
+    return len(session.get("messages", [])) + session.get("messageCount", 0)
+
+
+def delete_messages(db, session_id: str, user_obj_id):
+    db[BUCKETS_COLLECTION].delete_many({"sessionId": session_id, "userId": user_obj_id})
+
+
+def migrate_session(db, session: Dict[str, Any]) -> int:
+    """
+    Move a session's embedded messages into buckets.
+    Any already-bucketed messages are rewritten after the embedded ones so the
+    session ends up with one contiguous sequence.
+    Returns:
+        The number of messages now stored in buckets
+    """
+    messages = load_messages(db, session)
+    session_id, user_obj_id = session["sessionId"], session["userId"]
+
+    delete_messages(db, session_id, user_obj_id)
+    buckets = []
+    for start in range(0, len(messages), CHAT_BUCKET_SIZE):
+        chunk = messages[start:start + CHAT_BUCKET_SIZE]
+        buckets.append({
+            "sessionId": session_id,
+            "userId": user_obj_id,
+            "bucket": start // CHAT_BUCKET_SIZE,
+            "count": len(chunk),
+            "messages": [{**msg, "seq": start + i} for i, msg in enumerate(chunk)],
+        })
+    if buckets:
+        db[BUCKETS_COLLECTION].insert_many(buckets)
+
+    db.chatSessions.update_one(
+        {"_id": session["_id"]},
+        {"$unset": {"messages": ""}, "$set": {"messageCount": len(messages)}},
+    )
+    return len(messages)
+
+
+def encode_cursor(session: Dict[str, Any]) -> str:
+    payload = json.dumps({"u": session["updatedAt"].isoformat(), "id": str(session["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["u"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_sessions(db, user_obj_id, limit: Optional[int] = None,
+                  cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    List a user's sessions, most recently updated first, without loading messages.
+    Args:
+        limit: Page size (capped by MAX_PAGE_SIZE); None returns every session
+        cursor: nextCursor from the previous page
+    Returns:
+        The session summaries and the cursor of the next page (None on the last page)
+    """
+    pipeline, limit = session_list_pipeline(user_obj_id, limit, cursor)
+    return paginate_sessions(list(db.chatSessions.aggregate(pipeline)), limit)
+
+
+def session_list_pipeline(user_obj_id, limit: Optional[int] = None,
+                          cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """The list_sessions aggregation, and the page size it was built for"""
+    match: Dict[str, Any] = {"userId": user_obj_id}
+    if cursor:
+        updated_at, last_id = decode_cursor(cursor)
+        match["$or"] = [
+            {"updatedAt": {"$lt": updated_at}},
+            {"updatedAt": updated_at, "_id": {"$lt": last_id}},
+        ]
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": match},
+        {"$sort": {"updatedAt": -1, "_id": -1}},
+    ]
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        pipeline.append({"$limit": limit + 1})
+    pipeline.append({"$project": SESSION_SUMMARY_PROJECTION})
+    return pipeline, limit
+
+
+def paginate_sessions(sessions: List[Dict[str, Any]],
+                      limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # The pipeline fetches one extra session to tell whether another page exists
+    next_cursor = None
+    if limit is not None and len(sessions) > limit:
+        sessions = sessions[:limit]
+        next_cursor = encode_cursor(sessions[-1])
+    return sessions, next_cursor
+
+
+def load_message_page(db, session_id: str, user_obj_id, before: Optional[int] = None,
+                      limit: int = 50) -> Optional[Dict[str, Any]]:
+    """
+    Load the `limit` messages preceding position `before` (the newest ones when None).
+    Only the requested slice is read: $slice for embedded messages, the covering
+    bucket range for bucketed ones.
+    Returns:
+        {"messages", "total", "start"}, where `start` is the position of the first
+        returned message and the `before` value for the next older page; None if the
+        session does not exist
+    """
+    query = {"sessionId": session_id, "userId": user_obj_id}
+    counts = next(db.chatSessions.aggregate(message_counts_pipeline(query)), None)
+    if counts is None:
+        return None
+
+    embedded, total, start, end = page_bounds(counts, before, limit)
+    messages: List[Dict[str, Any]] = []
+    if start < min(end, embedded):
+        doc = db.chatSessions.find_one(query, embedded_slice_projection(start, end, embedded))
+        messages.extend(doc.get("messages", []))
+
+    if end > embedded:
+        bucket_filter, first_seq, end_seq = bucket_range(query, start, end, embedded)
+        buckets = db[BUCKETS_COLLECTION].find(bucket_filter, {"_id": 0, "messages": 1}).sort("bucket", 1)
+        for bucket in buckets:
+            messages.extend(messages_in_range(bucket, first_seq, end_seq))
+
+    return {"messages": messages, "total": total, "start": start}
+
+
+# --- Query builders shared with services/async_chat_store.py ---
+
+def message_counts_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"$match": query},
+        {"$project": {
+            "_id": 0,
+            "embedded": {"$size": {"$ifNull": ["$messages", []]}},
+            "bucketed": {"$ifNull": ["$messageCount", 0]},
+        }},
+    ]
+
+
+def page_bounds(counts: Dict[str, int], before: Optional[int], limit: int) -> Tuple[int, int, int, int]:
+    """(embedded, total, start, end) positions of a message page"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    embedded = counts["embedded"]
+    total = embedded + counts["bucketed"]
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    return embedded, total, start, end
+
+
+def embedded_slice_projection(start: int, end: int, embedded: int) -> Dict[str, Any]:
+    return {"_id": 0, "messages": {"$slice": [start, min(end, embedded) - start]}}
+
+
+def bucket_range(query: Dict[str, Any], start: int, end: int, embedded: int) -> Tuple[Dict[str, Any], int, int]:
+    """Filter for the buckets covering positions [start, end), and the seq range within them"""
+    first_seq, end_seq = max(start, embedded) - embedded, end - embedded
+    bucket_filter = {
+        **query,
+        "bucket": {"$gte": first_seq // CHAT_BUCKET_SIZE, "$lte": (end_seq - 1) // CHAT_BUCKET_SIZE},
+    }
+    return bucket_filter, first_seq, end_seq
+
+
+def messages_in_range(bucket: Dict[str, Any], first_seq: int, end_seq: int) -> List[Dict[str, Any]]:
+    # Concurrent appends can land in a bucket out of order
+    return [
+        msg for msg in sorted(bucket["messages"], key=lambda m: m["seq"])
+        if first_seq <= msg["seq"] < end_seq
+    ]
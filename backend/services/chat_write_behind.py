@@ -0,0 +1,342 @@
+# services/chat_write_behind.py
+import os
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from services import chat_store
+from services.log import get_logger
+
+# === Config ===
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+# "ack": save_chat returns once its batch is written (group commit)
+# "async": save_chat returns as soon as the message is buffered; a failed flush
+#          is logged and its messages are dropped
+CHAT_WRITE_DURABILITY = os.getenv("CHAT_WRITE_DURABILITY", "ack").lower()
+CHAT_FLUSH_MAX_MESSAGES = int(os.getenv("CHAT_FLUSH_MAX_MESSAGES", "50"))
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "50"))
+CHAT_FLUSH_ACK_TIMEOUT = float(os.getenv("CHAT_FLUSH_ACK_TIMEOUT", "10"))
+# Sessions whose last written state is remembered for diffing
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "10000"))
+
+SessionKey = Tuple[str, Any]
+
+log = get_logger(__name__)
+
+_MISSING = object()
+
+
+class _Waiter:
+    __slots__ = ("event", "matched", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.matched = False
+        self.error: Optional[Exception] = None
+
+
+class ChatWriteBehind:
+    """
+    Buffers chat message appends per session and writes them in batches.
+
+    A flush happens every CHAT_FLUSH_INTERVAL_MS, or as soon as
+    CHAT_FLUSH_MAX_MESSAGES are buffered. Each session in a batch gets one
+    update that pushes all of its new messages and `$set`s only the state
+    fields that changed since this process last wrote them.
+
+    The remembered state is guarded by a `stateVersion` counter on the session,
+    which every state writer (chat_store.append_message and its async twin)
+    increments: if another process wrote the session in the meantime, the diff
+    update does not match and the full state is written instead.
+    """
+
+    def __init__(self, db, durability: str = CHAT_WRITE_DURABILITY,
+                 max_messages: int = CHAT_FLUSH_MAX_MESSAGES, interval_ms: int = CHAT_FLUSH_INTERVAL_MS):
+        self.db = db
+        self.durability = durability
+        self.max_messages = max_messages
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending: "OrderedDict[SessionKey, Dict[str, Any]]" = OrderedDict()
+        self._pending_messages = 0
+        self._known_state: "OrderedDict[SessionKey, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"flushes": 0, "messages": 0, "sessionWrites": 0, "fullStateWrites": 0, "errors": 0, "dropped": 0}
+        atexit.register(self.flush)
+
+    # --- public API ---
+
+    def submit(self, session_id: str, user_obj_id, message: Dict[str, Any], state: Dict[str, Any]) -> bool:
+        """
+        Buffer a message append and state update.
+        Returns:
+            In "ack" mode, False if the session does not exist; in "async" mode always True
+        Raises:
+            TypeError: `state` is not a dict
+        """
+        if not isinstance(state, dict):
+            # Checked here: a bad state would only fail at flush time, with the rest of the batch waiting on it
+            raise TypeError("Chat state must be an object")
+        key = (session_id, user_obj_id)
+        waiter = _Waiter() if self.durability == "ack" else None
+
+        with self._lock:
+            self._ensure_thread()
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {"messages": [], "state": None, "waiters": []}
+            entry["messages"].append(message)
+            entry["state"] = state
+            if waiter is not None:
+                entry["waiters"].append(waiter)
+            self._pending_messages += 1
+            if self._pending_messages >= self.max_messages:
+                self._wakeup.set()
+
+        if waiter is None:
+            return True
+        if not waiter.event.wait(CHAT_FLUSH_ACK_TIMEOUT):
+            raise TimeoutError("Chat message was not flushed in time")
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.matched
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._pending)
+
+    def forget(self, session_id: str, user_obj_id):
+        """Drop remembered state, e.g. after the session is deleted"""
+        with self._lock:
+            self._known_state.pop((session_id, user_obj_id), None)
+
+    def flush(self):
+        """Write everything buffered so far; safe to call from any thread"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, OrderedDict()
+                self._pending_messages = 0
+            if not batch:
+                return
+
+            try:
+                matched, failed = self._write(batch)
+            except Exception as e:
+                matched, failed = set(), {key: e for key in batch}
+
+            # Only the sessions whose write failed get the error; the rest of the batch is saved
+            for key, entry in batch.items():
+                for waiter in entry["waiters"]:
+                    waiter.matched = key in matched
+                    waiter.error = failed.get(key)
+                    waiter.event.set()
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["messages"] += sum(
+                    len(e["messages"]) for key, e in batch.items() if key not in failed
+                )
+                if not failed:
+                    return
+                self._stats["errors"] += 1
+                # Ack callers get the error; buffered async writes are lost
+                self._stats["dropped"] += sum(
+                    len(batch[key]["messages"]) for key in failed if not batch[key]["waiters"]
+                )
+
+            log.error("chat_write_behind.flush_failed", sessions=len(failed), batch_sessions=len(batch),
+                      error=str(next(iter(failed.values()))))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "durability": self.durability,
+                "pendingSessions": len(self._pending),
+                "pendingMessages": self._pending_messages,
+            }
+
+    # --- internals ---
+
+    def _ensure_thread(self):
+        # Caller holds the lock. Started lazily so forked workers get their own thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.exception("chat_write_behind.flush_error", error=str(e))
+
+    def _remember(self, key: SessionKey, state: Dict[str, Any], version: int):
+        with self._lock:
+            self._known_state[key] = (state, version)
+            self._known_state.move_to_end(key)
+            while len(self._known_state) > CHAT_STATE_CACHE_SIZE:
+                self._known_state.popitem(last=False)
+
+    def _known(self, key: SessionKey) -> Optional[Tuple[Dict[str, Any], int]]:
+        with self._lock:
+            return self._known_state.get(key)
+
+    @staticmethod
+    def _state_diff(previous: Dict[str, Any], state: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        """$set / $unset paths turning `previous` into `state`, or None if paths can't express it"""
+        if any("." in k or k.startswith("$") for k in state):
+            return None
+        set_paths = {f"state.{k}": v for k, v in state.items() if previous.get(k, _MISSING) != v}
+        unset_paths = {f"state.{k}": "" for k in previous if k not in state}
+        return set_paths, unset_paths
+
+    def _update_for(self, entry: Dict[str, Any], diff, now: datetime, push: bool,
+                    flush_id: Optional[ObjectId] = None) -> Dict[str, Any]:
+        update: Dict[str, Any] = {"$set": {"updatedAt": now}, "$inc": {"stateVersion": 1}}
+        if diff is None:
+            update["$set"]["state"] = entry["state"]
+        else:
+            update["$set"].update(diff[0])
+            if diff[1]:
+                update["$unset"] = diff[1]
+        if push:
+            update["$push"] = {"messages": {"$each": entry["messages"]}}
+        else:
+            update["$inc"]["messageCount"] = len(entry["messages"])
+        if flush_id is not None:
+            # Lets a batch tell afterwards which of its updates matched
+            update.setdefault("$push", {})["flushIds"] = {"$each": [flush_id], "$slice": -16}
+        return update
+
+    def _write(self, batch: "OrderedDict[SessionKey, Dict[str, Any]]"
+               ) -> Tuple[Set[SessionKey], Dict[SessionKey, Exception]]:
+        """
+        Write one batch
+        Returns:
+            The keys whose session exists, and the keys whose write failed with their error
+        """
+        now = datetime.utcnow()
+        embedded = not chat_store.is_bucketed()
+        matched: Set[SessionKey] = set()
+        failed: Dict[SessionKey, Exception] = {}
+        full_writes: List[SessionKey] = []
+        diff_ops: List[UpdateOne] = []
+
+        flush_ids: Dict[SessionKey, ObjectId] = {}
+
+        for key, entry in batch.items():
+            try:
+                known = self._known(key)
+                diff = self._state_diff(known[0], entry["state"]) if known else None
+                if diff is None:
+                    full_writes.append(key)
+                    continue
+                session_filter = {"sessionId": key[0], "userId": key[1], "stateVersion": known[1]}
+                if embedded:
+                    flush_ids[key] = ObjectId()
+                    diff_ops.append(UpdateOne(
+                        session_filter, self._update_for(entry, diff, now, push=True, flush_id=flush_ids[key])
+                    ))
+                elif self._write_bucketed(key, entry, session_filter, self._update_for(entry, diff, now, push=False)):
+                    matched.add(key)
+                    with self._lock:
+                        self._stats["sessionWrites"] += 1
+                else:
+                    full_writes.append(key)
+            except Exception as e:
+                flush_ids.pop(key, None)
+                failed[key] = e
+
+        if diff_ops:
+            error = None
+            try:
+                result = self.db.chatSessions.bulk_write(diff_ops, ordered=False)
+                complete = result.matched_count == len(diff_ops)
+            except Exception as e:
+                # Unordered: some of the updates may still have been applied
+                error, complete = e, False
+            applied = set(flush_ids)
+            if not complete:
+                # Some sessions were written by another process (or deleted) since we last saw them
+                try:
+                    applied = {
+                        (doc["sessionId"], doc["userId"])
+                        for doc in self.db.chatSessions.find(
+                            {"$or": [{"sessionId": k[0], "userId": k[1], "flushIds": flush_id}
+                                     for k, flush_id in flush_ids.items()]},
+                            {"sessionId": 1, "userId": 1},
+                        )
+                    }
+                except Exception as e:
+                    applied, error = set(), error or e
+            for key in flush_ids:
+                if key in applied:
+                    matched.add(key)
+                    self._remember(key, batch[key]["state"], self._known(key)[1] + 1)
+                elif error is not None:
+                    failed[key] = error
+                else:
+                    full_writes.append(key)
+            with self._lock:
+                self._stats["sessionWrites"] += len(applied)
+
+        for key in full_writes:
+            entry = batch[key]
+            session_filter = {"sessionId": key[0], "userId": key[1]}
+            update = self._update_for(entry, None, now, push=embedded)
+            try:
+                if embedded:
+                    doc = self.db.chatSessions.find_one_and_update(
+                        session_filter, update, projection={"stateVersion": 1}, return_document=ReturnDocument.AFTER
+                    )
+                    if doc is not None:
+                        matched.add(key)
+                        self._remember(key, entry["state"], doc["stateVersion"])
+                elif self._write_bucketed(key, entry, session_filter, update):
+                    matched.add(key)
+            except Exception as e:
+                failed[key] = e
+                continue
+            with self._lock:
+                self._stats["sessionWrites"] += 1
+                self._stats["fullStateWrites"] += 1
+
+        return matched, failed
+
+    def _write_bucketed(self, key: SessionKey, entry: Dict[str, Any], session_filter: Dict[str, Any],
+                        update: Dict[str, Any]) -> bool:
+        """Reserve sequence numbers on the session, then push the messages into their buckets"""
+        session = self.db.chatSessions.find_one_and_update(
+            session_filter, update,
+            projection={"messageCount": 1, "stateVersion": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session is None:
+            return False
+
+        self._remember(key, entry["state"], session["stateVersion"])
+        first_seq = session["messageCount"] - len(entry["messages"])
+        by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for i, message in enumerate(entry["messages"]):
+            seq = first_seq + i
+            by_bucket.setdefault(seq // chat_store.CHAT_BUCKET_SIZE, []).append({**message, "seq": seq})
+
+        self.db[chat_store.BUCKETS_COLLECTION].bulk_write([
+            UpdateOne(
+                {"sessionId": key[0], "userId": key[1], "bucket": bucket},
+                {"$push": {"messages": {"$each": messages}}, "$inc": {"count": len(messages)}},
+                upsert=True,
+            )
+            for bucket, messages in by_bucket.items()
+        ], ordered=False)
+        return True
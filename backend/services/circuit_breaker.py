@@ -0,0 +1,194 @@
+# services/circuit_breaker.py
+"""
+Circuit breakers for upstream endpoints, e.g. "rapidapi.search" or
+"gemini.generateContent".
+
+The HTTP clients report every attempt to the endpoint's breaker. When, within
+the last CIRCUIT_WINDOW_SECONDS, at least CIRCUIT_MIN_CALLS attempts were made
+and too many of them failed (connection errors, timeouts, 5xx) or were slow,
+the breaker opens: calls fail at once with CircuitOpen instead of waiting out
+the timeout. After CIRCUIT_OPEN_SECONDS it turns half-open and lets a single
+probe through; the probe's outcome closes the breaker or opens it again.
+
+services/cache.py serves the last good response, marked stale, while a
+breaker is not closed, and sends the half-open probe in the background.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from services.metrics import CIRCUIT_STATE, CIRCUIT_REJECTED
+from services.log import get_logger
+
+# === Config ===
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+# Fraction of failed attempts in the window that opens the breaker
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+# Attempts slower than this count as slow; this fraction of slow attempts opens the breaker
+CIRCUIT_SLOW_SECONDS = float(os.getenv("CIRCUIT_SLOW_SECONDS", "5"))
+CIRCUIT_SLOW_RATE = float(os.getenv("CIRCUIT_SLOW_RATE", "0.5"))
+# How long an open breaker rejects calls before letting a probe through
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+# A probe that has not reported back after this long no longer blocks the next one
+CIRCUIT_PROBE_TIMEOUT = float(os.getenv("CIRCUIT_PROBE_TIMEOUT", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+log = get_logger(__name__)
+
+
+class CircuitOpen(Exception):
+    """The endpoint's breaker is open; the call was not made"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Error-rate and latency breaker for one upstream endpoint"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        # (time, failed, slow) per attempt within the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._stats = {"opened": 0, "rejected": 0}
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def _set_state(self, state: str, reason: str = ""):
+        # Caller holds the lock
+        if state == self._state:
+            return
+        self._state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], breaker=self.name)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._stats["opened"] += 1
+            log.warning("circuit.opened", breaker=self.name, reason=reason)
+        elif state == CLOSED:
+            self._calls.clear()
+            log.info("circuit.closed", breaker=self.name)
+
+    def _current(self, now: float) -> str:
+        # Caller holds the lock
+        if self._state == OPEN and now - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+            self._set_state(HALF_OPEN)
+            self._probe_started = None
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current(time.monotonic())
+
+    def before_call(self):
+        """
+        Let a call through or reject it.
+        Raises:
+            CircuitOpen: the breaker is open, or half-open with its probe in flight
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and (self._probe_started is None
+                                       or now - self._probe_started >= CIRCUIT_PROBE_TIMEOUT):
+                self._probe_started = now
+                return
+            self._stats["rejected"] += 1
+            retry_after = max(0.0, self._opened_at + CIRCUIT_OPEN_SECONDS - now)
+        CIRCUIT_REJECTED.inc(breaker=self.name)
+        raise CircuitOpen(f"{self.name} is unavailable (circuit {state})", retry_after)
+
+    def cancel(self):
+        """The call let through by before_call was not made after all"""
+        with self._lock:
+            self._probe_started = None
+
+    def record(self, status: Any, duration: float):
+        """
+        Report an attempt's outcome: its HTTP status, or the name of the error
+        that prevented one. 5xx and errors are failures.
+        """
+        failed = not isinstance(status, int) or status >= 500
+        slow = duration >= CIRCUIT_SLOW_SECONDS
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            if state == HALF_OPEN:
+                self._probe_started = None
+                if failed or slow:
+                    self._set_state(OPEN, f"probe {'failed' if failed else 'slow'} ({status}, {duration:.2f}s)")
+                else:
+                    self._set_state(CLOSED)
+                return
+            if state == OPEN:
+                # A call started before the breaker opened
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - CIRCUIT_WINDOW_SECONDS:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < CIRCUIT_MIN_CALLS:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / total >= CIRCUIT_ERROR_RATE:
+                self._set_state(OPEN, f"{failures}/{total} attempts failed")
+            elif slow_calls / total >= CIRCUIT_SLOW_RATE:
+                self._set_state(OPEN, f"{slow_calls}/{total} attempts took over {CIRCUIT_SLOW_SECONDS:g}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            calls = list(self._calls)
+            return {
+                "state": state,
+                "windowCalls": len(calls),
+                "windowFailures": sum(1 for _, f, _ in calls if f),
+                "windowSlow": sum(1 for _, _, s in calls if s),
+                "retryAfter": round(max(0.0, self._opened_at + CIRCUIT_OPEN_SECONDS - now), 3)
+                if state == OPEN else 0,
+                **self._stats,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream: Optional[str], endpoint: str) -> Optional[CircuitBreaker]:
+    """
+    The breaker of an upstream endpoint (an upstream_endpoint() label), or None
+    for unnamed upstreams and when breakers are disabled
+    """
+    if not CIRCUIT_BREAKER_ENABLED or not upstream:
+        return None
+    name = f"{upstream}.{endpoint}"
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_report() -> Dict[str, Any]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
@@ -0,0 +1,206 @@
+# services/enrichment.py
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Set
+
+from services.amazon_api import search_products, get_product_details, get_seller_details
+from services.rate_limiter import BACKGROUND
+
+# === Config ===
+ENRICH_MAX_CONCURRENCY = int(os.getenv("ENRICH_MAX_CONCURRENCY", "8"))
+ENRICH_DEADLINE_SECONDS = float(os.getenv("ENRICH_DEADLINE_SECONDS", "20"))
+ENRICH_MAX_PRODUCTS = int(os.getenv("ENRICH_MAX_PRODUCTS", "20"))
+
+
+def enrich_search(keyword: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANCE",
+                  max_products: Optional[int] = None, concurrency: Optional[int] = None,
+                  deadline_seconds: Optional[float] = None, cache_mode: str = "default") -> Dict[str, Any]:
+    """
+    Search Amazon and attach product details and seller profiles to each result.
+
+    Product lookups run concurrently on a bounded pool; as each one completes its
+    seller lookup is queued, and a seller shared by several products is fetched once.
+    Lookups still running when the deadline passes are abandoned and reported
+    in `enrichment.timedOut`, and the affected products are returned unenriched.
+    The search itself is rate limited as interactive, the lookups as background.
+
+    Args:
+        keyword: Search keyword
+        page: Search results page
+        country: Country code
+        sort_by: Search sort order
+        max_products: How many search results to enrich (capped by ENRICH_MAX_PRODUCTS)
+        concurrency: Parallel upstream lookups for this request (capped by ENRICH_MAX_CONCURRENCY)
+        deadline_seconds: Time budget for the whole request (capped by ENRICH_DEADLINE_SECONDS)
+        cache_mode: Passed through to the Amazon lookups
+
+    Returns:
+        Dict[str, Any]: The search response with `productDetails` and `sellerDetails`
+        added to each product, or the search error
+    """
+    started = time.monotonic()
+    max_products, concurrency, deadline = _limits(started, max_products, concurrency, deadline_seconds)
+
+    search = search_products(keyword, page, country, sort_by, cache_mode=cache_mode)
+    if not search.get("success"):
+        return search
+
+    products = search["data"]["products"][:max_products]
+    asins = list(dict.fromkeys(p["asin"] for p in products if p.get("asin")))
+
+    details: Dict[str, Dict[str, Any]] = {}
+    sellers: Dict[str, Dict[str, Any]] = {}
+    requested_sellers = set()
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="enrich")
+    try:
+        pending = {
+            executor.submit(get_product_details, asin, country, cache_mode, BACKGROUND): ("product", asin)
+            for asin in asins
+        }
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, key = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": "Unexpected error", "details": str(e)}
+
+                if kind == "seller":
+                    sellers[key] = result
+                    continue
+
+                details[key] = result
+                seller_id = _seller_to_fetch(result, requested_sellers)
+                if seller_id:
+                    future = executor.submit(get_seller_details, seller_id, country, cache_mode, BACKGROUND)
+                    pending[future] = ("seller", seller_id)
+
+        timed_out = [{"type": kind, "id": key} for kind, key in pending.values()]
+    finally:
+        # Don't wait for abandoned lookups; they finish (and fill the cache) in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return _enriched_response(search, products, asins, details, sellers, requested_sellers, timed_out, started)
+
+
+async def enrich_search_async(keyword: str, page: int = 1, country: str = "US", sort_by: str = "RELEVANCE",
+                              max_products: Optional[int] = None, concurrency: Optional[int] = None,
+                              deadline_seconds: Optional[float] = None, cache_mode: str = "default") -> Dict[str, Any]:
+    """
+    enrich_search() for the ASGI app: the lookups are tasks on the running event
+    loop, bounded by a semaphore instead of a thread pool. Lookups still running
+    at the deadline are cancelled.
+    """
+    # Imported here so the Flask app does not need httpx
+    from services import async_amazon_api
+
+    started = time.monotonic()
+    max_products, concurrency, deadline = _limits(started, max_products, concurrency, deadline_seconds)
+
+    search = await async_amazon_api.search_products(keyword, page, country, sort_by, cache_mode=cache_mode)
+    if not search.get("success"):
+        return search
+
+    products = search["data"]["products"][:max_products]
+    asins = list(dict.fromkeys(p["asin"] for p in products if p.get("asin")))
+
+    details: Dict[str, Dict[str, Any]] = {}
+    sellers: Dict[str, Dict[str, Any]] = {}
+    requested_sellers: Set[str] = set()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(lookup, *args):
+        async with semaphore:
+            return await lookup(*args)
+
+    pending = {
+        asyncio.ensure_future(
+            bounded(async_amazon_api.get_product_details, asin, country, cache_mode, BACKGROUND)
+        ): ("product", asin)
+        for asin in asins
+    }
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                kind, key = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = {"error": "Unexpected error", "details": str(e)}
+
+                if kind == "seller":
+                    sellers[key] = result
+                    continue
+
+                details[key] = result
+                seller_id = _seller_to_fetch(result, requested_sellers)
+                if seller_id:
+                    task = asyncio.ensure_future(
+                        bounded(async_amazon_api.get_seller_details, seller_id, country, cache_mode, BACKGROUND)
+                    )
+                    pending[task] = ("seller", seller_id)
+
+        timed_out = [{"type": kind, "id": key} for kind, key in pending.values()]
+    finally:
+        for task in pending:
+            task.cancel()
+
+    return _enriched_response(search, products, asins, details, sellers, requested_sellers, timed_out, started)
+
+
+def _limits(started: float, max_products: Optional[int], concurrency: Optional[int],
+            deadline_seconds: Optional[float]):
+    # Client-supplied values: a negative limit would slice products from the end,
+    # a negative deadline would time the request out before it starts
+    max_products = max(1, min(max_products or ENRICH_MAX_PRODUCTS, ENRICH_MAX_PRODUCTS))
+    concurrency = max(1, min(concurrency or ENRICH_MAX_CONCURRENCY, ENRICH_MAX_CONCURRENCY))
+    deadline = started + max(1.0, min(deadline_seconds or ENRICH_DEADLINE_SECONDS, ENRICH_DEADLINE_SECONDS))
+    return max_products, concurrency, deadline
+
+
+def _seller_to_fetch(detail: Dict[str, Any], requested_sellers: Set[str]) -> Optional[str]:
+    """The product's seller if it still needs a lookup; marks it as requested"""
+    seller_id = detail.get("data", {}).get("sellerId") if detail.get("success") else None
+    if seller_id and seller_id != "NA" and seller_id not in requested_sellers:
+        requested_sellers.add(seller_id)
+        return seller_id
+    return None
+
+
+def _enriched_response(search: Dict[str, Any], products: List[Dict[str, Any]], asins: List[str],
+                       details: Dict[str, Dict[str, Any]], sellers: Dict[str, Dict[str, Any]],
+                       requested_sellers: Set[str], timed_out: List[Dict[str, str]], started: float) -> Dict[str, Any]:
+    enriched = []
+    for product in products:
+        detail = details.get(product.get("asin"))
+        detail_data = detail["data"] if detail and detail.get("success") else None
+        seller = sellers.get(detail_data.get("sellerId")) if detail_data else None
+        enriched.append({
+            **product,
+            "productDetails": detail_data,
+            "sellerDetails": seller["data"] if seller and seller.get("success") else None,
+        })
+
+    return {
+        **search,
+        "data": {**search["data"], "products": enriched},
+        "enrichment": {
+            "productsRequested": len(asins),
+            "productsFetched": sum(1 for d in details.values() if d.get("success")),
+            "sellersRequested": len(requested_sellers),
+            "sellersFetched": sum(1 for s in sellers.values() if s.get("success")),
+            "timedOut": timed_out,
+            "elapsedMs": round((time.monotonic() - started) * 1000),
+        },
+    }
@@ -0,0 +1,141 @@
+# services/gemini.py
+import os
+import json
+import time
+from typing import Iterator, Optional
+
+from services import http_client
+from services.llm_cache import llm_cache, LLM_CACHE_ENABLED
+
+# === Config ===
+GEMINI_MODEL_URL = os.getenv(
+    "GEMINI_MODEL_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro"
+)
+
+
+class GeminiError(Exception):
+    """Raised when Gemini returns an error status or an unexpected payload"""
+
+
+def _request_body(prompt: str, temperature: float, max_output_tokens: int):
+    return {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": temperature,
+            "maxOutputTokens": max_output_tokens
+        }
+    }
+
+
+def _params_key(temperature: float, max_output_tokens: int) -> str:
+    return f"{GEMINI_MODEL_URL}|{temperature}|{max_output_tokens}"
+
+
+def _total_tokens(payload) -> Optional[int]:
+    return (payload.get("usageMetadata") or {}).get("totalTokenCount")
+
+
+def generate_content(prompt: str, temperature: float = 0.7, max_output_tokens: int = 1024,
+                     timeout: Optional[float] = None, use_cache: bool = True, cache_facts: str = "") -> str:
+    """
+    Run a single Gemini generateContent call, answering from the LLM response cache when possible
+    Args:
+        prompt: Prompt text
+        temperature: Sampling temperature
+        max_output_tokens: Completion length limit
+        timeout: Request timeout in seconds, defaults to the http_client timeouts
+        use_cache: Set to False to always call the API
+        cache_facts: The request fields the prompt was built from; near-duplicate cache hits require equal ones
+    Returns:
+        The completion text
+    """
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    params_key = _params_key(temperature, max_output_tokens)
+    if use_cache:
+        cached, _ = llm_cache.lookup(prompt, params_key, cache_facts)
+        if cached is not None:
+            return cached
+
+    started = time.monotonic()
+    response = http_client.post(
+        f"{GEMINI_MODEL_URL}:generateContent",
+        headers={"Content-Type": "application/json"},
+        params={"key": os.getenv("GEMINI_API_KEY")},
+        json=_request_body(prompt, temperature, max_output_tokens),
+        timeout=timeout,
+        upstream="gemini"
+    )
+
+    if response.status_code != 200:
+        raise GeminiError(f"Gemini request failed with status {response.status_code}: {response.text}")
+
+    try:
+        payload = response.json()
+        text = payload["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, ValueError) as e:
+        raise GeminiError(f"Unexpected Gemini response: {str(e)}")
+
+    if use_cache:
+        llm_cache.store(prompt, text, params_key, time.monotonic() - started, _total_tokens(payload), cache_facts)
+    return text
+
+
+def stream_generate_content(prompt: str, temperature: float = 0.7, max_output_tokens: int = 1024,
+                            timeout: Optional[float] = None, use_cache: bool = True,
+                            cache_facts: str = "") -> Iterator[str]:
+    """
+    Run a Gemini streamGenerateContent call, yielding text chunks as they arrive.
+    A cached completion is yielded as a single chunk; a completed stream is cached.
+    Args:
+        prompt: Prompt text
+        temperature: Sampling temperature
+        max_output_tokens: Completion length limit
+        timeout: Connect/read timeout in seconds; the read timeout applies between chunks
+        use_cache: Set to False to always call the API
+        cache_facts: The request fields the prompt was built from; near-duplicate cache hits require equal ones
+    Yields:
+        Completion text fragments in order
+    """
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    params_key = _params_key(temperature, max_output_tokens)
+    if use_cache:
+        cached, _ = llm_cache.lookup(prompt, params_key, cache_facts)
+        if cached is not None:
+            yield cached
+            return
+
+    started = time.monotonic()
+    chunks = []
+    total_tokens = None
+    response = http_client.post(
+        f"{GEMINI_MODEL_URL}:streamGenerateContent",
+        headers={"Content-Type": "application/json"},
+        params={"key": os.getenv("GEMINI_API_KEY"), "alt": "sse"},
+        json=_request_body(prompt, temperature, max_output_tokens),
+        timeout=timeout,
+        stream=True,
+        upstream="gemini"
+    )
+
+    with response:
+        if response.status_code != 200:
+            raise GeminiError(f"Gemini request failed with status {response.status_code}: {response.text}")
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            try:
+                payload = json.loads(line[len("data:"):])
+                parts = payload["candidates"][0]["content"]["parts"]
+            except (KeyError, IndexError, ValueError) as e:
+                raise GeminiError(f"Unexpected Gemini stream event: {str(e)}")
+            total_tokens = _total_tokens(payload) or total_tokens
+            for part in parts:
+                if part.get("text"):
+                    chunks.append(part["text"])
+                    yield part["text"]
+
+    if use_cache and chunks:
+        llm_cache.store(prompt, "".join(chunks), params_key, time.monotonic() - started, total_tokens,
+                        cache_facts)
@@ -0,0 +1,172 @@
+# services/http_client.py
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.metrics import observe_upstream, upstream_endpoint
+from services.rate_limiter import get_limiter, INTERACTIVE, RateLimited
+from services.circuit_breaker import get_breaker
+
+# === Config ===
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+# Retries for idempotent methods; other methods (e.g. Gemini POSTs) only retry when the caller asks
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "4"))
+# No retry starts once this many seconds have passed since the first attempt
+HTTP_RETRY_DEADLINE = float(os.getenv("HTTP_RETRY_DEADLINE", "20"))
+
+# Statuses that say the request was not processed. Other 5xx and read timeouts are not
+# retried: the upstream may have done (and billed) the work, and a slow upstream would
+# otherwise hold the worker for several full timeouts.
+RETRY_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Return the keep-alive session for the URL's scheme and host.
+    Each host gets its own connection pool so a slow upstream cannot starve
+    the connections of another one.
+    """
+    global _sessions_pid
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+
+    with _lock:
+        # Sockets must not be shared with a forked parent
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+                max_retries=0,
+            )
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[origin] = session
+        return session
+
+
+def _backoff_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def default_retries(method: str) -> int:
+    return HTTP_MAX_RETRIES if method.upper() in IDEMPOTENT_METHODS else 0
+
+
+def retry_delay(attempt: int, retries: int, deadline: float, response=None) -> Optional[float]:
+    """Backoff before the next attempt, or None if retries or the deadline are used up"""
+    if attempt >= retries:
+        return None
+    delay = _backoff_delay(attempt, response)
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def _observe(breaker, upstream: Optional[str], url: str, status, started: float):
+    """Report one attempt to the metrics and the endpoint's circuit breaker"""
+    duration = time.perf_counter() - started
+    observe_upstream(upstream, url, status, started, duration)
+    if breaker is not None:
+        breaker.record(status, duration)
+
+
+def request(method: str, url: str, timeout=None, retries: Optional[int] = None, upstream: Optional[str] = None,
+            priority: str = INTERACTIVE, retry_deadline: Optional[float] = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the pooled session for the URL's host.
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        timeout: Seconds, or a (connect, read) tuple. Defaults to the configured timeouts.
+        retries: Retries on 429/503 and connection failures (never on read timeouts).
+            Defaults to HTTP_MAX_RETRIES for idempotent methods and 0 otherwise.
+        upstream: Name for the upstream metrics and spans, e.g. "rapidapi". Defaults to the host.
+            Upstreams with a rate limit (services/rate_limiter.py) wait for a token before each attempt,
+            and each endpoint of a named upstream has a circuit breaker (services/circuit_breaker.py).
+        priority: Rate limit priority class, "interactive" or "background"
+        retry_deadline: Seconds after the first attempt past which no retry starts. Defaults to HTTP_RETRY_DEADLINE.
+        **kwargs: Passed through to requests.Session.request
+    Returns:
+        The final response. A retryable status is returned as-is once retries run out.
+    Raises:
+        rate_limiter.RateLimited: No token before the priority's deadline, or the monthly quota is used up
+        circuit_breaker.CircuitOpen: The endpoint's breaker is open
+    """
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if retries is None:
+        retries = default_retries(method)
+    deadline = time.monotonic() + (HTTP_RETRY_DEADLINE if retry_deadline is None else retry_deadline)
+
+    session = get_session(url)
+    limiter = get_limiter(upstream)
+    breaker = get_breaker(upstream, upstream_endpoint(url))
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        if limiter is not None:
+            try:
+                limiter.acquire(priority)
+            except RateLimited:
+                if breaker is not None:
+                    breaker.cancel()
+                raise
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _observe(breaker, upstream, url, type(e).__name__, started)
+            # ConnectTimeout is a ConnectionError; ReadTimeout is not retried
+            retryable = isinstance(e, requests.exceptions.ConnectionError)
+            delay = retry_delay(attempt, retries, deadline) if retryable else None
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        _observe(breaker, upstream, url, response.status_code, started)
+
+        if response.status_code not in RETRY_STATUSES:
+            return response
+        delay = retry_delay(attempt, retries, deadline, response)
+        if delay is None:
+            return response
+        # Release the connection back to the pool before sleeping
+        response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
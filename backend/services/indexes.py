@@ -0,0 +1,160 @@
+# services/indexes.py
+"""
+Index declarations for every collection the backend queries, plus a query-plan check.
+
+    python -m services.indexes            # create missing indexes
+    python -m services.indexes --check    # explain() the hot queries, exit 1 on any COLLSCAN
+
+Run the first form as a deploy step, before the new workers start: app.py only
+creates indexes at import when ENSURE_INDEXES_ON_STARTUP=true.
+"""
+import argparse
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+from services.cache import CACHE_MONGO_COLLECTION
+from services.chat_store import BUCKETS_COLLECTION
+from services.analysis_jobs import ANALYSIS_JOBS_COLLECTION
+
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "chatSessions": [
+        # app.py: every per-session read and write
+        {"keys": [("sessionId", ASCENDING), ("userId", ASCENDING)], "name": "sessionId_userId", "unique": True},
+        # app.py: sidebar list sorted by recency, keyset-paginated on (updatedAt, _id)
+        {"keys": [("userId", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)],
+         "name": "userId_updatedAt_id"},
+    ],
+    BUCKETS_COLLECTION: [
+        {"keys": [("sessionId", ASCENDING), ("userId", ASCENDING), ("bucket", ASCENDING)],
+         "name": "sessionId_userId_bucket", "unique": True},
+    ],
+    "users": [
+        # login.py / register.py. Not unique: a Google account may share an email with a local one
+        {"keys": [("email", ASCENDING)], "name": "email"},
+        # auth_routes.py upserts by google_id; local users have none
+        {"keys": [("google_id", ASCENDING)], "name": "google_id", "unique": True, "sparse": True},
+    ],
+    "chat_history": [
+        # models.ChatHistoryModel
+        {"keys": [("userId", ASCENDING)], "name": "userId_1"},
+        {"keys": [("sessionId", ASCENDING)], "name": "sessionId_1", "unique": True},
+        {"keys": [("userId", ASCENDING), ("createdAt", DESCENDING)], "name": "userId_1_createdAt_-1"},
+        {"keys": [("title", TEXT)], "name": "title_text"},
+    ],
+    CACHE_MONGO_COLLECTION: [
+        {"keys": [("expiresAt", ASCENDING)], "name": "expiresAt_1", "expireAfterSeconds": 0},
+    ],
+    ANALYSIS_JOBS_COLLECTION: [
+        # analysis_jobs.py: polls by job id; documents are keyed by ASIN
+        {"keys": [("jobId", ASCENDING)], "name": "jobId_1", "unique": True},
+        {"keys": [("expiresAt", ASCENDING)], "name": "expiresAt_1", "expireAfterSeconds": 0},
+    ],
+}
+
+_SAMPLE_USER = ObjectId("000000000000000000000000")
+
+# (collection, description, filter, sort) for each query on a request path
+HOT_QUERIES = [
+    ("chatSessions", "session by sessionId + userId",
+     {"sessionId": "sample", "userId": _SAMPLE_USER}, None),
+    ("chatSessions", "session list by userId, newest first",
+     {"userId": _SAMPLE_USER}, [("updatedAt", DESCENDING), ("_id", DESCENDING)]),
+    (BUCKETS_COLLECTION, "message buckets of a session",
+     {"sessionId": "sample", "userId": _SAMPLE_USER, "bucket": {"$gte": 0, "$lte": 1}}, [("bucket", ASCENDING)]),
+    ("users", "user by email", {"email": "sample@example.com"}, None),
+    ("users", "user by google_id", {"google_id": "sample"}, None),
+    ("chat_history", "history by userId, newest first",
+     {"userId": _SAMPLE_USER}, [("createdAt", DESCENDING)]),
+    (ANALYSIS_JOBS_COLLECTION, "analysis job by jobId", {"jobId": "sample"}, None),
+]
+
+
+def ensure_indexes(db, collections: Optional[Iterable[str]] = None, dry_run: bool = False) -> List[str]:
+    """
+    Create any declared index that does not exist yet.
+    Args:
+        db: pymongo Database
+        collections: Limit to these collections (default: all of INDEX_SPECS)
+        dry_run: Only report what would be created
+    Returns:
+        "collection.indexName" for each index created (or that would be)
+    """
+    created = []
+    for collection_name in collections or INDEX_SPECS:
+        collection = db[collection_name]
+        existing = list(collection.list_indexes())
+        existing_names = {index["name"] for index in existing}
+        existing_keys = {tuple(index["key"].items()) for index in existing}
+        for spec in INDEX_SPECS[collection_name]:
+            # An index with the same keys under another name would make create_index fail
+            if spec["name"] in existing_names or tuple(spec["keys"]) in existing_keys:
+                continue
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            if not dry_run:
+                collection.create_index(spec["keys"], **options)
+            created.append(f"{collection_name}.{spec['name']}")
+    return created
+
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(item) for item in plan)
+    return False
+
+
+def check_query_plans(db) -> List[Dict[str, Any]]:
+    """
+    explain() each hot query and report whether its winning plan scans the collection
+    Returns:
+        One {"collection", "query", "collscan"} result per entry of HOT_QUERIES
+    """
+    results = []
+    for collection_name, description, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        results.append({
+            "collection": collection_name,
+            "query": description,
+            "collscan": _has_collscan(plan),
+        })
+    return results
+
+
+def main():
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="Fail if any hot query falls back to a COLLSCAN")
+    parser.add_argument("--dry-run", action="store_true", help="Only list indexes that would be created")
+    args = parser.parse_args()
+
+    db = get_db()
+
+    created = ensure_indexes(db, dry_run=args.dry_run)
+    for name in created:
+        print(f"{'Would create' if args.dry_run else 'Created'} index {name}")
+    if not created:
+        print("All declared indexes exist")
+
+    if args.check:
+        failures = 0
+        for result in check_query_plans(db):
+            status = "COLLSCAN" if result["collscan"] else "ok"
+            print(f"[{status}] {result['collection']}: {result['query']}")
+            failures += result["collscan"]
+        if failures:
+            print(f"{failures} hot queries fall back to a collection scan")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
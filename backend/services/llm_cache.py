@@ -0,0 +1,210 @@
+# services/llm_cache.py
+import os
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+# === Config ===
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+# Jaccard similarity of word shingles needed for a near-duplicate hit; set above 1 to disable
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))
+LLM_CACHE_SHINGLE_SIZE = int(os.getenv("LLM_CACHE_SHINGLE_SIZE", "3"))
+# Near-duplicates may differ by at most this many distinct words, none of them containing
+# a digit. This alone cannot tell "Mumbai" from "Delhi", so prompts built from request
+# fields pass those fields as `facts`, and near hits are only taken between equal facts.
+LLM_CACHE_MAX_WORD_DIFF = int(os.getenv("LLM_CACHE_MAX_WORD_DIFF", "2"))
+# Shingles found in more cached prompts than this (template boilerplate) are not used
+# to look up near-duplicate candidates
+LLM_CACHE_MAX_POSTINGS = int(os.getenv("LLM_CACHE_MAX_POSTINGS", "256"))
+
+
+def canonicalize(prompt: str) -> str:
+    """Lowercase and collapse whitespace so formatting-only differences share an entry"""
+    return " ".join(prompt.lower().split())
+
+
+def _shingles(canonical: str) -> Set[str]:
+    words = canonical.split(" ")
+    if len(words) <= LLM_CACHE_SHINGLE_SIZE:
+        return {canonical}
+    return {
+        " ".join(words[i:i + LLM_CACHE_SHINGLE_SIZE])
+        for i in range(len(words) - LLM_CACHE_SHINGLE_SIZE + 1)
+    }
+
+
+def _has_digit(word: str) -> bool:
+    return any(ch.isdigit() for ch in word)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for when the API reports no usage"""
+    return max(1, len(text) // 4)
+
+
+class LLMResponseCache:
+    """
+    Size-bounded LRU of LLM completions with a TTL.
+
+    Lookups try an exact match on the canonicalized prompt first, then a
+    near-duplicate match: candidates are found through an inverted shingle
+    index, probing only the prompt's least common shingles (any prompt similar
+    enough must share one of them), and the most similar one is used if its Jaccard
+    similarity reaches LLM_CACHE_SIMILARITY, the two prompts differ by no
+    more than LLM_CACHE_MAX_WORD_DIFF distinct words, none of them numeric, and
+    both were stored with the same `facts`. Entries are partitioned by the
+    generation parameters so different temperatures never share completions.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: int = LLM_CACHE_TTL,
+                 similarity: float = LLM_CACHE_SIMILARITY, max_word_diff: int = LLM_CACHE_MAX_WORD_DIFF):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_word_diff = max_word_diff
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._index: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "exactHits": 0,
+            "nearHits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "tokensSaved": 0,
+            "latencySavedMs": 0,
+        }
+
+    @staticmethod
+    def _key(params_key: str, canonical: str) -> str:
+        return hashlib.sha256(f"{params_key}\n{canonical}".encode("utf-8")).hexdigest()
+
+    def _remove(self, key: str):
+        # Caller holds the lock
+        entry = self._entries.pop(key)
+        for shingle in entry["shingles"]:
+            keys = self._index.get(shingle)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[shingle]
+
+    def _live(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expiresAt"] <= now:
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return None
+        return entry
+
+    def _candidates(self, shingles: Set[str], params_key: str, facts: str) -> List[Tuple[str, Dict]]:
+        # Caller holds the lock. Jaccard >= similarity needs at least ceil(similarity * |shingles|)
+        # shared shingles, so a near-duplicate contains one of any |shingles| - that + 1 of them.
+        probes = len(shingles) - math.ceil(self.similarity * len(shingles) - 1e-9) + 1
+        keys: Set[str] = set()
+        for posting in sorted((self._index.get(shingle, ()) for shingle in shingles), key=len)[:probes]:
+            if len(posting) > LLM_CACHE_MAX_POSTINGS:
+                break
+            keys.update(posting)
+        return [
+            (key, entry) for key, entry in ((key, self._entries[key]) for key in keys)
+            if entry["paramsKey"] == params_key and entry["facts"] == facts
+        ]
+
+    def _hit(self, key: str, entry: Dict, kind: str) -> str:
+        self._entries.move_to_end(key)
+        self._stats[kind] += 1
+        self._stats["tokensSaved"] += entry["tokens"]
+        self._stats["latencySavedMs"] += entry["latencyMs"]
+        return entry["text"]
+
+    def lookup(self, prompt: str, params_key: str = "", facts: str = "") -> Tuple[Optional[str], Optional[str]]:
+        """
+        Args:
+            prompt: Prompt text
+            params_key: Generation parameters; only equal ones share entries
+            facts: The request fields the prompt was built from (see prompts.prompt_facts);
+                   near-duplicate hits require equal facts
+        Returns:
+            (completion, "exact" | "near") on a hit, (None, None) on a miss
+        """
+        canonical = canonicalize(prompt)
+        key = self._key(params_key, canonical)
+        now = time.time()
+
+        shingles = _shingles(canonical) if self.similarity <= 1 else set()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None:
+                return self._hit(key, entry, "exactHits"), "exact"
+            candidates = self._candidates(shingles, params_key, facts) if shingles else []
+
+        # Scored without the lock: entries are never modified once stored
+        words = set(canonical.split(" "))
+        scored = []
+        for candidate, other in candidates:
+            overlap = len(shingles & other["shingles"])
+            score = overlap / (len(shingles) + len(other["shingles"]) - overlap)
+            if score < self.similarity:
+                continue
+            diff = words ^ other["words"]
+            if len(diff) > self.max_word_diff or any(_has_digit(word) for word in diff):
+                continue
+            scored.append((score, candidate, other))
+
+        with self._lock:
+            for _, candidate, other in sorted(scored, key=lambda item: item[0], reverse=True):
+                # Skip entries evicted or replaced since they were scored
+                if self._live(candidate, now) is other:
+                    return self._hit(candidate, other, "nearHits"), "near"
+            self._stats["misses"] += 1
+            return None, None
+
+    def store(self, prompt: str, text: str, params_key: str = "", latency_s: float = 0.0,
+              tokens: Optional[int] = None, facts: str = ""):
+        """
+        Cache a completion along with what it cost, so later hits can report savings
+        """
+        canonical = canonicalize(prompt)
+        key = self._key(params_key, canonical)
+        entry = {
+            "paramsKey": params_key,
+            "facts": facts,
+            "shingles": _shingles(canonical),
+            "words": set(canonical.split(" ")),
+            "text": text,
+            "tokens": tokens if tokens is not None else estimate_tokens(prompt) + estimate_tokens(text),
+            "latencyMs": round(latency_s * 1000),
+            "expiresAt": time.time() + self.ttl,
+        }
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for shingle in entry["shingles"]:
+                self._index.setdefault(shingle, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["exactHits"] + self._stats["nearHits"] + self._stats["misses"]
+            hits = self._stats["exactHits"] + self._stats["nearHits"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_cache = LLMResponseCache()
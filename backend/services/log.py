@@ -0,0 +1,249 @@
+# services/log.py
+"""
+Structured logging for the backend.
+
+    from services.log import get_logger
+    log = get_logger(__name__)
+    log.info("amazon.request", url=url, params=params)
+
+Each call is one event: a dotted name plus keyword fields. Callers only put the
+record on a bounded in-memory queue; a single listener thread per process formats
+it (JSON lines by default) and writes it out, so request threads never block on
+stdout. When the queue is full new records are dropped and counted rather than
+waiting.
+
+High-volume events can be sampled per event name (LOG_SAMPLE_RATES); warnings
+and errors are never sampled. Levels can be set per logger (LOG_LEVELS).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# === Config ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-logger levels, e.g. "services.amazon_api=DEBUG,werkzeug=WARNING"; merged over the defaults
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of each listed debug/info event to keep, e.g. "amazon.request=0.1"; merged over the defaults
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# The async client logs every outbound request at INFO; amazon.request covers those
+DEFAULT_LEVELS = {
+    "httpx": "WARNING",
+}
+# Emitted once or twice per upstream call
+DEFAULT_SAMPLE_RATES = {
+    "amazon.request": 0.1,
+    "amazon.response": 0.1,
+}
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+SAMPLE_RATES = {**DEFAULT_SAMPLE_RATES,
+                **{name: float(rate) for name, rate in _parse_pairs(LOG_SAMPLE_RATES).items()}}
+
+# LogRecord attributes; anything else on a record is an extra field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"pid": None, "queue": None, "listener": None, "handler": None}
+_stats = {"dropped": 0, "sampled": 0}
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    fields = getattr(record, "fields", None)
+    if fields is not None:
+        return fields
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+def _timestamp(record: logging.LogRecord) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, then the event's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": _timestamp(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.getMessage(),
+        }
+        for key, value in _fields(record).items():
+            entry.setdefault(key, value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """ts LEVEL logger event key=value ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [_timestamp(record), record.levelname, record.name,
+                 getattr(record, "event", None) or record.getMessage()]
+        parts.extend(f"{key}={value}" for key, value in _fields(record).items())
+        line = " ".join(str(part) for part in parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting or blocking"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener; only freeze the message here.
+        # The queue never leaves the process, so exc_info can travel as is.
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for room instead of failing
+        self.queue.put(self._sentinel, timeout=5)
+
+
+def _output_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JSONFormatter())
+    return handler
+
+
+def configure():
+    """
+    Install the queue handler on the root logger and start this process's
+    listener thread. Idempotent; called by get_logger. A forked worker gets a
+    fresh queue and listener.
+    """
+    pid = os.getpid()
+    if _state["pid"] == pid:
+        return
+    with _lock:
+        if _state["pid"] == pid:
+            return
+        root = logging.getLogger()
+        if _state["handler"] is not None:
+            # Inherited from the parent; its listener thread did not survive the fork
+            root.removeHandler(_state["handler"])
+
+        records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _QueueHandler(records)
+        listener = _QueueListener(records, _output_handler(), respect_handler_level=False)
+        listener.start()
+
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        for name, level in {**DEFAULT_LEVELS, **_parse_pairs(LOG_LEVELS)}.items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        _state.update(pid=pid, queue=records, listener=listener, handler=handler)
+
+
+def shutdown():
+    """Stop the listener after it has written everything queued so far"""
+    with _lock:
+        listener = _state["listener"]
+        if listener is None or _state["pid"] != os.getpid():
+            return
+        _state["listener"] = None
+    try:
+        listener.stop()
+    except queue.Full:
+        pass
+
+
+atexit.register(shutdown)
+
+
+def _after_fork_in_child():
+    # Records logged before the child's first get_logger call would otherwise sit in
+    # the parent's queue copy, which no thread drains here
+    global _lock
+    _lock = threading.Lock()
+    if _state["handler"] is not None:
+        configure()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class EventLogger:
+    """
+    Thin wrapper over a logging.Logger that logs named events with fields.
+    Level and sampling checks happen before the record is built.
+    """
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING:
+            rate = SAMPLE_RATES.get(event)
+            if rate is not None and random.random() >= rate:
+                _stats["sampled"] += 1
+                return
+        self.logger.log(level, event, exc_info=exc_info, extra={"event": event, "fields": fields})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        """Error event with the traceback of the exception being handled"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def is_enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+
+def get_logger(name: Optional[str] = None) -> EventLogger:
+    configure()
+    return EventLogger(logging.getLogger(name))
+
+
+def stats() -> Dict[str, int]:
+    """Records dropped on a full queue and events skipped by sampling, in this process"""
+    records = _state["queue"]
+    return {**_stats, "queued": records.qsize() if records is not None else 0}
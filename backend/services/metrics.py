@@ -0,0 +1,417 @@
+# services/metrics.py
+import os
+import bisect
+import threading
+import time
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from pymongo import monitoring
+
+from services.log import get_logger
+
+# === Config ===
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Latency histogram bucket bounds in seconds
+METRICS_BUCKETS = tuple(
+    float(b) for b in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")
+)
+# Record spans per request and return their breakdown in a Server-Timing header
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+# Log the span breakdown of requests slower than this many ms (0 disables); implies span recording
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0"))
+
+LabelValues = Tuple[str, ...]
+
+log = get_logger(__name__)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        """Exposition lines for the current values; called with the lock held"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = METRICS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts with +Inf last, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][position] += 1
+            state[1] += value
+
+    def snapshot(self, **labels) -> Optional[Dict[str, float]]:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return None if state is None else {"count": sum(state[0]), "sum": state[1]}
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics of this process in the Prometheus text format.
+    Each worker process keeps its own registry, so scrape every worker (or label
+    them by instance) when running several.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = METRICS_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Time to produce the response (first byte for streams)", ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Requests being handled", ("server",))
+MONGO_DURATION = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips", ("command",))
+MONGO_FAILURES = registry.counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error", ("command",))
+UPSTREAM_REQUESTS = registry.counter(
+    "upstream_requests_total", "Outbound HTTP attempts (retries included) by status", ("upstream", "endpoint", "status"))
+UPSTREAM_DURATION = registry.histogram(
+    "upstream_request_duration_seconds", "Outbound HTTP attempts until response headers", ("upstream", "endpoint"))
+RATE_LIMIT_WAIT = registry.histogram(
+    "rate_limit_wait_seconds", "Time requests waited for a rate limit token", ("upstream", "priority"))
+RATE_LIMIT_REJECTED = registry.counter(
+    "rate_limit_rejected_total", "Requests not sent because of the rate limit or monthly quota",
+    ("upstream", "priority", "reason"))
+CIRCUIT_STATE = registry.gauge(
+    "circuit_breaker_state", "Upstream endpoint breaker state: 0 closed, 1 open, 2 half-open", ("breaker",))
+CIRCUIT_REJECTED = registry.counter(
+    "circuit_breaker_rejected_total", "Calls failed fast by an open breaker", ("breaker",))
+STALE_RESPONSES = registry.counter(
+    "cache_stale_responses_total", "Last known good responses served while the upstream was failing", ("endpoint",))
+SINGLEFLIGHT_CALLS = registry.counter(
+    "singleflight_calls_total", "Coalesced lookups: leaders made the call, collapsed ones waited on it", ("group", "role"))
+
+
+# --- Spans ---
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (name, category, offset from start in seconds, duration in seconds)
+        self.spans: List[Tuple[str, str, float, float]] = []
+
+    def add(self, name: str, category: str, started: float, duration: float):
+        self.spans.append((name, category, started - self.started, duration))
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds spent per category"""
+        totals: Dict[str, float] = {}
+        for _, category, _, duration in self.spans:
+            totals[category] = totals.get(category, 0.0) + duration
+        return totals
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{category};dur={duration * 1000:.1f}" for category, duration in self.totals().items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def describe(self) -> str:
+        return " ".join(f"{name}@{offset * 1000:.1f}+{duration * 1000:.1f}ms"
+                        for name, _, offset, duration in self.spans)
+
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def tracing_enabled() -> bool:
+    return TRACING_ENABLED or TRACE_SLOW_MS > 0
+
+
+def start_trace() -> Optional[contextvars.Token]:
+    """Start collecting spans for the current request, if tracing is enabled"""
+    if not tracing_enabled():
+        return None
+    return _trace.set(Trace())
+
+
+def end_trace(token: Optional[contextvars.Token]) -> Optional[Trace]:
+    if token is None:
+        return None
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def record_span(name: str, category: str, started: float, duration: float):
+    """Add a finished span (perf_counter start, seconds) to the current request's trace"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, category, started, duration)
+
+
+@contextmanager
+def span(name: str, category: Optional[str] = None):
+    """Time a block as a span of the current request; a no-op outside a trace"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category or name.split(".")[0], started, time.perf_counter() - started)
+
+
+def report_slow(method: str, route: str, trace: Optional[Trace], total: float):
+    if trace is not None and TRACE_SLOW_MS > 0 and total * 1000 >= TRACE_SLOW_MS:
+        log.warning("trace.slow_request", method=method, route=route, ms=round(total * 1000, 1),
+                    server_timing=trace.server_timing(total), spans=trace.describe())
+
+
+# --- Upstream HTTP calls ---
+
+def upstream_endpoint(url: str) -> str:
+    """Low-cardinality endpoint label: the last path segment, or the method of a Gemini model URL"""
+    segment = urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1]
+    return segment.rsplit(":", 1)[-1] or "/"
+
+
+def observe_upstream(upstream: Optional[str], url: str, status, started: float, duration: float):
+    """Record one outbound attempt; `status` is the HTTP status or an error name"""
+    upstream = upstream or urlsplit(url).netloc
+    endpoint = upstream_endpoint(url)
+    if METRICS_ENABLED:
+        UPSTREAM_REQUESTS.inc(upstream=upstream, endpoint=endpoint, status=status)
+        UPSTREAM_DURATION.observe(duration, upstream=upstream, endpoint=endpoint)
+    record_span(f"{upstream}.{endpoint}", upstream, started, duration)
+
+
+# --- MongoDB command monitoring ---
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command timings for the metrics registry and the current request's trace"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        if METRICS_ENABLED:
+            MONGO_FAILURES.inc(command=event.command_name)
+        self._record(event)
+
+    def _record(self, event):
+        duration = event.duration_micros / 1e6
+        if METRICS_ENABLED:
+            MONGO_DURATION.observe(duration, command=event.command_name)
+        # Events are published on the thread that ran the command
+        record_span(f"mongo.{event.command_name}", "mongo", time.perf_counter() - duration, duration)
+
+
+mongo_command_listener = MongoCommandMetrics()
+
+
+# --- Web framework hooks ---
+
+def observe_request(server: str, method: str, route: str, status: int, duration: float):
+    if METRICS_ENABLED:
+        HTTP_REQUESTS.inc(method=method, route=route, status=status)
+        HTTP_DURATION.observe(duration, method=method, route=route)
+
+
+def instrument_flask(app):
+    """Per-route metrics and (when enabled) a Server-Timing header for a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        g.metrics_trace = start_trace()
+        g.metrics_in_flight = METRICS_ENABLED
+        if METRICS_ENABLED:
+            HTTP_IN_FLIGHT.inc(server="flask")
+
+    @app.after_request
+    def _metrics_finish(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe_request("flask", request.method, route, response.status_code, duration)
+        trace = end_trace(g.pop("metrics_trace", None))
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing(duration)
+            report_slow(request.method, route, trace, duration)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # Runs even when after_request did not
+        if g.pop("metrics_in_flight", False):
+            HTTP_IN_FLIGHT.dec(server="flask")
+        end_trace(g.pop("metrics_trace", None))
+
+
+class MetricsMiddleware:
+    """
+    ASGI counterpart of instrument_flask. Requests handed to a mounted app (the
+    Flask app under asgi_app.py) are left to that app's own instrumentation.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        token = start_trace()
+        trace = current_trace()
+        status = {"code": 500}
+        if METRICS_ENABLED:
+            HTTP_IN_FLIGHT.inc(server="asgi")
+
+        def route_label() -> Optional[str]:
+            """Route template; None for a mounted app (only its "endpoint" is set)"""
+            route = scope.get("route")
+            if route is not None and not hasattr(route, "routes"):
+                return route.path
+            return None if "endpoint" in scope else "unmatched"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                status["duration"] = time.perf_counter() - started
+                if trace is not None and route_label() is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing(status["duration"]).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if METRICS_ENABLED:
+                HTTP_IN_FLIGHT.dec(server="asgi")
+            if token is not None:
+                _trace.reset(token)
+            route = route_label()
+            if route is not None:
+                duration = status.get("duration", time.perf_counter() - started)
+                observe_request("asgi", scope["method"], route, status["code"], duration)
+                report_slow(scope["method"], route, trace, duration)
@@ -0,0 +1,466 @@
+# services/rate_limiter.py
+"""
+Client-side rate limiting and monthly quota accounting for upstream APIs.
+
+Each limited upstream (today only "rapidapi") gets a token bucket, implemented
+as GCRA: the state is one "theoretical arrival time" per bucket, so it fits in
+a single Redis key or MongoDB document and every worker process draws from the
+same bucket. Backends:
+
+    memory  per-process bucket (the default without REDIS_URL)
+    redis   any Redis-compatible server at REDIS_URL; one Lua call per request
+    mongo   the rateLimits collection, updated with compare-and-set
+
+If the shared backend fails, the process falls back to its own in-memory bucket
+for RATE_LIMIT_BACKEND_RETRY seconds. Each worker then allows the full rate on
+its own, so size the limits for the shared case.
+
+Callers that find the bucket empty wait for a token up to a deadline instead of
+failing immediately. There are two priority classes:
+
+    interactive  requests a user is waiting on (search, product pages)
+    background   enrichment lookups; they leave RAPIDAPI_INTERACTIVE_RESERVE
+                 tokens of the burst to interactive requests and, within a
+                 process, wait while interactive requests are queued
+
+Each granted request also counts against the monthly quota, if one is set.
+Once it is used up, requests fail at once with QuotaExhausted.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from services.metrics import RATE_LIMIT_WAIT, RATE_LIMIT_REJECTED
+from services.log import get_logger
+
+# === Config ===
+# Requests per second to RapidAPI across all workers; 0 (the default) disables the limiter.
+# Set it to the plan's rate limit.
+RAPIDAPI_RATE_LIMIT = float(os.getenv("RAPIDAPI_RATE_LIMIT", "0"))
+# Requests that may be sent back to back after an idle period
+RAPIDAPI_RATE_BURST = int(os.getenv("RAPIDAPI_RATE_BURST", "0")) or max(1, int(RAPIDAPI_RATE_LIMIT))
+# Requests per calendar month (UTC); 0 means no quota
+RAPIDAPI_MONTHLY_QUOTA = int(os.getenv("RAPIDAPI_MONTHLY_QUOTA", "0"))
+# Burst tokens background requests leave to interactive ones
+RAPIDAPI_INTERACTIVE_RESERVE = int(os.getenv("RAPIDAPI_INTERACTIVE_RESERVE", "1"))
+# Seconds a request may wait for a token, per priority class
+RATE_LIMIT_MAX_WAIT_INTERACTIVE = float(os.getenv("RATE_LIMIT_MAX_WAIT_INTERACTIVE", "3"))
+RATE_LIMIT_MAX_WAIT_BACKGROUND = float(os.getenv("RATE_LIMIT_MAX_WAIT_BACKGROUND", "15"))
+# "auto" (redis when REDIS_URL is set, else memory), "redis", "mongo" or "memory"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "auto").lower()
+REDIS_URL = os.getenv("REDIS_URL", "")
+RATE_LIMIT_COLLECTION = os.getenv("RATE_LIMIT_COLLECTION", "rateLimits")
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "ratelimit")
+# Seconds to stay on the in-memory bucket after the shared backend failed
+RATE_LIMIT_BACKEND_RETRY = float(os.getenv("RATE_LIMIT_BACKEND_RETRY", "30"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+MAX_WAIT = {INTERACTIVE: RATE_LIMIT_MAX_WAIT_INTERACTIVE, BACKGROUND: RATE_LIMIT_MAX_WAIT_BACKGROUND}
+
+# Quota counters outlive their month a little so the dashboard can show the last one
+_QUOTA_TTL = 40 * 24 * 3600
+
+log = get_logger(__name__)
+
+
+class RateLimited(Exception):
+    """No token became available before the request's deadline"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExhausted(RateLimited):
+    """The monthly quota is used up"""
+
+
+def _month(now: float) -> str:
+    return datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m")
+
+
+def _next_month(now: float) -> str:
+    current = datetime.fromtimestamp(now, timezone.utc)
+    year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+    return datetime(year, month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def _gcra(tat: float, now: float, interval: float, window: float) -> Tuple[bool, float, float]:
+    """(granted, seconds until it would be, new arrival time)"""
+    new_tat = max(tat, now) + interval
+    excess = new_tat - now - window
+    return excess <= 0, max(excess, 0.0), new_tat
+
+
+class MemoryBackend:
+    """Bucket state of this process only"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tat: Dict[str, float] = {}
+        self._used: Dict[str, int] = {}
+
+    def take(self, key: str, quota_key: str, now: float, interval: float, window: float,
+             quota: int) -> Tuple[str, float, int]:
+        """
+        Returns:
+            ("granted" | "wait" | "quota", seconds to wait, requests used this month)
+        """
+        with self._lock:
+            used = self._used.get(quota_key, 0)
+            if quota and used >= quota:
+                return "quota", 0.0, used
+            granted, wait, new_tat = _gcra(self._tat.get(key, 0.0), now, interval, window)
+            if not granted:
+                return "wait", wait, used
+            self._tat[key] = new_tat
+            self._used[quota_key] = used + 1
+            return "granted", 0.0, used + 1
+
+    def peek(self, key: str, quota_key: str) -> Tuple[float, int]:
+        """(theoretical arrival time, requests used this month)"""
+        with self._lock:
+            return self._tat.get(key, 0.0), self._used.get(quota_key, 0)
+
+
+class RedisBackend:
+    """Bucket state in a Redis-compatible server, updated atomically by a Lua script"""
+
+    name = "redis"
+
+    # KEYS: bucket, quota counter. ARGV: now, interval, window, quota, quota ttl
+    SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+local quota = tonumber(ARGV[4])
+if quota > 0 and used >= quota then
+    return {'quota', '0', used}
+end
+local now, interval, window = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or '0'), now)
+local excess = tat + interval - now - window
+if excess > 0 then
+    return {'wait', tostring(excess), used}
+end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000) + 1000)
+used = redis.call('INCR', KEYS[2])
+if used == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+end
+return {'granted', '0', used}
+"""
+
+    def __init__(self, url: str):
+        # Imported here so redis is only needed when RATE_LIMIT_BACKEND uses it
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, quota_key, now, interval, window, quota):
+        status, wait, used = self._script(keys=[key, quota_key], args=[now, interval, window, quota, _QUOTA_TTL])
+        return (status.decode() if isinstance(status, bytes) else status), float(wait), int(used)
+
+    def peek(self, key, quota_key):
+        tat, used = self._client.mget([key, quota_key])
+        return float(tat or 0), int(used or 0)
+
+
+class MongoBackend:
+    """
+    Bucket state in a MongoDB collection. The arrival time is advanced with a
+    compare-and-set, retried when another worker got there first; the monthly
+    count is only incremented while it is below the quota.
+    """
+
+    name = "mongo"
+
+    def __init__(self, collection_name: str = RATE_LIMIT_COLLECTION):
+        self.collection_name = collection_name
+        self._collection = None
+        self._lock = threading.Lock()
+
+    def _get_collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    from database import collection as shared_collection
+                    collection = shared_collection(self.collection_name)
+                    collection.create_index("expiresAt", expireAfterSeconds=0)
+                    self._collection = collection
+        return self._collection
+
+    def take(self, key, quota_key, now, interval, window, quota):
+        from pymongo.errors import DuplicateKeyError
+
+        collection = self._get_collection()
+        for _ in range(10):
+            docs = {doc["_id"]: doc for doc in collection.find({"_id": {"$in": [key, quota_key]}})}
+            used = docs.get(quota_key, {}).get("count", 0)
+            if quota and used >= quota:
+                return "quota", 0.0, used
+            bucket = docs.get(key)
+            tat = bucket["tat"] if bucket else 0.0
+            granted, wait, new_tat = _gcra(tat, now, interval, window)
+            if not granted:
+                return "wait", wait, used
+            if bucket is None:
+                try:
+                    collection.insert_one({"_id": key, "tat": new_tat})
+                except DuplicateKeyError:
+                    continue
+            elif collection.update_one({"_id": key, "tat": tat}, {"$set": {"tat": new_tat}}).modified_count == 0:
+                continue
+            used = self._count(collection, quota_key, now, quota)
+            if used is None:
+                # Other workers used up the quota since the read above; the token taken is forfeited
+                return "quota", 0.0, quota
+            return "granted", 0.0, used
+        # Heavy contention; let the caller retry shortly
+        return "wait", interval, 0
+
+    @staticmethod
+    def _count(collection, quota_key, now, quota) -> Optional[int]:
+        """Count one request against the quota; None if it is used up"""
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        query: Dict[str, Any] = {"_id": quota_key}
+        if quota:
+            # Conditional, so concurrent workers cannot take the count past the quota
+            query["count"] = {"$lt": quota}
+        update = {"$inc": {"count": 1},
+                  "$setOnInsert": {"expiresAt": datetime.fromtimestamp(now + _QUOTA_TTL, timezone.utc)}}
+        try:
+            doc = collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # The document exists but did not match: the quota is used up, or it was inserted concurrently
+            doc = collection.find_one_and_update(query, {"$inc": {"count": 1}}, return_document=ReturnDocument.AFTER)
+        return doc["count"] if doc else None
+
+    def peek(self, key, quota_key):
+        docs = {doc["_id"]: doc for doc in self._get_collection().find({"_id": {"$in": [key, quota_key]}})}
+        return docs.get(key, {}).get("tat", 0.0), docs.get(quota_key, {}).get("count", 0)
+
+
+def _shared_backend():
+    backend = RATE_LIMIT_BACKEND
+    if backend == "auto":
+        backend = "redis" if REDIS_URL else "memory"
+    if backend == "redis":
+        return RedisBackend(REDIS_URL or "redis://localhost:6379/0")
+    if backend == "mongo":
+        return MongoBackend()
+    return None
+
+
+class RateLimiter:
+    """Token bucket plus monthly quota for one upstream"""
+
+    def __init__(self, name: str, rate: float, burst: int, monthly_quota: int = 0,
+                 interactive_reserve: int = 0, shared=None):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.monthly_quota = monthly_quota
+        self.interval = 1.0 / rate
+        # Background requests must leave at least one token's worth of window
+        reserve = min(max(interactive_reserve, 0), self.burst - 1)
+        self.windows = {
+            INTERACTIVE: self.burst * self.interval,
+            BACKGROUND: (self.burst - reserve) * self.interval,
+        }
+        self.shared = shared
+        self.local = MemoryBackend()
+        self._shared_retry_at = 0.0
+        self._cond = threading.Condition()
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._stats = {"granted": 0, "waited": 0, "rejected": 0, "quotaRejected": 0}
+
+    @property
+    def key(self) -> str:
+        return f"{RATE_LIMIT_KEY_PREFIX}:{self.name}"
+
+    def _quota_key(self, now: float) -> str:
+        return f"{self.key}:quota:{_month(now)}"
+
+    def _backend(self, now: float):
+        if self.shared is not None and now >= self._shared_retry_at:
+            return self.shared
+        return self.local
+
+    def _take(self, priority: str) -> Tuple[str, float]:
+        now = time.time()
+        args = (self.key, self._quota_key(now), now, self.interval, self.windows[priority], self.monthly_quota)
+        backend = self._backend(now)
+        if backend is not self.local:
+            try:
+                return backend.take(*args)[:2]
+            except Exception as e:
+                self._shared_retry_at = now + RATE_LIMIT_BACKEND_RETRY
+                log.warning("rate_limiter.backend_unavailable", upstream=self.name, backend=backend.name,
+                            retry_in=RATE_LIMIT_BACKEND_RETRY, error=str(e))
+        return self.local.take(*args)[:2]
+
+    def _reject(self, priority: str, reason: str, message: str, retry_after: float = 0.0):
+        with self._cond:
+            self._stats["quotaRejected" if reason == "quota" else "rejected"] += 1
+        RATE_LIMIT_REJECTED.inc(upstream=self.name, priority=priority, reason=reason)
+        error = QuotaExhausted if reason == "quota" else RateLimited
+        raise error(message, retry_after)
+
+    def _granted(self, priority: str, waited: float, queued: bool):
+        with self._cond:
+            self._stats["granted"] += 1
+            if queued:
+                self._stats["waited"] += 1
+        RATE_LIMIT_WAIT.observe(waited, upstream=self.name, priority=priority)
+
+    def _check_priority(self, priority: str, max_wait: Optional[float]) -> Tuple[str, float]:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        return priority, MAX_WAIT[priority] if max_wait is None else max_wait
+
+    def _yield_to_interactive(self, deadline: float) -> bool:
+        """Wait while interactive requests are queued in this process; returns whether it waited"""
+        waited = False
+        with self._cond:
+            while self._waiting[INTERACTIVE]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waited = True
+                self._cond.wait(remaining)
+        return waited
+
+    def acquire(self, priority: str = INTERACTIVE, max_wait: Optional[float] = None):
+        """
+        Block until a request may be sent.
+        Raises:
+            QuotaExhausted: the monthly quota is used up
+            RateLimited: no token is expected within max_wait seconds
+        """
+        priority, max_wait = self._check_priority(priority, max_wait)
+        started = time.monotonic()
+        deadline = started + max_wait
+        queued = False
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                if priority == BACKGROUND:
+                    queued = self._yield_to_interactive(deadline) or queued
+                # Never under _cond: a shared backend is a network round trip (a few, on CAS retries)
+                status, wait = self._take(priority)
+                if status == "granted":
+                    self._granted(priority, time.monotonic() - started, queued)
+                    return
+                if status == "quota":
+                    self._reject(priority, "quota", f"Monthly {self.name} quota of {self.monthly_quota} is used up")
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    self._reject(priority, "deadline", f"{self.name} rate limit: no token within {max_wait:g}s", wait)
+                queued = True
+                with self._cond:
+                    self._cond.wait(wait)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    async def acquire_async(self, priority: str = INTERACTIVE, max_wait: Optional[float] = None):
+        """acquire() for coroutines; a shared backend is called on a worker thread"""
+        priority, max_wait = self._check_priority(priority, max_wait)
+        started = time.monotonic()
+        deadline = started + max_wait
+        queued = False
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                if priority == BACKGROUND and self._waiting[INTERACTIVE] and time.monotonic() < deadline:
+                    queued = True
+                    await asyncio.sleep(min(self.interval, 0.05))
+                    continue
+                if self._backend(time.time()) is self.local:
+                    status, wait = self._take(priority)
+                else:
+                    status, wait = await asyncio.to_thread(self._take, priority)
+                if status == "granted":
+                    self._granted(priority, time.monotonic() - started, queued)
+                    return
+                if status == "quota":
+                    self._reject(priority, "quota", f"Monthly {self.name} quota of {self.monthly_quota} is used up")
+                if wait > deadline - time.monotonic():
+                    self._reject(priority, "deadline", f"{self.name} rate limit: no token within {max_wait:g}s", wait)
+                queued = True
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def usage(self) -> Dict[str, Any]:
+        """Bucket, quota and queue state for the quota dashboard"""
+        now = time.time()
+        backend = self._backend(now)
+        try:
+            tat, used = backend.peek(self.key, self._quota_key(now))
+        except Exception as e:
+            backend = self.local
+            tat, used = backend.peek(self.key, self._quota_key(now))
+            log.warning("rate_limiter.backend_unavailable", upstream=self.name, backend=self.shared.name,
+                        error=str(e))
+        available = (self.windows[INTERACTIVE] - (max(tat, now) - now)) / self.interval
+        with self._cond:
+            waiting, counters = dict(self._waiting), dict(self._stats)
+        return {
+            "upstream": self.name,
+            "backend": backend.name,
+            "ratePerSecond": self.rate,
+            "burst": self.burst,
+            "availableTokens": max(0, int(available)),
+            "month": _month(now),
+            "used": used,
+            "quota": self.monthly_quota or None,
+            "remaining": max(0, self.monthly_quota - used) if self.monthly_quota else None,
+            "resetsAt": _next_month(now),
+            "waiting": waiting,
+            # Since this process started
+            "process": counters,
+        }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured() -> Dict[str, Tuple[float, int, int, int]]:
+    limits = {}
+    if RAPIDAPI_RATE_LIMIT > 0:
+        limits["rapidapi"] = (RAPIDAPI_RATE_LIMIT, RAPIDAPI_RATE_BURST, RAPIDAPI_MONTHLY_QUOTA,
+                              RAPIDAPI_INTERACTIVE_RESERVE)
+    return limits
+
+
+def get_limiter(upstream: Optional[str]) -> Optional[RateLimiter]:
+    """The limiter for an upstream name (as passed to the HTTP clients), or None if it is not limited"""
+    limiter = _limiters.get(upstream)
+    if limiter is None and upstream in _configured():
+        with _limiters_lock:
+            limiter = _limiters.get(upstream)
+            if limiter is None:
+                rate, burst, quota, reserve = _configured()[upstream]
+                limiter = _limiters[upstream] = RateLimiter(upstream, rate, burst, quota, reserve, _shared_backend())
+    return limiter
+
+
+def quota_report() -> Dict[str, Any]:
+    """usage() of every configured limiter"""
+    return {"limiters": [get_limiter(upstream).usage() for upstream in _configured()]}
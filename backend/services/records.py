@@ -0,0 +1,134 @@
+# services/records.py
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Tuple
+
+
+class Record(Mapping):
+    """
+    Fixed-field record stored in __slots__ instead of a per-instance dict.
+
+    Records are read-only Mappings keyed by their JSON field names, so code
+    written against the old payload dicts (record["asin"], record.get(...),
+    {**record}) keeps working. They become dicts only when serialized:
+    pass to_jsonable as json.dumps' `default`, or use RecordJSONProvider (app.py).
+    """
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.FIELDS, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class Product(Record):
+    """One /search result, as returned by services.amazon_api.search_products"""
+
+    FIELDS = ("ProductTitle", "asin", "price", "discount", "originalPrice", "rating", "totalRatings",
+              "productUrl", "productImage", "isPrime", "isBestSeller", "isAmazonChoice", "variantsAvailable")
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any]) -> "Product":
+        get = item.get
+        return cls(
+            get("product_title", ""),
+            get("asin", ""),
+            get("product_price", "N/A"),
+            get("discount", ""),
+            get("product_original_price", "N/A"),
+            get("product_star_rating", "N/A"),
+            get("product_num_ratings", "N/A"),
+            get("product_url", ""),
+            get("product_photo", ""),
+            get("is_prime", "false"),
+            get("is_best_seller", "false"),
+            get("is_amazon_choice", "false"),
+            get("has_variants", "false"),
+        )
+
+
+class Review(Record):
+    """One seller feedback entry, as returned by services.amazon_api.get_seller_details"""
+
+    FIELDS = ("rating", "reviewText", "username", "date", "suppressedMessage")
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_api(cls, review: Dict[str, Any]) -> "Review":
+        get = review.get
+        return cls(
+            get("rating", ""),
+            get("feedback_text", ""),
+            get("reviewer_name", ""),
+            get("feedback_date", ""),
+            get("suppressed_message", "Not Available"),
+        )
+
+
+class ScoredVendor(Mapping):
+    """
+    A catalog vendor plus its ranking score, without copying the vendor.
+    Reads like {**vendor, "score": score}.
+    """
+
+    __slots__ = ("vendor", "score")
+
+    def __init__(self, vendor: Mapping, score: float):
+        self.vendor = vendor
+        self.score = score
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "score":
+            return self.score
+        return self.vendor[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.vendor:
+            if key != "score":
+                yield key
+        yield "score"
+
+    def __len__(self) -> int:
+        return len(self.vendor) + (0 if "score" in self.vendor else 1)
+
+    def __reduce__(self):
+        return type(self), (self.vendor, self.score)
+
+    def __repr__(self):
+        return f"ScoredVendor({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.vendor, "score": self.score}
+
+
+def to_jsonable(value: Any) -> Any:
+    """json.dumps `default` hook: records (and other Mappings) serialize as objects"""
+    if isinstance(value, (Record, ScoredVendor)):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,127 @@
+# services/scoring_profiles.py
+import math
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from services.records import ScoredVendor
+from services.vendor_catalog import load_vendors
+from services.vendor_engine import top_k_positions
+from services.vendor_store import VendorCatalog, catalog_column, catalog_factorized
+
+# Columns of the feature matrix; "location" depends on the request and is added at scoring time
+FEATURES = ("price", "delivery_time", "rating", "response_time", "certified")
+WEIGHT_KEYS = FEATURES + ("location",)
+
+# Named weight profiles over normalized features (each feature in [0, 1], higher is better)
+PROFILES: Dict[str, Dict[str, float]] = {
+    "balanced": {"price": 0.3, "delivery_time": 0.2, "rating": 0.25, "location": 0.1, "response_time": 0.1, "certified": 0.05},
+    "cost-first": {"price": 0.5, "delivery_time": 0.15, "rating": 0.15, "location": 0.1, "response_time": 0.05, "certified": 0.05},
+    "speed-first": {"price": 0.1, "delivery_time": 0.45, "rating": 0.1, "location": 0.1, "response_time": 0.2, "certified": 0.05},
+    "quality-first": {"price": 0.1, "delivery_time": 0.1, "rating": 0.45, "location": 0.05, "response_time": 0.1, "certified": 0.2},
+}
+
+
+def resolve_weights(profile: Optional[str] = None, weights: Optional[Mapping[str, Any]] = None) -> Dict[str, float]:
+    """
+    Weights for a named profile, or a custom profile given as {feature: weight}.
+    Custom weights may name any of WEIGHT_KEYS (others count as 0) and are
+    rescaled to sum to 1. Raises ValueError for an unknown profile or invalid weights.
+    """
+    if weights is None:
+        name = profile or "balanced"
+        if name not in PROFILES:
+            raise ValueError(f"Unknown profile: {name}. Available: {', '.join(PROFILES)}")
+        return dict(PROFILES[name])
+
+    if not isinstance(weights, Mapping):
+        raise ValueError("weights must be an object")
+    unknown = [key for key in weights if key not in WEIGHT_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown weight keys: {', '.join(unknown)}")
+    values = {key: weights.get(key, 0) for key in WEIGHT_KEYS}
+    # Python's JSON parser accepts NaN and Infinity, which would make every score NaN
+    if any(isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v) or v < 0
+           for v in values.values()):
+        raise ValueError("Weights must be finite non-negative numbers")
+    total = sum(values.values())
+    if not math.isfinite(total):
+        raise ValueError("Weights are too large")
+    if total <= 0:
+        raise ValueError("At least one weight must be positive")
+    return {key: value / total for key, value in values.items()}
+
+
+class VendorFeatureStore:
+    """
+    Normalized vendor features, computed once per catalog version.
+
+    price, delivery_time and response_time are scaled as best/value (the cheapest
+    or fastest vendor scores 1), rating as rating / max rating, certified as 0/1.
+    A profile score is then features @ weights plus the location weight for
+    vendors in the requested location.
+    """
+
+    def __init__(self, vendors: Sequence[Dict[str, Any]]):
+        self.vendors = vendors if isinstance(vendors, VendorCatalog) else list(vendors)
+        n = len(self.vendors)
+        self.size = n
+
+        def column(key):
+            return catalog_column(self.vendors, key)
+
+        def best_over(values):
+            # Lower is better; zero or missing-looking values get no credit
+            positive = values[values > 0]
+            if not len(positive):
+                return np.zeros(n)
+            with np.errstate(divide="ignore"):
+                return np.where(values > 0, positive.min() / values, 0.0)
+
+        rating = column("rating")
+        top_rating = rating.max() if n else 0
+        self.features = np.column_stack([
+            best_over(column("price")),
+            best_over(column("delivery_days")),
+            rating / top_rating if top_rating > 0 else np.zeros(n),
+            best_over(column("response_hours")),
+            catalog_column(self.vendors, "certified", dtype=bool).astype(np.float64),
+        ]) if n else np.zeros((0, len(FEATURES)))
+        self.location_codes, self.locations = catalog_factorized(self.vendors, "location")
+
+    def location_mask(self, location: str) -> np.ndarray:
+        # Case-sensitive substring, as in score_vendors
+        matches = np.fromiter((location in value for value in self.locations), dtype=bool, count=len(self.locations))
+        return matches[self.location_codes]
+
+    def scores(self, weights: Mapping[str, float], location: Optional[str] = None) -> np.ndarray:
+        vector = np.array([weights.get(key, 0.0) for key in FEATURES], dtype=np.float64)
+        scores = self.features @ vector
+        if location is not None and weights.get("location"):
+            scores = scores + self.location_mask(location) * weights["location"]
+        return scores
+
+    def top(self, weights: Mapping[str, float], location: Optional[str] = None, n: int = 3) -> List[ScoredVendor]:
+        """The n best vendors under `weights`, with their "score" rounded to 3 places"""
+        if n <= 0 or not self.size:
+            return []
+        scores = self.scores(weights, location)
+        return [
+            ScoredVendor(self.vendors[i], round(float(scores[i]), 3))
+            for i in top_k_positions(scores, n)
+        ]
+
+
+_lock = threading.Lock()
+_store: Dict[str, Any] = {"source": None, "store": None}
+
+
+def get_feature_store() -> VendorFeatureStore:
+    """Feature store of the current vendor catalog, rebuilt when the catalog file changes"""
+    vendors = load_vendors()
+    with _lock:
+        if _store["source"] is not vendors:
+            _store["store"] = VendorFeatureStore(vendors)
+            _store["source"] = vendors
+        return _store["store"]
@@ -0,0 +1,124 @@
+# services/singleflight.py
+"""
+Collapse concurrent calls for the same key into one.
+
+The first caller for a key (the leader) runs the function; callers that arrive
+while it is in flight wait for it and get the same result or exception. Once
+the call finishes the key is forgotten, so the next caller starts a new one.
+Nothing is cached here; pair it with a cache for that.
+
+    flight = Group("product")
+    result = flight.do(key, lambda: load(asin))
+
+Group serves threads, AsyncGroup coroutines (one in-flight task per key and
+event loop). The two do not share in-flight calls.
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.metrics import SINGLEFLIGHT_CALLS
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _Stats(ABC):
+    def __init__(self, name: str):
+        self.name = name
+        self._stats_lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0
+
+    def _count(self, leader: bool):
+        with self._stats_lock:
+            if leader:
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+        SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader" if leader else "collapsed")
+
+    @abstractmethod
+    def _in_flight(self) -> int:
+        """Number of keys with a call in flight"""
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {"leaders": self.leaders, "collapsed": self.collapsed, "inFlight": self._in_flight()}
+
+
+class Group(_Stats):
+    """Single-flight for blocking calls made from several threads"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncGroup(_Stats):
+    """
+    Single-flight for coroutines. The call runs as its own task, so a caller
+    that is cancelled (e.g. the client went away) does not cancel it for the
+    others.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._tasks: Dict[Any, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        flight = (key, id(loop))
+        task = self._tasks.get(flight)
+        leader = task is None
+        if leader:
+            task = self._tasks[flight] = loop.create_task(fn())
+            task.add_done_callback(lambda t: self._finished(flight, t))
+        self._count(leader)
+        return await asyncio.shield(task)
+
+    def _finished(self, flight, task: asyncio.Task):
+        if self._tasks.get(flight) is task:
+            del self._tasks[flight]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def _in_flight(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,100 @@
+# services/vendor_catalog.py
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Sequence
+
+from services.vendor_store import VendorCatalog, compile_vendors
+from services.log import get_logger
+
+# === Config ===
+VENDORS_PATH = os.getenv(
+    "VENDORS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "vendors.json")
+)
+# Serve the catalog from the memory-mapped columnar store (services/vendor_store.py)
+VENDOR_STORE_ENABLED = os.getenv("VENDOR_STORE_ENABLED", "true").lower() == "true"
+# Seconds between checks of vendors.json by a background watcher; 0 checks on every load_vendors() call
+VENDOR_CATALOG_WATCH_INTERVAL = float(os.getenv("VENDOR_CATALOG_WATCH_INTERVAL", "1.0"))
+
+log = get_logger(__name__)
+
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_loaded = {"mtime": None, "vendors": []}
+_watcher = {"pid": None}
+
+
+def _read() -> Sequence[Dict[str, Any]]:
+    if VENDOR_STORE_ENABLED:
+        try:
+            return VendorCatalog(compile_vendors(VENDORS_PATH))
+        except OSError as e:
+            log.warning("vendor_catalog.store_unavailable", path=VENDORS_PATH, error=str(e))
+    with open(VENDORS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def reload_vendors() -> bool:
+    """
+    Swap in the current vendors.json if it changed since the last load.
+    The new version is read (and compiled) before the swap, so callers only ever
+    see a complete catalog.
+    Returns:
+        Whether a new version was swapped in
+    """
+    mtime = os.path.getmtime(VENDORS_PATH)
+    if _loaded["mtime"] == mtime:
+        return False
+    with _reload_lock:
+        if _loaded["mtime"] == mtime:
+            return False
+        vendors = _read()
+        with _lock:
+            _loaded["vendors"] = vendors
+            _loaded["mtime"] = mtime
+    return True
+
+
+def _watch():
+    failed_mtime = None
+    while True:
+        time.sleep(VENDOR_CATALOG_WATCH_INTERVAL)
+        try:
+            if reload_vendors():
+                log.info("vendor_catalog.reloaded", path=VENDORS_PATH, vendors=len(_loaded["vendors"]))
+        except Exception as e:
+            # Report a broken file once, not on every tick until it is fixed
+            mtime = os.path.getmtime(VENDORS_PATH) if os.path.exists(VENDORS_PATH) else None
+            if mtime != failed_mtime:
+                log.error("vendor_catalog.reload_failed", path=VENDORS_PATH, error=str(e))
+                failed_mtime = mtime
+
+
+def _watching() -> bool:
+    """
+    Whether a watcher thread keeps this process' catalog current. Starts one on
+    the first call in a process (threads do not survive fork) and returns False
+    then, so that call loads the catalog itself.
+    """
+    if VENDOR_CATALOG_WATCH_INTERVAL <= 0:
+        return False
+    with _lock:
+        if _watcher["pid"] == os.getpid():
+            return True
+        threading.Thread(target=_watch, name="vendor-catalog-watcher", daemon=True).start()
+        _watcher["pid"] = os.getpid()
+    return False
+
+
+def load_vendors() -> Sequence[Dict[str, Any]]:
+    """
+    Return the vendor catalog: a memory-mapped VendorCatalog (or a list of dicts
+    when the store is disabled). A new object is returned only when
+    data/vendors.json changes, so callers may cache derived structures by identity.
+    """
+    if not _watching() or _loaded["mtime"] is None:
+        reload_vendors()
+    with _lock:
+        return _loaded["vendors"]
@@ -0,0 +1,207 @@
+# services/vendor_engine.py
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.records import ScoredVendor
+from services.vendor_catalog import load_vendors
+from services.vendor_store import VendorCatalog, catalog_column, catalog_factorized
+from vendor_logic import WEIGHTS
+
+# === Config ===
+# Upper bound on the (request x vendor) cells scored at once by score_batch
+VENDOR_BATCH_MAX_CELLS = int(os.getenv("VENDOR_BATCH_MAX_CELLS", "4000000"))
+
+# np.round(x, 2) can differ from Python's correctly rounded round(x, 2) by one
+# unit in the last place; candidates within this margin of the N-th score are
+# re-ranked with Python's round so the result matches recommend_vendors exactly
+ROUNDING_SLACK = 0.011
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k best scores, ties in catalog order"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+    candidates = np.flatnonzero(scores >= kth)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+
+
+class VendorEngine:
+    """
+    Columnar copy of a vendor catalog for ranking.
+
+    Numeric fields are float64 arrays and category/location are factorized into
+    codes, so a substring filter is evaluated once per distinct value and
+    broadcast as a mask. The composite score does not depend on the request and
+    is computed once per catalog.
+
+    recommend() returns what services.vendor_recommender.recommend_vendors
+    returns for the same catalog.
+    """
+
+    def __init__(self, vendors: Sequence[Dict[str, Any]]):
+        # A VendorCatalog is immutable and read column by column; anything else is copied
+        self.vendors = vendors if isinstance(vendors, VendorCatalog) else list(vendors)
+        self.size = len(self.vendors)
+
+        self.price = catalog_column(self.vendors, "price", 0)
+        self.rating = catalog_column(self.vendors, "rating", 0)
+        self.compliance = catalog_column(self.vendors, "compliance_score", 0)
+        self.reliability = catalog_column(self.vendors, "reliability_score", 0)
+        self.sustainability = catalog_column(self.vendors, "sustainability_score", 0)
+        lead_time = catalog_column(self.vendors, "lead_time", np.nan)
+        # recommend_vendors treats a missing lead_time as inf when filtering and as 1 when scoring
+        self.lead_time_filter = np.where(np.isnan(lead_time), np.inf, lead_time)
+        lead_time_score = np.where(np.isnan(lead_time), 1.0, lead_time)
+
+        self.category_codes, self.categories = catalog_factorized(self.vendors, "category", "", str.lower)
+        self.location_codes, self.locations = catalog_factorized(self.vendors, "location", "", str.lower)
+
+        # Same operations in the same order as recommend_vendors, so every float matches
+        with np.errstate(divide="ignore"):
+            self.score = (
+                self.rating * 0.3 +
+                (1 / lead_time_score) * 0.2 +
+                self.compliance * 0.15 +
+                self.reliability * 0.2 +
+                self.sustainability * 0.15
+            )
+        self.approx_score = np.round(self.score, 2)
+        self._batch_columns: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]] = None
+
+    @staticmethod
+    def _substring_mask(needle: str, codes: np.ndarray, uniques: List[str]) -> np.ndarray:
+        needle = needle.lower()
+        matches = np.fromiter((needle in value for value in uniques), dtype=bool, count=len(uniques))
+        return matches[codes]
+
+    def filter_mask(self, product_type=None, budget_min=None, budget_max=None,
+                    location=None, rating_min=None, lead_time_max=None,
+                    compliance_min=None, reliability_min=None, sustainability_min=None) -> np.ndarray:
+        """Boolean mask of the vendors passing every given filter"""
+        mask = np.ones(self.size, dtype=bool)
+        if product_type:
+            mask &= self._substring_mask(product_type, self.category_codes, self.categories)
+        if budget_min is not None:
+            mask &= self.price >= budget_min
+        if budget_max is not None:
+            mask &= self.price <= budget_max
+        if location:
+            mask &= self._substring_mask(location, self.location_codes, self.locations)
+        if rating_min is not None:
+            mask &= self.rating >= rating_min
+        if lead_time_max is not None:
+            mask &= self.lead_time_filter <= lead_time_max
+        if compliance_min is not None:
+            mask &= self.compliance >= compliance_min
+        if reliability_min is not None:
+            mask &= self.reliability >= reliability_min
+        if sustainability_min is not None:
+            mask &= self.sustainability >= sustainability_min
+        return mask
+
+    def top(self, candidates: np.ndarray, top_n: Optional[int]) -> List[Tuple[int, float]]:
+        """
+        Rank vendor positions by rounded score, ties in catalog order.
+        Returns:
+            (position, score) pairs, sliced like `sorted_list[:top_n]`
+        """
+        if top_n is not None and 0 < top_n < len(candidates):
+            approx = self.approx_score[candidates]
+            split = len(candidates) - top_n
+            nth = np.partition(approx, split)[split]
+            candidates = candidates[approx >= nth - ROUNDING_SLACK]
+
+        scored = [(int(i), round(float(s), 2)) for i, s in zip(candidates, self.score[candidates])]
+        # Stable, and candidates are in catalog order, like sorted(..., reverse=True)
+        scored.sort(key=lambda pair: -pair[1])
+        return scored[:top_n]
+
+    def recommend(self, product_type=None, budget_min=None, budget_max=None,
+                  location=None, rating_min=None, lead_time_max=None,
+                  compliance_min=None, reliability_min=None, sustainability_min=None,
+                  top_n=5) -> List[ScoredVendor]:
+        """Vectorized recommend_vendors over this catalog"""
+        mask = self.filter_mask(product_type, budget_min, budget_max, location, rating_min,
+                                lead_time_max, compliance_min, reliability_min, sustainability_min)
+        return [
+            ScoredVendor(self.vendors[i], score)
+            for i, score in self.top(np.flatnonzero(mask), top_n)
+        ]
+
+    def _score_vendors_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """
+        vendor_logic.vendor_score for every vendor, in and out of the requested
+        location: the only request-dependent term. Built on first use.
+        Returns:
+            (score in location, score elsewhere, location codes, distinct locations)
+        """
+        if self._batch_columns is None:
+            vendors = self.vendors
+            price = catalog_column(vendors, "price")
+            delivery = catalog_column(vendors, "delivery_days")
+            rating = catalog_column(vendors, "rating")
+            response = catalog_column(vendors, "response_hours")
+            certified = catalog_column(vendors, "certified", dtype=bool).astype(np.float64)
+            location_codes, locations = catalog_factorized(vendors, "location")
+
+            # Same terms, in the same order, as vendor_score
+            with np.errstate(divide="ignore"):
+                head = (1 / price) * WEIGHTS["price"] + (1 / delivery) * WEIGHTS["delivery_time"] + rating * WEIGHTS["rating"]
+                response_term = (1 / response) * WEIGHTS["response_time"]
+            certified_term = certified * WEIGHTS["certified"]
+            inside = head + 1 * WEIGHTS["location"] + response_term + certified_term
+            outside = head + 0 * WEIGHTS["location"] + response_term + certified_term
+            # Python's round() once per vendor, so batch scores equal score_vendors' exactly
+            inside = np.array([round(float(x), 3) for x in inside], dtype=np.float64)
+            outside = np.array([round(float(x), 3) for x in outside], dtype=np.float64)
+            self._batch_columns = (inside, outside, location_codes, locations)
+        return self._batch_columns
+
+    def score_batch(self, requests: Sequence[Dict[str, Any]], top_k: int = 3,
+                    chunk_size: Optional[int] = None) -> List[List[ScoredVendor]]:
+        """
+        Score the catalog for many procurement requests at once.
+        The score only depends on a request's location, so each distinct location
+        is scored once; locations are processed in chunks of `chunk_size` rows of a
+        (location x vendor) matrix, by default as many as fit VENDOR_BATCH_MAX_CELLS.
+        Returns:
+            For each request, what score_vendors(vendors, request)[:top_k] returns
+        """
+        if top_k <= 0 or not self.size:
+            return [[] for _ in requests]
+        inside, outside, location_codes, locations = self._score_vendors_columns()
+
+        wanted = list(dict.fromkeys(request["location"] for request in requests))
+        rows = chunk_size or max(1, VENDOR_BATCH_MAX_CELLS // self.size)
+        ranked: Dict[str, List[Tuple[int, float]]] = {}
+        for start in range(0, len(wanted), rows):
+            chunk = wanted[start:start + rows]
+            # Case-sensitive substring check once per (requested, vendor) distinct location pair
+            matches = np.array([[wanted_location in location for location in locations] for wanted_location in chunk],
+                               dtype=bool).reshape(len(chunk), len(locations))
+            scores = np.where(matches[:, location_codes], inside, outside)
+            for wanted_location, row in zip(chunk, scores):
+                ranked[wanted_location] = [(int(i), float(row[i])) for i in top_k_positions(row, top_k)]
+
+        return [
+            [ScoredVendor(self.vendors[i], score) for i, score in ranked[request["location"]]]
+            for request in requests
+        ]
+
+
+_lock = threading.Lock()
+_engine: Dict[str, Any] = {"source": None, "engine": None}
+
+
+def get_vendor_engine() -> VendorEngine:
+    """Engine for the current vendor catalog, rebuilt when the catalog file changes"""
+    vendors = load_vendors()
+    with _lock:
+        if _engine["source"] is not vendors:
+            _engine["engine"] = VendorEngine(vendors)
+            _engine["source"] = vendors
+        return _engine["engine"]
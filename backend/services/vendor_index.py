@@ -0,0 +1,245 @@
+# services/vendor_index.py
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from services.vendor_catalog import load_vendors
+
+# === Config ===
+# Edit distance accepted by fuzzy token matching (1 or 2)
+VENDOR_INDEX_FUZZY_DISTANCE = int(os.getenv("VENDOR_INDEX_FUZZY_DISTANCE", "1"))
+
+FIELDS = ("category", "items", "location")
+MATCH_MODES = ("substring", "token", "prefix", "fuzzy")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _deletes(token: str, distance: int) -> Set[str]:
+    """Every string obtained by deleting up to `distance` characters"""
+    variants, frontier = {token}, {token}
+    for _ in range(distance):
+        frontier = {t[:i] + t[i + 1:] for t in frontier for i in range(len(t))}
+        variants |= frontier
+    return variants
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class _FieldIndex:
+    """Postings for one vendor field: distinct values, tokens, sorted tokens and delete variants"""
+
+    def __init__(self):
+        self.values: Dict[str, Set[Any]] = {}
+        self.lowered: Dict[str, str] = {}
+        self.tokens: Dict[str, Set[Any]] = {}
+        self.sorted_tokens: List[str] = []
+        self.variants: Dict[str, Set[str]] = {}
+
+    def add(self, vendor_id, values: Iterable[str]):
+        for value in values:
+            if value not in self.values:
+                self.values[value] = set()
+                self.lowered[value] = value.lower()
+            self.values[value].add(vendor_id)
+            for token in tokenize(value):
+                postings = self.tokens.get(token)
+                if postings is None:
+                    postings = self.tokens[token] = set()
+                    insort(self.sorted_tokens, token)
+                    for variant in _deletes(token, VENDOR_INDEX_FUZZY_DISTANCE):
+                        self.variants.setdefault(variant, set()).add(token)
+                postings.add(vendor_id)
+
+    def remove(self, vendor_id, values: Iterable[str]):
+        for value in values:
+            ids = self.values.get(value)
+            if ids is None:
+                continue
+            ids.discard(vendor_id)
+            if not ids:
+                del self.values[value]
+                del self.lowered[value]
+            for token in tokenize(value):
+                postings = self.tokens.get(token)
+                if postings is None:
+                    continue
+                postings.discard(vendor_id)
+                if not postings:
+                    del self.tokens[token]
+                    del self.sorted_tokens[bisect_left(self.sorted_tokens, token)]
+                    for variant in _deletes(token, VENDOR_INDEX_FUZZY_DISTANCE):
+                        tokens = self.variants.get(variant)
+                        if tokens is not None:
+                            tokens.discard(token)
+                            if not tokens:
+                                del self.variants[variant]
+
+    def substring(self, needle: str, case_sensitive: bool) -> Set[Any]:
+        # One check per distinct value, not per vendor
+        if not case_sensitive:
+            needle = needle.lower()
+        matched: Set[Any] = set()
+        for value, ids in self.values.items():
+            if needle in (value if case_sensitive else self.lowered[value]):
+                matched |= ids
+        return matched
+
+    def prefix(self, prefix: str) -> Set[Any]:
+        matched: Set[Any] = set()
+        start = bisect_left(self.sorted_tokens, prefix)
+        for token in self.sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matched |= self.tokens[token]
+        return matched
+
+    def fuzzy_tokens(self, token: str, distance: int) -> Set[str]:
+        candidates: Set[str] = set()
+        for variant in _deletes(token, distance):
+            candidates |= self.variants.get(variant, set())
+        return {t for t in candidates if _edit_distance(token, t, distance) <= distance}
+
+
+class VendorIndex:
+    """
+    Inverted index over vendor category, items and location.
+
+    Each field keeps its distinct values (for the case-insensitive substring
+    checks recommend_vendors and score_vendors make, evaluated once per value),
+    token postings, a sorted token list for prefix lookups and a delete-variant
+    table for fuzzy lookups. Vendors are keyed by "id" and can be added or
+    removed one at a time; results keep catalog (insertion) order.
+    """
+
+    def __init__(self, vendors: Optional[Iterable[Dict[str, Any]]] = None):
+        self._lock = threading.RLock()
+        self._fields = {field: _FieldIndex() for field in FIELDS}
+        self._vendors: Dict[Any, Dict[str, Any]] = {}
+        self._order: Dict[Any, int] = {}
+        self._next_order = 0
+        for vendor in vendors or []:
+            self.add(vendor)
+
+    def __len__(self):
+        return len(self._vendors)
+
+    @staticmethod
+    def _field_values(vendor: Dict[str, Any], field: str) -> List[str]:
+        value = vendor.get(field)
+        if value is None:
+            return []
+        return list(value) if isinstance(value, (list, tuple)) else [value]
+
+    def add(self, vendor: Dict[str, Any]):
+        """Index a vendor, replacing any indexed vendor with the same id"""
+        with self._lock:
+            vendor_id = vendor["id"]
+            if vendor_id in self._vendors:
+                self.remove(vendor_id)
+            self._vendors[vendor_id] = vendor
+            self._order[vendor_id] = self._next_order
+            self._next_order += 1
+            for field, index in self._fields.items():
+                index.add(vendor_id, self._field_values(vendor, field))
+
+    def remove(self, vendor_id) -> bool:
+        with self._lock:
+            vendor = self._vendors.pop(vendor_id, None)
+            if vendor is None:
+                return False
+            del self._order[vendor_id]
+            for field, index in self._fields.items():
+                index.remove(vendor_id, self._field_values(vendor, field))
+            return True
+
+    def match(self, field: str, query: str, mode: str = "substring", case_sensitive: bool = False,
+              max_distance: Optional[int] = None) -> Set[Any]:
+        """
+        Ids of the vendors whose `field` matches `query`.
+        Args:
+            field: "category", "items" or "location"
+            mode: "substring" (anywhere in a value), "token" (every query token
+                  appears), "prefix" (some token starts with the query) or
+                  "fuzzy" (every query token is within `max_distance` edits of a token)
+            case_sensitive: Substring mode only; the other modes work on lowercase tokens
+            max_distance: Fuzzy mode only, at most VENDOR_INDEX_FUZZY_DISTANCE
+        """
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}")
+        index = self._fields[field]
+        with self._lock:
+            if mode == "substring":
+                return index.substring(query, case_sensitive)
+            if mode == "prefix":
+                return index.prefix(query.lower().strip())
+
+            tokens = tokenize(query)
+            if not tokens:
+                return set()
+            distance = min(max_distance or VENDOR_INDEX_FUZZY_DISTANCE, VENDOR_INDEX_FUZZY_DISTANCE)
+            matched: Optional[Set[Any]] = None
+            for token in tokens:
+                if mode == "token":
+                    ids = set(index.tokens.get(token, ()))
+                else:
+                    ids = set()
+                    for similar in index.fuzzy_tokens(token, distance):
+                        ids |= index.tokens[similar]
+                matched = ids if matched is None else matched & ids
+                if not matched:
+                    break
+            return matched or set()
+
+    def select(self, product_type: Optional[str] = None, location: Optional[str] = None,
+               mode: str = "substring") -> List[Dict[str, Any]]:
+        """
+        Vendors matching every given criterion, in catalog order.
+        With the default mode these are exactly the vendors that pass
+        recommend_vendors' product_type and location filters.
+        """
+        with self._lock:
+            matched: Optional[Set[Any]] = None
+            for field, query in (("category", product_type), ("location", location)):
+                if query:
+                    ids = self.match(field, query, mode)
+                    matched = ids if matched is None else matched & ids
+            if matched is None:
+                matched = set(self._vendors)
+            return [self._vendors[i] for i in sorted(matched, key=self._order.__getitem__)]
+
+    def distinct_values(self, field: str) -> List[str]:
+        with self._lock:
+            return sorted(self._fields[field].values)
+
+
+_lock = threading.Lock()
+_index: Dict[str, Any] = {"source": None, "index": None}
+
+
+def get_vendor_index() -> VendorIndex:
+    """Index of the current vendor catalog, rebuilt when the catalog file changes"""
+    vendors = load_vendors()
+    with _lock:
+        if _index["source"] is not vendors:
+            _index["index"] = VendorIndex(vendors)
+            _index["source"] = vendors
+        return _index["index"]
@@ -0,0 +1,208 @@
+# services/vendor_leaderboard.py
+import os
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.records import ScoredVendor
+from services.vendor_catalog import load_vendors
+from services.vendor_recommender import composite_score
+from vendor_logic import vendor_score
+
+# === Config ===
+# Boards kept per catalog; location-dependent profiles get one per requested location
+VENDOR_LEADERBOARD_MAX_BOARDS = int(os.getenv("VENDOR_LEADERBOARD_MAX_BOARDS", "256"))
+
+# Weighting profiles: name -> (score function, whether it depends on the requested location)
+PROFILES: Dict[str, Tuple[Callable[[Dict[str, Any], Optional[str]], float], bool]] = {
+    # services.vendor_recommender.recommend_vendors
+    "recommend": (lambda v, location: composite_score(v), False),
+    # vendor_logic.score_vendors; the location term is a case-sensitive substring check as there
+    "score": (lambda v, location: vendor_score(v, location in v["location"]), True),
+}
+
+BoardKey = Tuple[Optional[str], str, Optional[str]]
+
+
+class Leaderboard:
+    """
+    Max-heap of (score, catalog order) with lazy invalidation.
+
+    An update pushes a new entry and marks the old one stale instead of
+    searching the heap for it, so upsert/remove are O(log n). Stale entries are
+    dropped when they reach the top, and the heap is rebuilt once they outnumber
+    the live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int, Any]] = []
+        self._live: Dict[Any, Tuple[float, int, int]] = {}
+        self._version = 0
+
+    def __len__(self):
+        return len(self._live)
+
+    def upsert(self, vendor_id, score: float, order: int):
+        current = self._live.get(vendor_id)
+        if current is not None and current[0] == score and current[1] == order:
+            return
+        self._version += 1
+        self._live[vendor_id] = (score, order, self._version)
+        heapq.heappush(self._heap, (-score, order, self._version, vendor_id))
+        self._maybe_compact()
+
+    def load(self, entries: Sequence[Tuple[Any, float, int]]):
+        """Replace the contents with (vendor id, score, order) entries in O(n)"""
+        self._live = {}
+        self._heap = []
+        for vendor_id, score, order in entries:
+            self._version += 1
+            self._live[vendor_id] = (score, order, self._version)
+            self._heap.append((-score, order, self._version, vendor_id))
+        heapq.heapify(self._heap)
+
+    def remove(self, vendor_id):
+        if self._live.pop(vendor_id, None) is not None:
+            self._maybe_compact()
+
+    def _is_live(self, entry) -> bool:
+        current = self._live.get(entry[3])
+        return current is not None and current[2] == entry[2]
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [(-score, order, version, vendor_id)
+                          for vendor_id, (score, order, version) in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n: int) -> List[Tuple[Any, float]]:
+        """The n best (vendor id, score) pairs, ties in catalog order; O(n log size)"""
+        taken = []
+        while self._heap and len(taken) < n:
+            entry = heapq.heappop(self._heap)
+            if self._is_live(entry):
+                taken.append(entry)
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [(entry[3], -entry[0]) for entry in taken]
+
+
+class VendorLeaderboards:
+    """
+    Ranked vendor lists per (category, profile[, location]), kept up to date as
+    vendors change instead of rescored on every query.
+
+    A board is built (O(n)) the first time its key is queried. After that,
+    a vendor change costs O(log n) per board the vendor belongs to.
+    Categories match case-insensitively and exactly; None means all vendors.
+    """
+
+    def __init__(self, vendors: Sequence[Dict[str, Any]] = ()):
+        self._lock = threading.RLock()
+        self._vendors: Dict[Any, Dict[str, Any]] = {}
+        self._order: Dict[Any, int] = {}
+        self._next_order = 0
+        self._boards: "OrderedDict[BoardKey, Leaderboard]" = OrderedDict()
+        self.sync(vendors)
+
+    @staticmethod
+    def _in_board(key: BoardKey, vendor: Dict[str, Any]) -> bool:
+        category = key[0]
+        return category is None or vendor.get("category", "").lower() == category
+
+    def _place(self, key: BoardKey, board: Leaderboard, vendor_id):
+        vendor = self._vendors[vendor_id]
+        if not self._in_board(key, vendor):
+            board.remove(vendor_id)
+            return
+        score_fn, _ = PROFILES[key[1]]
+        board.upsert(vendor_id, score_fn(vendor, key[2]), self._order[vendor_id])
+
+    def _refresh(self, vendor_id):
+        for key, board in self._boards.items():
+            if vendor_id in self._vendors:
+                self._place(key, board, vendor_id)
+            else:
+                board.remove(vendor_id)
+
+    def upsert_vendor(self, vendor: Dict[str, Any], order: Optional[int] = None):
+        """Add or replace a vendor (by id); new vendors rank after existing ones on ties"""
+        with self._lock:
+            vendor_id = vendor["id"]
+            if order is None:
+                order = self._order.get(vendor_id, self._next_order)
+            self._next_order = max(self._next_order, order + 1)
+            self._vendors[vendor_id] = vendor
+            self._order[vendor_id] = order
+            self._refresh(vendor_id)
+
+    def update_vendor(self, vendor_id, **changes) -> bool:
+        """Change fields of a vendor, e.g. update_vendor("v1", price=55.0, rating=4.7)"""
+        with self._lock:
+            vendor = self._vendors.get(vendor_id)
+            if vendor is None:
+                return False
+            self._vendors[vendor_id] = {**vendor, **changes}
+            self._refresh(vendor_id)
+            return True
+
+    def remove_vendor(self, vendor_id) -> bool:
+        with self._lock:
+            if self._vendors.pop(vendor_id, None) is None:
+                return False
+            del self._order[vendor_id]
+            self._refresh(vendor_id)
+            return True
+
+    def sync(self, vendors: Sequence[Dict[str, Any]]):
+        """Apply a new catalog version, touching only the vendors that changed"""
+        with self._lock:
+            incoming = {v["id"]: (position, v) for position, v in enumerate(vendors)}
+            for vendor_id in [i for i in self._vendors if i not in incoming]:
+                self.remove_vendor(vendor_id)
+            for vendor_id, (position, vendor) in incoming.items():
+                if self._vendors.get(vendor_id) != vendor or self._order.get(vendor_id) != position:
+                    self.upsert_vendor(vendor, position)
+
+    def top(self, category: Optional[str] = None, profile: str = "recommend", n: int = 5,
+            location: Optional[str] = None) -> List[ScoredVendor]:
+        """
+        The n best vendors of a category under a profile, with their "score".
+        `location` is required by (and only used for) location-dependent profiles.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile: {profile}")
+        score_fn, uses_location = PROFILES[profile]
+        if uses_location and location is None:
+            raise ValueError(f"Profile {profile} needs a location")
+        key = (category.lower() if category else None, profile, location if uses_location else None)
+
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                board = self._boards[key] = Leaderboard()
+                board.load([
+                    (vendor_id, score_fn(vendor, key[2]), self._order[vendor_id])
+                    for vendor_id, vendor in self._vendors.items() if self._in_board(key, vendor)
+                ])
+                while len(self._boards) > VENDOR_LEADERBOARD_MAX_BOARDS:
+                    self._boards.popitem(last=False)
+            self._boards.move_to_end(key)
+            return [ScoredVendor(self._vendors[vendor_id], score) for vendor_id, score in board.top(n)]
+
+
+_lock = threading.Lock()
+_leaderboards: Dict[str, Any] = {"source": None, "boards": None}
+
+
+def get_vendor_leaderboards() -> VendorLeaderboards:
+    """Leaderboards of the current vendor catalog, synced when the catalog file changes"""
+    vendors = load_vendors()
+    with _lock:
+        if _leaderboards["boards"] is None:
+            _leaderboards["boards"] = VendorLeaderboards(vendors)
+        elif _leaderboards["source"] is not vendors:
+            _leaderboards["boards"].sync(vendors)
+        _leaderboards["source"] = vendors
+        return _leaderboards["boards"]
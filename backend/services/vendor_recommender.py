@@ -1,14 +1,31 @@
 # services/vendor_recommender.py
+from services.records import ScoredVendor
+
+def composite_score(vendor):
+    """The ranking score recommend_vendors gives a vendor"""
+    score = (
+        vendor.get('rating', 0) * 0.3 +
+        (1 / vendor.get('lead_time', 1)) * 0.2 +
+        vendor.get('compliance_score', 0) * 0.15 +
+        vendor.get('reliability_score', 0) * 0.2 +
+        vendor.get('sustainability_score', 0) * 0.15
+    )
+    return round(score, 2)
 
 def recommend_vendors(vendors, product_type=None, budget_min=None, budget_max=None,
                       location=None, rating_min=None, lead_time_max=None,
                       compliance_min=None, reliability_min=None, sustainability_min=None,
-                      top_n=5):
+                      top_n=5, index=None):
     """
     Recommend vendors based on multiple criteria.
+    Pass a services.vendor_index.VendorIndex built over `vendors` as `index` to
+    visit only the vendors matching product_type and location.
     """
     filtered_vendors = []
 
+    if index is not None and (product_type or location):
+        vendors = index.select(product_type=product_type, location=location)
+
     for vendor in vendors:
         # Apply filters
         if product_type and product_type.lower() not in vendor.get('category', '').lower():
@@ -30,19 +47,9 @@ def recommend_vendors(vendors, product_type=None, budget_min=None, budget_max=No
         if sustainability_min is not None and vendor.get('sustainability_score', 0) < sustainability_min:
             continue
 
-        # Calculate a composite score for ranking
-        score = (
-            vendor.get('rating', 0) * 0.3 +
-            (1 / vendor.get('lead_time', 1)) * 0.2 +
-            vendor.get('compliance_score', 0) * 0.15 +
-            vendor.get('reliability_score', 0) * 0.2 +
-            vendor.get('sustainability_score', 0) * 0.15
-        )
-
-        vendor['score'] = round(score, 2)
-        filtered_vendors.append(vendor)
+        filtered_vendors.append(ScoredVendor(vendor, composite_score(vendor)))
 
     # Sort vendors by score in descending order
-    recommended = sorted(filtered_vendors, key=lambda x: x['score'], reverse=True)
+    recommended = sorted(filtered_vendors, key=lambda x: x.score, reverse=True)
 
     return recommended[:top_n]
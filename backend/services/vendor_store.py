@@ -0,0 +1,314 @@
+# services/vendor_store.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# === Config ===
+VENDOR_STORE_DIR = os.getenv(
+    "VENDOR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".vendor_store")
+)
+# Compiled versions kept on disk; older ones are removed after a new one is compiled
+VENDOR_STORE_KEEP = int(os.getenv("VENDOR_STORE_KEEP", "3"))
+
+# Bump when the on-disk layout changes so stale compilations are not reused
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# Ints are stored as float64 (so scoring reads them without a copy) while exact
+MAX_EXACT_INT = 2 ** 53
+_REQUIRED = object()
+
+
+def factorize(values: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """Integer codes into a list of distinct values"""
+    uniques: Dict[str, int] = {}
+    codes = np.fromiter(
+        (uniques.setdefault(value, len(uniques)) for value in values), dtype=np.int32, count=len(values)
+    )
+    return codes, list(uniques)
+
+
+def _kind(values: List[Any]) -> str:
+    """Column type of the present values of a field"""
+    if all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) and abs(v) <= MAX_EXACT_INT for v in values):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return "float"
+    if all(isinstance(v, str) for v in values):
+        return "str"
+    if all(isinstance(v, list) and all(isinstance(s, str) for s in v) for v in values):
+        return "str_list"
+    return "json"
+
+
+def _save_strings(directory: str, prefix: str, strings: List[str]):
+    """Distinct strings as one UTF-8 blob plus offsets"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"{prefix}.blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, f"{prefix}.offsets.npy"), offsets)
+
+
+def _write_columns(directory: str, vendors: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Fields in order of first appearance, which is the key order of materialized vendors
+    names = list(dict.fromkeys(key for vendor in vendors for key in vendor))
+    columns = []
+    for position, name in enumerate(names):
+        prefix = f"c{position}"
+        present = [name in vendor for vendor in vendors]
+        values = [vendor.get(name) for vendor in vendors]
+        kind = _kind([v for v, p in zip(values, present) if p])
+        column = {"name": name, "kind": kind, "prefix": prefix, "has_missing": not all(present)}
+        if column["has_missing"]:
+            np.save(os.path.join(directory, f"{prefix}.present.npy"), np.array(present, dtype=bool))
+
+        if kind == "bool":
+            np.save(os.path.join(directory, f"{prefix}.data.npy"), np.array([bool(v) for v in values], dtype=bool))
+        elif kind in ("int", "float"):
+            data = np.array([v if p else np.nan for v, p in zip(values, present)], dtype=np.float64)
+            np.save(os.path.join(directory, f"{prefix}.data.npy"), data)
+        elif kind == "str_list":
+            # Flat element codes plus per-vendor row offsets
+            rows = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([len(v) if p else 0 for v, p in zip(values, present)], out=rows[1:])
+            codes, uniques = factorize([s for v, p in zip(values, present) if p for s in v])
+            np.save(os.path.join(directory, f"{prefix}.codes.npy"), codes)
+            np.save(os.path.join(directory, f"{prefix}.rows.npy"), rows)
+            _save_strings(directory, prefix, uniques)
+        else:
+            # "str" and "json" are dictionary-encoded; json values are stored serialized
+            strings = values if kind == "str" else [json.dumps(v) for v in values]
+            codes, uniques = factorize([s if p else "" for s, p in zip(strings, present)])
+            np.save(os.path.join(directory, f"{prefix}.codes.npy"), codes)
+            _save_strings(directory, prefix, uniques)
+        columns.append(column)
+    return columns
+
+
+def _prune(store_dir: str, current: str):
+    """Remove all but the VENDOR_STORE_KEEP newest versions, and abandoned temp dirs"""
+    versions, now = [], time.time()
+    for entry in os.scandir(store_dir):
+        if not entry.is_dir():
+            continue
+        if entry.name.startswith(".tmp-"):
+            if now - entry.stat().st_mtime > 3600:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.path != current:
+            versions.append((entry.stat().st_mtime, entry.path))
+    # Mapped files of removed versions stay readable in processes still using them
+    for _, path in sorted(versions, reverse=True)[max(0, VENDOR_STORE_KEEP - 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def compile_vendors(json_path: str, store_dir: Optional[str] = None) -> str:
+    """
+    Compile a vendor JSON file into a columnar version directory of .npy files.
+
+    Versions are named by content hash, so workers compiling the same file
+    concurrently agree on the result: each writes to a temp directory and
+    renames it into place, and the losers discard theirs.
+    Returns:
+        Path of the version directory
+    """
+    store_dir = store_dir or VENDOR_STORE_DIR
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw + f"|v{FORMAT_VERSION}".encode()).hexdigest()[:16]
+    target = os.path.join(store_dir, digest)
+    if os.path.exists(os.path.join(target, MANIFEST)):
+        return target
+
+    vendors = json.loads(raw)
+    if not isinstance(vendors, list) or not all(isinstance(v, dict) for v in vendors):
+        raise ValueError(f"{json_path} must contain a list of vendor objects")
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=store_dir)
+    try:
+        columns = _write_columns(tmp, vendors)
+        # Manifest last: a directory with a manifest is complete
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"format": FORMAT_VERSION, "version": digest, "size": len(vendors), "columns": columns}, f)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            if not os.path.exists(os.path.join(target, MANIFEST)):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _prune(store_dir, target)
+    return target
+
+
+def _load(path: str) -> np.ndarray:
+    # Zero-length arrays cannot be memory-mapped
+    array = np.load(path, mmap_mode="r")
+    return array if array.size else np.load(path)
+
+
+class _Column:
+    def __init__(self, directory: str, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.kind = spec["kind"]
+        prefix = os.path.join(directory, spec["prefix"])
+        self.present = _load(f"{prefix}.present.npy") if spec["has_missing"] else None
+        if self.kind in ("bool", "int", "float"):
+            self.data = _load(f"{prefix}.data.npy")
+        else:
+            self.codes = _load(f"{prefix}.codes.npy")
+            self.blob = _load(f"{prefix}.blob.npy")
+            self.offsets = _load(f"{prefix}.offsets.npy")
+            self.rows = _load(f"{prefix}.rows.npy") if self.kind == "str_list" else None
+
+    def string(self, code: int) -> str:
+        return bytes(self.blob[self.offsets[code]:self.offsets[code + 1]]).decode("utf-8")
+
+    def uniques(self) -> List[str]:
+        return [self.string(code) for code in range(len(self.offsets) - 1)]
+
+    def has(self, i: int) -> bool:
+        return self.present is None or bool(self.present[i])
+
+    def value(self, i: int) -> Any:
+        if self.kind == "bool":
+            return bool(self.data[i])
+        if self.kind == "int":
+            return int(self.data[i])
+        if self.kind == "float":
+            return float(self.data[i])
+        if self.kind == "str_list":
+            return [self.string(int(code)) for code in self.codes[self.rows[i]:self.rows[i + 1]]]
+        text = self.string(int(self.codes[i]))
+        return text if self.kind == "str" else json.loads(text)
+
+
+class VendorCatalog(SequenceABC):
+    """
+    Read-only, memory-mapped vendor catalog compiled by compile_vendors.
+
+    Columns are shared through the page cache by every process mapping the same
+    version. Indexing returns a new vendor dict built from the columns, so the
+    catalog itself cannot be mutated; column() and factorized() give numeric and
+    string columns to vectorized consumers without building dicts at all.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vendor store format in {directory}")
+        self.path = directory
+        self.version = manifest["version"]
+        self.size = manifest["size"]
+        self._columns = [_Column(directory, spec) for spec in manifest["columns"]]
+        self._by_name = {column.name: column for column in self._columns}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("vendor index out of range")
+        return {column.name: column.value(i) for column in self._columns if column.has(i)}
+
+    def __repr__(self):
+        return f"VendorCatalog(version={self.version!r}, size={self.size})"
+
+    def column(self, name: str, default: Any = _REQUIRED, dtype=np.float64) -> Optional[np.ndarray]:
+        """
+        A numeric or boolean field as an array, missing values filled with `default`.
+        Returns None when the field is not numeric (callers fall back to the dicts);
+        raises KeyError when a vendor lacks the field and no default is given.
+        """
+        column = self._by_name.get(name)
+        if column is None:
+            if default is _REQUIRED and self.size:
+                raise KeyError(name)
+            return np.full(self.size, default if default is not _REQUIRED else 0, dtype=dtype)
+        if column.kind not in ("bool", "int", "float"):
+            return None
+        data = column.data if dtype is not bool else column.data.astype(bool)
+        if data.dtype != dtype:
+            data = data.astype(dtype)
+        if column.present is not None:
+            if default is _REQUIRED:
+                raise KeyError(name)
+            data = np.where(column.present, data, default)
+        return data
+
+    def factorized(self, name: str, default: str = "",
+                   normalize: Optional[Callable[[str], str]] = None) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """Codes and distinct values of a string field, as factorize() would return; None if not a string field"""
+        column = self._by_name.get(name)
+        if column is None:
+            return np.zeros(self.size, dtype=np.int32), [normalize(default) if normalize else default]
+        if column.kind != "str":
+            return None
+        uniques = column.uniques() + [default]
+        codes = np.asarray(column.codes)
+        if column.present is not None:
+            codes = np.where(column.present, codes, len(uniques) - 1)
+        if normalize is not None:
+            uniques = [normalize(value) for value in uniques]
+        remap, distinct = factorize(uniques)
+        return remap[codes], distinct
+
+
+def catalog_column(vendors: Sequence[Dict[str, Any]], key: str, default: Any = _REQUIRED,
+                   dtype=np.float64) -> np.ndarray:
+    """
+    vendors' `key` as an array: read straight from a VendorCatalog when possible,
+    else one value per vendor dict (v[key], or v.get(key, default)).
+    """
+    if isinstance(vendors, VendorCatalog):
+        data = vendors.column(key, default, dtype)
+        if data is not None:
+            return data
+    if default is _REQUIRED:
+        values = (v[key] for v in vendors)
+    else:
+        values = (v.get(key, default) for v in vendors)
+    if dtype is bool:
+        values = (bool(value) for value in values)
+    return np.fromiter(values, dtype=dtype, count=len(vendors))
+
+
+def catalog_factorized(vendors: Sequence[Dict[str, Any]], key: str, default: Any = _REQUIRED,
+                       normalize: Optional[Callable[[str], str]] = None) -> Tuple[np.ndarray, List[str]]:
+    """factorize() of vendors' `key` (normalized), from the catalog's dictionary encoding when possible"""
+    if isinstance(vendors, VendorCatalog) and (default is not _REQUIRED or key in vendors._by_name):
+        if default is _REQUIRED and vendors._by_name[key].present is not None:
+            raise KeyError(key)
+        result = vendors.factorized(key, "" if default is _REQUIRED else default, normalize)
+        if result is not None:
+            return result
+    values = [v[key] if default is _REQUIRED else v.get(key, default) for v in vendors]
+    return factorize([normalize(value) for value in values] if normalize else values)
+
+
+def main():
+    """Compile the vendor catalog ahead of starting workers"""
+    from services.vendor_catalog import VENDORS_PATH
+
+    path = compile_vendors(VENDORS_PATH)
+    print(f"[VendorStore] {VENDORS_PATH} -> {path} ({len(VendorCatalog(path))} vendors)")
+
+
+if __name__ == "__main__":
+    main()
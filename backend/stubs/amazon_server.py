@@ -0,0 +1,99 @@
+# stubs/amazon_server.py
+"""
+Local stand-in for the RapidAPI realtime Amazon data API, serving recorded
+responses from bench/fixtures.
+
+Run it and point the backend at it:
+
+    python -m stubs.amazon_server --port 8090 --delay 0.05
+    RAPIDAPI_BASE_URL=http://127.0.0.1:8090 python app.py
+
+/search returns fixtures/search.json, /product-details fixtures/product.json with
+the requested asin, and /seller-details fixtures/seller.json with the requested
+seller id. Every response is delayed by `--delay` seconds.
+"""
+import argparse
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "fixtures")
+
+ROUTES = {
+    "/search": ("search.json", None),
+    "/product-details": ("product.json", "asin"),
+    "/seller-details": ("seller.json", "seller_id"),
+}
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    fixtures = {}
+    for path, (filename, _) in ROUTES.items():
+        with open(os.path.join(fixtures_dir, filename), encoding="utf-8") as f:
+            fixtures[path] = json.load(f)
+    return fixtures
+
+
+class StubAmazonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients wait out a delayed ACK (~40ms) on every response
+    disable_nagle_algorithm = True
+    delay = 0.0
+    fixtures = {}
+    # Serialized fixtures, for requests that do not override an id
+    encoded = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        route = ROUTES.get(parts.path)
+        if route is None:
+            return self._send(404, json.dumps({"message": "Endpoint does not exist"}).encode("utf-8"))
+        if not self.headers.get("x-rapidapi-key"):
+            return self._send(401, json.dumps({"message": "Invalid API key"}).encode("utf-8"))
+
+        time.sleep(self.delay)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        id_field = route[1]
+        # The backend sends ?sellerId= for seller lookups
+        requested = (params.get(id_field) or params.get("sellerId")) if id_field else None
+        fixture = self.fixtures[parts.path]
+        if requested and requested != fixture["data"].get(id_field):
+            payload = {**fixture, "data": {**fixture["data"], id_field: requested}}
+            return self._send(200, json.dumps(payload).encode("utf-8"))
+        return self._send(200, self.encoded[parts.path])
+
+    def _send(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host="127.0.0.1", port=8090, delay=0.0, fixtures_dir=FIXTURES_DIR):
+    fixtures = load_fixtures(fixtures_dir)
+    handler = type("ConfiguredStubAmazonHandler", (StubAmazonHandler,), {
+        "delay": delay,
+        "fixtures": fixtures,
+        "encoded": {path: json.dumps(doc).encode("utf-8") for path, doc in fixtures.items()},
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local RapidAPI Amazon stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of recorded responses")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.delay, args.fixtures)
+    print(f"Stub Amazon server listening on http://{args.host}:{args.port}")
+    server.serve_forever()
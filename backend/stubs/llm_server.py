@@ -0,0 +1,105 @@
+# stubs/llm_server.py
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent API.
+
+Run it and point the backend at it:
+
+    python -m stubs.llm_server --port 8089 --delay 0.05
+    GEMINI_MODEL_URL=http://127.0.0.1:8089/v1beta/models/stub python app.py
+
+The completion is a fixed text that echoes the first line of the prompt. Streaming
+responses are sent as SSE events, one word per event, `--delay` seconds apart.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+COMPLETION = (
+    "Based on the details provided, this looks like a solid option. "
+    "Verify the specifications and delivery terms with the supplier before placing the order, "
+    "and compare at least two alternatives on price and lead time."
+)
+
+
+def _completion_for(body):
+    try:
+        prompt = body["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        prompt = ""
+    first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+    return f"{first_line}\n{COMPLETION}".strip()
+
+
+def _payload(text, finished=True):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+
+        text = _completion_for(body)
+        if parts.path.endswith(":generateContent"):
+            time.sleep(self.delay * len(text.split()))
+            return self._send_json(200, _payload(text))
+        if parts.path.endswith(":streamGenerateContent"):
+            if parse_qs(parts.query).get("alt") != ["sse"]:
+                return self._send_json(400, {"error": {"code": 400, "message": "Only alt=sse is supported"}})
+            return self._stream(text)
+        return self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            event = f"data: {json.dumps(_payload(piece, finished=i == len(words) - 1))}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def make_server(host="127.0.0.1", port=8089, delay=0.0):
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {"delay": delay})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between streamed words")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.delay)
+    print(f"Stub LLM server listening on http://{args.host}:{args.port}")
+    server.serve_forever()
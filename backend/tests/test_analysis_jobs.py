@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import database
+from services import analysis_jobs, gemini
+from stubs.llm_server import make_server
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A fresh shared job store and a stub Gemini server"""
+    monkeypatch.setattr(database, "_client", mongomock.MongoClient())
+    monkeypatch.setattr(database, "_client_pid", os.getpid())
+    monkeypatch.setattr(analysis_jobs, "_collection", None)
+    monkeypatch.setattr(analysis_jobs, "ANALYSIS_JOBS_STORE", "mongo")
+    monkeypatch.setattr(analysis_jobs, "ANALYSIS_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(analysis_jobs, "_jobs", {})
+    monkeypatch.setattr(analysis_jobs, "_jobs_by_key", {})
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(analysis_jobs, "_executor", executor)
+    srv = make_server(port=0, delay=0.01)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(gemini, "GEMINI_MODEL_URL", f"http://127.0.0.1:{srv.server_address[1]}/v1beta/models/stub")
+    yield
+    # Let stragglers finish against the mock before monkeypatch restores the client
+    executor.shutdown(wait=True)
+    srv.shutdown()
+
+
+def _product(asin):
+    return {"asin": asin, "ProductTitle": f"Test product {asin} {time.time()}", "price": "$10"}
+
+
+def _other_worker(monkeypatch):
+    # A different process sees only the shared store
+    monkeypatch.setattr(analysis_jobs, "_jobs", {})
+    monkeypatch.setattr(analysis_jobs, "_jobs_by_key", {})
+
+
+def test_other_workers_see_and_share_the_job(store, monkeypatch):
+    product = _product("B0SHARED1")
+    job = analysis_jobs.submit_analysis(product)
+    view, _ = analysis_jobs.wait_for_update(job["jobId"], "pending", None, 5)
+    assert view["status"] == "running"
+
+    _other_worker(monkeypatch)
+    assert analysis_jobs.submit_analysis(product)["jobId"] == job["jobId"]
+    status, seen, text = None, 0, []
+    deadline = time.monotonic() + 10
+    while status not in ("done", "failed") and time.monotonic() < deadline:
+        view, chunks = analysis_jobs.wait_for_update(job["jobId"], status, seen, 5)
+        seen += len(chunks)
+        text.extend(chunks)
+        status = view["status"]
+    assert status == "done"
+    assert "".join(text) == view["ai_analysis"]
+
+
+def test_unknown_job(store):
+    assert analysis_jobs.get_job("missing") is None
+    assert analysis_jobs.wait_for_update("missing", None, 0, 0.1) == (None, [])
+
+
+def test_hung_job_times_out_and_is_replaced(store, monkeypatch):
+    def hang(prompt, **kwargs):
+        time.sleep(0.5)
+        yield "late"
+
+    monkeypatch.setattr(analysis_jobs, "stream_generate_content", hang)
+    monkeypatch.setattr(analysis_jobs, "ANALYSIS_JOB_TIMEOUT", 0.2)
+    product = _product("B0HUNG0001")
+    job = analysis_jobs.submit_analysis(product)
+    time.sleep(0.3)
+    assert analysis_jobs.get_job(job["jobId"])["error"] == "Analysis timed out"
+
+    _other_worker(monkeypatch)
+    assert analysis_jobs.get_job(job["jobId"])["status"] == "failed"
+    assert analysis_jobs.submit_analysis(product)["jobId"] != job["jobId"]
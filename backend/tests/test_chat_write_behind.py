@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip("mongomock")
+
+from services import chat_store
+from services.chat_write_behind import ChatWriteBehind
+
+
+@pytest.fixture(params=["embedded", "bucketed"])
+def db(request, monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_STORAGE_MODE", request.param)
+    return mongomock.MongoClient()["procuredb"]
+
+
+def _message(text):
+    return {"role": "user", "content": text, "url": None, "timestamp": datetime.utcnow()}
+
+
+def _session(db):
+    user_obj_id = ObjectId()
+    db.chatSessions.insert_one({
+        "sessionId": "s1", "userId": user_obj_id, "state": {}, **chat_store.new_session_fields(),
+    })
+    return "s1", user_obj_id
+
+
+def test_direct_write_invalidates_remembered_state(db):
+    session_id, user_obj_id = _session(db)
+    writer = ChatWriteBehind(db, durability="ack", interval_ms=10)
+    assert writer.submit(session_id, user_obj_id, _message("a"), {"stage": "a", "n": 1})
+
+    # Another worker without write-behind saves directly
+    assert chat_store.append_message(db, session_id, user_obj_id, _message("b"), {"stage": "b", "k": 2})
+
+    # Same as what the writer remembers: a stale (empty) diff would leave the direct write's state
+    assert writer.submit(session_id, user_obj_id, _message("c"), {"stage": "a", "n": 1})
+    session = db.chatSessions.find_one({"sessionId": session_id})
+    assert session["state"] == {"stage": "a", "n": 1}
+    assert session["stateVersion"] == 3
+    assert [m["content"] for m in chat_store.load_messages(db, session)] == ["a", "b", "c"]
+    assert writer.stats()["fullStateWrites"] == 2
+
+
+def test_submit_rejects_non_object_state(db):
+    session_id, user_obj_id = _session(db)
+    writer = ChatWriteBehind(db, durability="ack", interval_ms=10)
+    with pytest.raises(TypeError):
+        writer.submit(session_id, user_obj_id, _message("a"), None)
+    assert not writer.has_pending()
+
+    # Without write-behind the state is stored as given
+    assert chat_store.append_message(db, session_id, user_obj_id, _message("b"), None)
+    assert db.chatSessions.find_one({"sessionId": session_id})["state"] is None
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from services import async_http_client, http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    calls = 0
+
+    def _respond(self):
+        type(self).calls += 1
+        if self.path == "/slow":
+            time.sleep(0.3)
+        status = 503 if self.path == "/unavailable" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.calls = 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+
+
+def test_read_timeout_is_not_retried(server):
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        http_client.get(f"{server}/slow", timeout=(1, 0.1), retries=2)
+    assert _Handler.calls == 1
+
+
+def test_idempotent_requests_retry_unavailable(server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_MAX", 0.01)
+    assert http_client.get(f"{server}/unavailable", retries=2).status_code == 503
+    assert _Handler.calls == 3
+
+
+def test_post_is_not_retried_by_default(server):
+    assert http_client.post(f"{server}/unavailable").status_code == 503
+    assert _Handler.calls == 1
+
+
+def test_retry_deadline_stops_retries(server):
+    assert http_client.get(f"{server}/unavailable", retries=5, retry_deadline=0).status_code == 503
+    assert _Handler.calls == 1
+
+
+def test_async_read_timeout_and_post_are_not_retried(server):
+    async def run():
+        with pytest.raises(httpx.ReadTimeout):
+            await async_http_client.get(f"{server}/slow", timeout=(1, 0.1), retries=2)
+        response = await async_http_client.post(f"{server}/unavailable")
+        await async_http_client.close_client()
+        return response
+
+    assert asyncio.run(run()).status_code == 503
+    assert _Handler.calls == 2
@@ -0,0 +1,89 @@
+import random
+
+from prompts import build_prompt, prompt_facts
+from services import llm_cache
+from services.llm_cache import LLMResponseCache
+
+VENDORS = [
+    {"name": "Vendor A", "price": 120, "delivery_days": 3, "rating": 4.5},
+    {"name": "Vendor B", "price": 110, "delivery_days": 5, "rating": 4.1},
+]
+REQUEST = {"item": "Steel bolts", "quantity": 100, "location": "Mumbai", "days_needed": 5}
+
+
+def _cached(request):
+    cache = LLMResponseCache()
+    cache.store(build_prompt(REQUEST, VENDORS), "answer", facts=prompt_facts(REQUEST))
+    return cache.lookup(build_prompt(request, VENDORS), facts=prompt_facts(request))
+
+
+def test_exact_and_formatting_only_changes_hit():
+    assert _cached(REQUEST) == ("answer", "exact")
+    assert _cached({**REQUEST, "item": "steel   BOLTS"}) == ("answer", "exact")
+
+
+def test_changed_request_fields_miss():
+    for change in ({"quantity": 5000}, {"location": "Delhi"}, {"days_needed": 30}):
+        assert _cached({**REQUEST, **change}) == (None, None), change
+
+
+def test_numeric_difference_misses_without_facts():
+    cache = LLMResponseCache()
+    cache.store(build_prompt(REQUEST, VENDORS), "answer")
+    assert cache.lookup(build_prompt({**REQUEST, "quantity": 5000}, VENDORS)) == (None, None)
+
+
+def test_near_duplicate_with_same_facts_hits():
+    cache = LLMResponseCache()
+    prompt = build_prompt(REQUEST, VENDORS)
+    cache.store(prompt, "answer", facts=prompt_facts(REQUEST))
+    reworded = prompt.replace("Be concise,", "Be brief,")
+    assert cache.lookup(reworded, facts=prompt_facts(REQUEST)) == ("answer", "near")
+
+
+def _templated(item):
+    boilerplate = " ".join(f"rule{i} applies to every vendor" for i in range(20))
+    return f"Recommend a vendor for {item} widgets in bulk. {boilerplate}"
+
+
+def test_near_duplicate_found_among_many_templated_prompts(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_POSTINGS", 50)
+    cache = LLMResponseCache(max_entries=1000, similarity=0.9)
+    for i in range(300):
+        cache.store(_templated(f"alpha{chr(97 + i % 26)}{chr(97 + i // 26)} steel"), f"answer {i}")
+
+    reworded = _templated("alphaaa steel").replace("in bulk", "in quantity")
+    assert cache.lookup(reworded) == ("answer 0", "near")
+    # Boilerplate shingles are shared by every entry and are never probed
+    assert len(cache._candidates(llm_cache._shingles(llm_cache.canonicalize(reworded)), "", "")) == 1
+
+
+def test_near_lookup_matches_brute_force():
+    rng = random.Random(7)
+    vocabulary = [f"w{chr(97 + i)}" for i in range(26)]
+    for _ in range(200):
+        cache = LLMResponseCache(similarity=0.5, max_word_diff=30)
+        base = [rng.choice(vocabulary) for _ in range(12)]
+        stored = {}
+        for i in range(20):
+            words = list(base)
+            for _ in range(rng.randint(0, 4)):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            prompt = " ".join(words)
+            cache.store(prompt, prompt)
+            stored[llm_cache.canonicalize(prompt)] = prompt
+
+        words = list(base)
+        for _ in range(rng.randint(1, 5)):
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        query = " ".join(words)
+        text, kind = cache.lookup(query)
+        shingles = llm_cache._shingles(query)
+        best = max(
+            len(shingles & llm_cache._shingles(c)) / len(shingles | llm_cache._shingles(c)) for c in stored
+        )
+        if kind is None:
+            assert best < 0.5
+        elif kind == "near":
+            found = llm_cache._shingles(llm_cache.canonicalize(text))
+            assert len(shingles & found) / len(shingles | found) == best
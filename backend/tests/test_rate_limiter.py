@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from services.rate_limiter import MemoryBackend, MongoBackend, RateLimiter
+
+
+class SlowBackend(MemoryBackend):
+    """A shared backend whose every call is a slow round trip"""
+
+    name = "slow"
+
+    def take(self, *args):
+        time.sleep(0.2)
+        return super().take(*args)
+
+
+def test_shared_backend_round_trips_do_not_serialize_threads():
+    limiter = RateLimiter("slow", rate=1000, burst=100, shared=SlowBackend())
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(5)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - started < 0.6
+    assert limiter.usage()["used"] == 5
+
+
+class StaleReads:
+    """A collection whose reads lag one request behind the other workers"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def find(self, *args, **kwargs):
+        return [{**doc, "count": doc["count"] - 1} if "count" in doc else doc
+                for doc in self._collection.find(*args, **kwargs)]
+
+
+def test_mongo_backend_never_counts_past_the_quota():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient()["procuredb"]["rateLimits"]
+    backend = MongoBackend()
+    backend._collection = StaleReads(collection)
+    now = time.time()
+
+    assert backend.take("bucket", "quota", now, 0.001, 1.0, 2) == ("granted", 0.0, 1)
+    assert backend.take("bucket", "quota", now, 0.001, 1.0, 2) == ("granted", 0.0, 2)
+    # The stale read still sees room; the conditional increment does not
+    assert backend.take("bucket", "quota", now, 0.001, 1.0, 2) == ("quota", 0.0, 2)
+    assert collection.find_one({"_id": "quota"})["count"] == 2
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+
+import pytest
+
+# app.py refuses to import without these; nothing here talks to MongoDB or RapidAPI
+os.environ.setdefault("RAPIDAPI_KEY", "test")
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/")
+
+import app as flask_app
+from services import analysis_jobs, gemini
+from services.llm_cache import LLMResponseCache
+from stubs.llm_server import make_server
+
+REQUEST = {"item": "Steel bolts", "quantity": 100, "location": "Mumbai", "days_needed": 5}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client talking to the stub Gemini server, with an empty LLM cache"""
+    srv = make_server(port=0, delay=0.01)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(gemini, "GEMINI_MODEL_URL", f"http://127.0.0.1:{srv.server_address[1]}/v1beta/models/stub")
+    monkeypatch.setattr(gemini, "llm_cache", LLMResponseCache())
+    yield flask_app.app.test_client()
+    srv.shutdown()
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """This process's in-memory analysis job store, emptied"""
+    monkeypatch.setattr(analysis_jobs, "ANALYSIS_JOBS_STORE", "memory")
+    monkeypatch.setattr(analysis_jobs, "_jobs", {})
+    monkeypatch.setattr(analysis_jobs, "_jobs_by_key", {})
+
+
+def _events(response):
+    """(event, data) pairs of a server-sent event stream, keep-alive comments dropped"""
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_vendor_recommendation_stream(client):
+    response = client.post("/api/vendors/recommend?stream=true", json=REQUEST)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    events = _events(response)
+    names = [name for name, _ in events]
+    assert names[0] == "vendors" and names[-1] == "done"
+    assert len(names) > 2 and set(names[1:-1]) == {"token"}
+    assert events[0][1] and all("name" in vendor for vendor in events[0][1])
+    assert "".join(data["text"] for _, data in events[1:-1]).strip()
+
+
+def test_analysis_events_stream(client, jobs):
+    job = analysis_jobs.submit_analysis({"asin": "B0EVENTS01", "ProductTitle": "Steel bolts", "price": "$10"})
+
+    response = client.get(f"/api/amazon/analysis/{job['jobId']}/events")
+    assert response.status_code == 200
+
+    events = _events(response)
+    names = [name for name, _ in events]
+    assert names[0] in ("pending", "running") and names[-1] == "done"
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert tokens
+    assert "".join(tokens) == events[-1][1]["ai_analysis"]
+    # Status events only move forward; tokens come before the final one
+    statuses = [name for name in names if name != "token"]
+    assert statuses == sorted(set(statuses), key=["pending", "running", "done"].index)
+
+
+def test_analysis_events_unknown_job(client, jobs):
+    assert client.get("/api/amazon/analysis/missing/events").status_code == 404
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from services.vendor_engine import VendorEngine
+from services.vendor_index import VendorIndex
+from services.vendor_leaderboard import VendorLeaderboards
+from services.vendor_recommender import recommend_vendors
+from vendor_logic import score_vendors
+
+CATEGORIES = ["Raw Materials", "raw materials", "Electronics", "Office Supplies", "Electronic Parts"]
+LOCATIONS = ["Mumbai", "mumbai", "Delhi", "New Delhi", "Pune", "Navi Mumbai"]
+PRODUCT_TYPES = ["raw", "RAW MATERIALS", "electronic", "Office", "parts", "steel"]
+REQUESTED_LOCATIONS = ["Mumbai", "mumbai", "Delhi", "delhi", "Pune", "New", "Chennai"]
+OPTIONAL_SCORES = ["compliance_score", "reliability_score", "sustainability_score"]
+
+
+def _catalog(rng):
+    vendors = []
+    for i in range(rng.randint(0, 40)):
+        vendor = {
+            "id": f"v{i}",
+            "price": rng.choice([10.0, 25.5, 58.5, round(rng.uniform(1, 200), 2)]),
+            "delivery_days": rng.randint(1, 15),
+            "location": rng.choice(LOCATIONS),
+            "rating": rng.choice([4.0, 4.5, round(rng.uniform(1, 5), 1)]),
+            "response_hours": rng.randint(1, 48),
+            "certified": rng.random() < 0.5,
+        }
+        # Coarse values on purpose: rounded scores tie often, and ties must break in catalog order
+        if rng.random() < 0.9:
+            vendor["category"] = rng.choice(CATEGORIES)
+        if rng.random() < 0.8:
+            vendor["lead_time"] = rng.randint(1, 30)
+        for field in OPTIONAL_SCORES:
+            if rng.random() < 0.8:
+                vendor[field] = rng.choice([0.5, 0.8, round(rng.uniform(0, 1), 2)])
+        vendors.append(vendor)
+    return vendors
+
+
+def _filters(rng):
+    candidates = {
+        "product_type": lambda: rng.choice(PRODUCT_TYPES),
+        "budget_min": lambda: rng.uniform(0, 100),
+        "budget_max": lambda: rng.uniform(50, 200),
+        "location": lambda: rng.choice(REQUESTED_LOCATIONS),
+        "rating_min": lambda: rng.uniform(1, 5),
+        "lead_time_max": lambda: rng.randint(1, 30),
+        "compliance_min": lambda: rng.uniform(0, 1),
+        "reliability_min": lambda: rng.uniform(0, 1),
+        "sustainability_min": lambda: rng.uniform(0, 1),
+    }
+    filters = {name: make() for name, make in candidates.items() if rng.random() < 0.3}
+    filters["top_n"] = rng.choice([None, 1, 3, 5, 10, 50])
+    return filters
+
+
+def _ranked(results):
+    return [(result["id"], result["score"]) for result in results]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_engine_matches_reference_implementations(seed):
+    rng = random.Random(seed)
+    vendors = _catalog(rng)
+    engine = VendorEngine(vendors)
+    index = VendorIndex(vendors)
+    leaderboards = VendorLeaderboards(vendors)
+
+    for _ in range(5):
+        filters = _filters(rng)
+        expected = _ranked(recommend_vendors(vendors, **filters))
+        assert _ranked(engine.recommend(**filters)) == expected, filters
+        assert _ranked(recommend_vendors(vendors, index=index, **filters)) == expected, filters
+
+    n = rng.choice([1, 3, 5, 50])
+    assert _ranked(leaderboards.top(profile="recommend", n=n)) == _ranked(recommend_vendors(vendors, top_n=n))
+    category = rng.choice(CATEGORIES)
+    in_category = [v for v in vendors if v.get("category", "").lower() == category.lower()]
+    assert (_ranked(leaderboards.top(category=category, profile="recommend", n=n))
+            == _ranked(recommend_vendors(in_category, top_n=n)))
+
+    requests = [{"location": rng.choice(REQUESTED_LOCATIONS)} for _ in range(rng.randint(1, 6))]
+    top_k = rng.choice([1, 3, 5, 50])
+    batch = engine.score_batch(requests, top_k=top_k, chunk_size=rng.choice([None, 1, 2]))
+    for request, results in zip(requests, batch):
+        expected = _ranked(score_vendors(vendors, request)[:top_k])
+        assert _ranked(results) == expected, request
+        assert _ranked(score_vendors(vendors, request, index=index)[:top_k]) == expected, request
+        assert _ranked(leaderboards.top(profile="score", location=request["location"], n=top_k)) == expected
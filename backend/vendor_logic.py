@@ -1,15 +1,25 @@
+from services.records import ScoredVendor
 
-def score_vendors(vendors, request):
-    weights = {"price": 0.3, "delivery_time": 0.2, "rating": 0.25, "location": 0.1, "response_time": 0.1, "certified": 0.05}
+WEIGHTS = {"price": 0.3, "delivery_time": 0.2, "rating": 0.25, "location": 0.1, "response_time": 0.1, "certified": 0.05}
+
+def vendor_score(v, in_location):
+    """A vendor's score_vendors score, given whether it is in the requested location"""
+    weights = WEIGHTS
+    score = (
+        (1 / v["price"]) * weights["price"] +
+        (1 / v["delivery_days"]) * weights["delivery_time"] +
+        v["rating"] * weights["rating"] +
+        (1 if in_location else 0) * weights["location"] +
+        (1 / v["response_hours"]) * weights["response_time"] +
+        (1 if v["certified"] else 0) * weights["certified"]
+    )
+    return round(score, 3)
+
+def score_vendors(vendors, request, index=None):
+    # With a VendorIndex the location check is one lookup per distinct location
+    local = index.match("location", request["location"], case_sensitive=True) if index is not None else None
     scored = []
     for v in vendors:
-        score = (
-            (1 / v["price"]) * weights["price"] +
-            (1 / v["delivery_days"]) * weights["delivery_time"] +
-            v["rating"] * weights["rating"] +
-            (1 if request["location"] in v["location"] else 0) * weights["location"] +
-            (1 / v["response_hours"]) * weights["response_time"] +
-            (1 if v["certified"] else 0) * weights["certified"]
-        )
-        scored.append({**v, "score": round(score, 3)})
-    return sorted(scored, key=lambda x: x["score"], reverse=True)
+        in_location = v["id"] in local if local is not None else request["location"] in v["location"]
+        scored.append(ScoredVendor(v, vendor_score(v, in_location)))
+    return sorted(scored, key=lambda x: x.score, reverse=True)